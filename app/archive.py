@@ -0,0 +1,91 @@
+"""
+Cold-storage archival for closed records.
+
+Records that have been closed for longer than a cutoff are copied, together
+with their history, into ``archived_records`` / ``archived_record_history``
+and removed from the hot tables. ``visible_archived_documents`` is the read
+path that ``trace`` and ``document_detail`` fall back to.
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, literal, or_, select
+
+from .models import (db, Record, RecordHistory, RecordSnapshot, FlowPosition, ArchivedRecord,
+                     ArchivedRecordHistory, RecordBand, RecordSignature, COMPLETED_STATUSES)
+
+RECORD_COLUMNS = (
+    "id", "tenant_id", "document_id", "title", "doc_type", "action_taken", "department",
+    "implementing_office", "date_received", "released_by", "received_by",
+    "status", "priority", "remarks", "created_at", "updated_at",
+)
+HISTORY_COLUMNS = (
+    "id", "tenant_id", "record_id", "action_type", "status", "from_department",
+    "to_department", "action_by", "remarks", "timestamp",
+)
+
+
+def archive_closed_records(older_than_days, batch_size=500):
+    """
+    Move records closed more than ``older_than_days`` ago into the archive tables.
+    Each batch is copied and deleted in its own transaction.
+    Returns the number of records archived.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    records = Record.__table__
+    history = RecordHistory.__table__
+    archived = 0
+
+    while True:
+        ids = db.session.scalars(
+            select(records.c.id)
+            .where(Record.status.in_(list(COMPLETED_STATUSES)),
+                   records.c.updated_at < cutoff)
+            .order_by(records.c.id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+
+        archived_at = literal(datetime.now(timezone.utc), db.DateTime)
+        db.session.execute(
+            insert(ArchivedRecord.__table__).from_select(
+                RECORD_COLUMNS + ("archived_at",),
+                select(*[getattr(Record, name) for name in RECORD_COLUMNS], archived_at)
+                .where(records.c.id.in_(ids))
+            )
+        )
+        db.session.execute(
+            insert(ArchivedRecordHistory.__table__).from_select(
+                HISTORY_COLUMNS,
+                select(*[getattr(RecordHistory, name) for name in HISTORY_COLUMNS])
+                .where(history.c.record_id.in_(ids))
+            )
+        )
+        db.session.execute(delete(history).where(history.c.record_id.in_(ids)))
+        # Archived chains are short and final; they are replayed without snapshots.
+        snapshots = RecordSnapshot.__table__
+        db.session.execute(delete(snapshots).where(snapshots.c.record_id.in_(ids)))
+        positions = FlowPosition.__table__
+        db.session.execute(delete(positions).where(positions.c.record_id.in_(ids)))
+        # Archived documents are not offered as duplicates of new ones.
+        for table in (RecordBand.__table__, RecordSignature.__table__):
+            db.session.execute(delete(table).where(table.c.record_id.in_(ids)))
+        db.session.execute(delete(records).where(records.c.id.in_(ids)))
+        db.session.commit()
+        archived += len(ids)
+
+    return archived
+
+
+def visible_archived_documents(department):
+    """Archive counterpart of ``routes.visible_documents``."""
+    touched_ids = select(ArchivedRecordHistory.record_id).where(
+        (ArchivedRecordHistory.from_department == department)
+        | (ArchivedRecordHistory.to_department == department)
+    )
+    return ArchivedRecord.query.filter(
+        or_(
+            ArchivedRecord.department == department,
+            ArchivedRecord.id.in_(touched_ids),
+        )
+    )
@@ -0,0 +1,222 @@
+"""
+ASGI entry point with an async read path for the JSON API.
+
+GET requests to the read-only endpoints of ``routes_api`` are answered on
+an async SQLAlchemy engine (asyncpg for PostgreSQL, aiosqlite for SQLite),
+so slow analytics queries and the sidebar badge pollers are multiplexed on
+a few event-loop workers instead of each holding a sync worker. Every other
+request, including any API call without a valid login, is handed to the
+Flask app unchanged through asgiref's WSGI adapter.
+
+Both stacks share the models, the query builders in ``routes_api``, tenant
+scoping and the login: the user id is read from Flask's signed session
+cookie, exactly as Flask-Login stores it. They also compute the same ETags
+(caching.py), so a matching If-None-Match gets a 304 from either one, as
+with ``decorators.conditional``.
+
+Needs the optional packages ``asgiref``, ``sqlalchemy[asyncio]`` and
+``aiosqlite`` or ``asyncpg``.
+Run with e.g. ``uvicorn asgi:application --workers 2``.
+"""
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from sqlalchemy import or_, select
+from werkzeug.http import parse_etags, quote_etag
+
+from .caching import (API_CACHE_CONTROL, ANALYTICS_CACHE_CONTROL, analytics_tag,
+                      analytics_watermark_statements, department_tag,
+                      department_watermark_statements, viewer_key)
+from .models import Tenant, User
+from .prediction import prediction_summary, prediction_summary_statement
+from .routes_api import (analytics_statement, bottleneck_summary, documents_statement,
+                         documents_payload, parse_document_fields, pending_transfers_statement)
+from .serialization import dumps
+from .tenancy import DEFAULT_TENANT_ID, TenantContext, tenant_context
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Swap the sync driver of a SQLAlchemy URL for its async counterpart."""
+    scheme, sep, rest = url.partition("://")
+    backend = scheme.split("+", 1)[0]
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver configured for database backend '{backend}'.")
+    return ASYNC_DRIVERS[backend] + sep + rest
+
+
+async def _analytics(session, user, query):
+    summary = bottleneck_summary(await session.execute(analytics_statement()))
+    summary["predictions"] = prediction_summary(
+        (await session.execute(prediction_summary_statement())).one())
+    return summary
+
+
+async def _documents(session, user, query):
+    args = parse_qs(query.decode("latin-1"))
+    if args.get("format") == ["ndjson"]:
+        return None  # streaming stays on the Flask side
+    try:
+        fields = parse_document_fields(args.get("fields", [""])[0])
+    except ValueError:
+        return None  # let Flask produce the 400
+    rows = await session.execute(documents_statement(user.department, fields))
+    return documents_payload(rows)
+
+
+async def _pending_transfers(session, user, query):
+    count = (await session.execute(pending_transfers_statement(user.department))).scalar()
+    return {"count": count}
+
+
+async def _scalars(session, statements):
+    return [(await session.execute(s)).scalar() for s in statements]
+
+
+async def _analytics_etag(session, user, scope):
+    return analytics_tag(scope["path"], await _scalars(session, analytics_watermark_statements()))
+
+
+async def _department_etag(session, user, scope):
+    watermark = await _scalars(session, department_watermark_statements(user.department))
+    return department_tag(scope["path"], scope.get("query_string", b""), watermark,
+                          viewer_key(user))
+
+
+class AsyncAPI:
+    """ASGI app serving the async read endpoints and delegating the rest to Flask."""
+
+    # path -> (handler, ETag source, Cache-Control), as decorated in routes_api.
+    handlers = {
+        "/api/analytics": (_analytics, _analytics_etag, ANALYTICS_CACHE_CONTROL),
+        "/api/documents": (_documents, _department_etag, API_CACHE_CONTROL),
+        "/api/pending-transfers": (_pending_transfers, _department_etag, API_CACHE_CONTROL),
+    }
+
+    def __init__(self, flask_app):
+        try:
+            from asgiref.wsgi import WsgiToAsgi
+            from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        except ImportError as exc:
+            raise RuntimeError("The async API needs asgiref and sqlalchemy[asyncio] installed, "
+                               "plus aiosqlite or asyncpg.") from exc
+
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        url = flask_app.config.get("ASYNC_DATABASE_URL") or \
+            async_database_url(flask_app.config["SQLALCHEMY_DATABASE_URI"])
+        self.engine = create_async_engine(url, pool_pre_ping=True)
+        if self.engine.dialect.name == "sqlite" and flask_app.config.get("SQLITE_PRAGMAS"):
+            from sqlalchemy import event
+            from .sqlite_tuning import pragma_listener
+            event.listen(self.engine.sync_engine, "connect",
+                         pragma_listener(flask_app.config["SQLITE_PRAGMAS"]))
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.cookie_name = flask_app.config["SESSION_COOKIE_NAME"]
+        self.max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        endpoint = None
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            endpoint = self.handlers.get(scope["path"])
+        if endpoint is not None:
+            handler, etag_source, cache_control = endpoint
+            head = scope["method"] == "HEAD"
+            async with self.sessions() as session:
+                tenant = await self._tenant(session, scope)
+                # Tenants with their own database are served by Flask, which routes to it.
+                if tenant is not None and not tenant.database_uri:
+                    with tenant_context(TenantContext(tenant.id, None)):
+                        data = self._session_data(scope)
+                        user = await self._current_user(session, data)
+                        payload = etag = None
+                        if user is not None:
+                            # Pending flash messages: never cached, as in decorators.conditional.
+                            if not data.get("_flashes"):
+                                etag = await etag_source(session, user, scope)
+                            if etag is not None and self._if_none_match(scope).contains_weak(etag):
+                                await self._send(send, 304, b"", etag, cache_control, head=True)
+                                return
+                            payload = await handler(session, user, scope.get("query_string", b""))
+                    if payload is not None:
+                        await self._send(send, 200, dumps(payload), etag, cache_control, head=head)
+                        return
+        # Anonymous, remember-me, write or streaming traffic: let Flask handle it as usual.
+        await self.wsgi(scope, receive, send)
+
+    async def _tenant(self, session, scope):
+        """Tenant for the request's Host header, else the default tenant."""
+        host = ""
+        for name, value in scope.get("headers", []):
+            if name == b"host":
+                host = value.decode("latin-1").split(":", 1)[0].lower()
+        rows = (await session.execute(
+            select(Tenant).where(or_(Tenant.hostname == host, Tenant.id == DEFAULT_TENANT_ID))
+        )).scalars().all()
+        return next((t for t in rows if t.hostname == host), None) or \
+            next((t for t in rows if t.id == DEFAULT_TENANT_ID), None)
+
+    def _session_data(self, scope):
+        """Contents of the Flask session cookie, or {} if there is no valid one."""
+        if self.serializer is None:
+            return {}
+        cookie = SimpleCookie()
+        for name, value in scope.get("headers", []):
+            if name == b"cookie":
+                cookie.load(value.decode("latin-1"))
+        morsel = cookie.get(self.cookie_name)
+        if morsel is None:
+            return {}
+        try:
+            return self.serializer.loads(morsel.value, max_age=self.max_age)
+        except Exception:
+            return {}
+
+    async def _current_user(self, session, data):
+        """User logged in through the Flask session ``data``, or None."""
+        user_id = data.get("_user_id")
+        if not user_id:
+            return None
+        return (await session.execute(select(User).where(User.id == int(user_id)))).scalar()
+
+    @staticmethod
+    def _if_none_match(scope):
+        for name, value in scope.get("headers", []):
+            if name == b"if-none-match":
+                return parse_etags(value.decode("latin-1"))
+        return parse_etags(None)
+
+    async def _send(self, send, status, body, etag, cache_control, head=False):
+        headers = []
+        if status != 304:
+            headers += [(b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode())]
+        if etag is not None:
+            headers += [(b"etag", quote_etag(etag).encode()),
+                        (b"cache-control", cache_control.encode()),
+                        (b"vary", b"Cookie")]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if head else body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def create_asgi_app(flask_app):
+    return AsyncAPI(flask_app)
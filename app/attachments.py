@@ -0,0 +1,345 @@
+"""
+Scanned documents and other files attached to records.
+
+Files are stored once per content under ``ATTACHMENT_DIR`` (default
+``<instance>/attachments``), named by their SHA-256: the same scan uploaded
+twice, or attached to several records, is kept on disk once. ``attachments``
+rows only point at the hash, so listing a record's attachments never reads
+a file.
+
+Uploads arrive in chunks (``PUT ...?offset=``) appended to a part file, so a
+large scan never sits in memory and an interrupted upload resumes from the
+part file's length. The last chunk hashes the part file and moves it into
+place, or drops it when that content is already stored.
+
+Downloads are sent from disk by ``send_file``: Werkzeug answers conditional
+and range requests, and with ``USE_X_SENDFILE`` the web server sends the
+file itself. Only ``INLINE_MIMETYPES`` are ever shown in the browser; every
+other file is sent as ``application/octet-stream`` to save.
+
+Images get a thumbnail and a larger preview, rendered by ``flask worker`` in
+its process pool (Pillow needed there); rendered files are content-addressed
+too. ``flask prune-attachments`` removes abandoned uploads and files no
+attachment refers to any more.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import secrets
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app, url_for
+from sqlalchemy import select, update
+
+try:
+    from PIL import Image
+except ImportError:  # optional dependency
+    Image = None
+
+from .models import db, Attachment, AttachmentUpload, Tenant
+from .tenancy import dedicated_tenants, tenant_scope
+
+# Bytes per read/write when receiving and hashing files.
+COPY_BUFFER = 64 * 1024
+# Longest side, in pixels, of the images rendered for each attachment.
+PREVIEW_SIZES = {"thumbnail": 256, "preview": 1280}
+RENDERABLE_MIMETYPES = {"image/jpeg", "image/png", "image/gif", "image/bmp", "image/tiff",
+                        "image/webp"}
+# Served inline on request: raster images and PDF. Never SVG or HTML, whose
+# scripts would run on the app's origin; everything else is a download.
+INLINE_MIMETYPES = {"image/jpeg", "image/png", "image/gif", "image/bmp", "image/webp",
+                    "application/pdf"}
+_MIMETYPE = re.compile(r"^[a-z0-9][a-z0-9!#$&^_.+-]*/[a-z0-9][a-z0-9!#$&^_.+-]*$")
+# Uploads started longer ago than this are abandoned.
+UPLOAD_TTL = timedelta(days=1)
+# Files younger than this are never pruned: an upload may have moved its file
+# into place without having committed its row yet.
+PRUNE_GRACE = timedelta(hours=1)
+# A preview still "running" after this long is assumed lost with its worker.
+STALE_PREVIEW_SECONDS = 15 * 60
+
+
+class UploadError(ValueError):
+    """A rejected upload or chunk; ``offset`` is where the upload stands, when that is the issue."""
+
+    def __init__(self, message, offset=None):
+        super().__init__(message)
+        self.offset = offset
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def storage_root():
+    return current_app.config.get("ATTACHMENT_DIR") or \
+        os.path.join(current_app.instance_path, "attachments")
+
+
+def blob_path(sha256):
+    return os.path.join(storage_root(), "blobs", sha256[:2], sha256)
+
+
+def preview_path(sha256, kind):
+    return os.path.join(storage_root(), "previews", sha256[:2], f"{sha256}-{kind}.png")
+
+
+def upload_path(upload_id):
+    return os.path.join(storage_root(), "uploads", f"{upload_id}.part")
+
+
+def chunk_bytes():
+    return current_app.config.get("ATTACHMENT_CHUNK_BYTES") or 8 * 1024 * 1024
+
+
+def _clean_filename(filename):
+    name = os.path.basename((filename or "").replace("\\", "/")).strip()
+    return name[-255:] or "attachment"
+
+
+def _checked_mimetype(mimetype, filename):
+    """
+    The type stored for an upload: the client's if well-formed, but one that
+    would be shown inline or rendered only when the file's extension agrees.
+    """
+    guessed = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    declared = (mimetype or "").split(";", 1)[0].strip().lower()
+    if not _MIMETYPE.match(declared) or len(declared) > 100:
+        return guessed
+    if declared in INLINE_MIMETYPES | RENDERABLE_MIMETYPES and declared != guessed:
+        return guessed
+    return declared
+
+
+def start_upload(record_id, filename, size, mimetype=None, uploaded_by=None):
+    """Open a chunked upload of ``size`` bytes for ``record_id``."""
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError("size must be the file size in bytes.")
+    limit = current_app.config.get("ATTACHMENT_MAX_BYTES")
+    if size <= 0:
+        raise UploadError("The file is empty.")
+    if limit and size > limit:
+        raise UploadError(f"Attachments are limited to {limit // (1024 * 1024)} MB.")
+    filename = _clean_filename(filename)
+    mimetype = _checked_mimetype(mimetype, filename)
+    upload = AttachmentUpload(id=secrets.token_hex(16), record_id=record_id, filename=filename,
+                              mimetype=mimetype, size=size, received=0, uploaded_by=uploaded_by)
+    path = upload_path(upload.id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+    db.session.add(upload)
+    db.session.commit()
+    return upload
+
+
+def write_chunk(upload, offset, stream, length):
+    """
+    Append ``length`` bytes from ``stream`` at ``offset``. Returns the new
+    ``Attachment`` once the upload is complete, else None. Chunks of one
+    upload must be sent one after another.
+    """
+    path = upload_path(upload.id)
+    try:
+        on_disk = os.path.getsize(path)
+    except OSError:
+        raise UploadError("Upload not found; start again.")
+    if offset != on_disk:
+        raise UploadError(f"Expected the chunk at offset {on_disk}.", offset=on_disk)
+    if offset + length > upload.size:
+        raise UploadError("Chunk goes past the declared file size.", offset=on_disk)
+    with open(path, "ab") as fh:
+        remaining = length
+        while remaining:
+            data = stream.read(min(COPY_BUFFER, remaining))
+            if not data:
+                break
+            fh.write(data)
+            remaining -= len(data)
+    upload.received = os.path.getsize(path)
+    if upload.received < upload.size:
+        db.session.commit()
+        return None
+    return _finish_upload(upload)
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for data in iter(lambda: fh.read(COPY_BUFFER), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def _finish_upload(upload):
+    part = upload_path(upload.id)
+    sha256 = _file_sha256(part)
+    target = blob_path(sha256)
+    if os.path.exists(target):
+        os.remove(part)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(part, target)
+    attachment = Attachment(
+        record_id=upload.record_id, sha256=sha256, filename=upload.filename,
+        mimetype=upload.mimetype, size=upload.size, uploaded_by=upload.uploaded_by,
+        preview_status="queued" if upload.mimetype in RENDERABLE_MIMETYPES else "none",
+    )
+    db.session.add(attachment)
+    db.session.delete(upload)
+    db.session.commit()
+    return attachment
+
+
+def record_attachments(record_id):
+    """Attachment rows of ``record_id``, oldest first; no file is read."""
+    return db.session.execute(
+        select(Attachment.id, Attachment.filename, Attachment.mimetype, Attachment.size,
+               Attachment.uploaded_by, Attachment.created_at, Attachment.preview_status)
+        .where(Attachment.record_id == record_id)
+        .order_by(Attachment.id)
+    ).all()
+
+
+def attachment_payload(row):
+    payload = {
+        "id": row.id,
+        "filename": row.filename,
+        "mimetype": row.mimetype,
+        "size": row.size,
+        "uploaded_by": row.uploaded_by,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "download_url": url_for("api.api_attachment_download", attachment_id=row.id),
+        "inline": row.mimetype in INLINE_MIMETYPES,
+    }
+    if row.preview_status == "done":
+        for kind in PREVIEW_SIZES:
+            payload[f"{kind}_url"] = url_for("api.api_attachment_preview",
+                                             attachment_id=row.id, kind=kind)
+    return payload
+
+
+# ---------------------------------------------------------------------------
+# Preview rendering, run by `flask worker` (see jobs.run_worker)
+
+def _scopes():
+    """The shared database, then each tenant database: (tenant id or None, context)."""
+    return [(None, nullcontext)] + [
+        (t.id, lambda t=t: tenant_scope(t)) for t in dedicated_tenants()
+    ]
+
+
+def requeue_stale_previews():
+    cutoff = _utcnow() - timedelta(seconds=STALE_PREVIEW_SECONDS)
+    count = 0
+    for _tenant_id, scope in _scopes():
+        with scope():
+            count += db.session.execute(
+                update(Attachment)
+                .where(Attachment.preview_status == "running",
+                       Attachment.preview_started_at < cutoff)
+                .values(preview_status="queued", preview_started_at=None)
+            ).rowcount
+            db.session.commit()
+    return count
+
+
+def claim_next_preview():
+    """Move the oldest queued preview to running; returns (tenant id or None, attachment id) or None."""
+    for tenant_id, scope in _scopes():
+        with scope():
+            while True:
+                attachment_id = db.session.scalar(
+                    select(Attachment.id).where(Attachment.preview_status == "queued")
+                    .order_by(Attachment.id).limit(1)
+                )
+                if attachment_id is None:
+                    break
+                claimed = db.session.execute(
+                    update(Attachment)
+                    .where(Attachment.id == attachment_id, Attachment.preview_status == "queued")
+                    .values(preview_status="running", preview_started_at=_utcnow())
+                ).rowcount
+                db.session.commit()
+                if claimed:
+                    return tenant_id, attachment_id
+    return None
+
+
+def _render(sha256):
+    source = blob_path(sha256)
+    for kind, pixels in PREVIEW_SIZES.items():
+        target = preview_path(sha256, kind)
+        if os.path.exists(target):
+            continue  # same content rendered for another attachment
+        with Image.open(source) as image:
+            image.thumbnail((pixels, pixels))
+            if image.mode not in ("RGB", "RGBA", "L", "LA"):
+                image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.tmp"
+            image.save(tmp, "PNG")
+        os.replace(tmp, target)
+
+
+def render_previews(attachment_id):
+    """Render one claimed attachment's images. Runs inside an app (and tenant) context."""
+    attachment = db.session.get(Attachment, attachment_id)
+    if attachment is None:
+        return "gone"
+    if Image is None:
+        status = "none"
+    else:
+        try:
+            _render(attachment.sha256)
+            status = "done"
+        except (OSError, ValueError, Image.DecompressionBombError):
+            status = "failed"
+    attachment.preview_status = status
+    db.session.commit()
+    return status
+
+
+def render_in_tenant(tenant_id, attachment_id):
+    if tenant_id is None:
+        return render_previews(attachment_id)
+    with tenant_scope(db.session.get(Tenant, tenant_id)):
+        return render_previews(attachment_id)
+
+
+# ---------------------------------------------------------------------------
+
+def prune_attachments():
+    """
+    Delete uploads started more than ``UPLOAD_TTL`` ago and stored files no
+    attachment refers to in any database. Returns (uploads, files) removed.
+    """
+    now = _utcnow()
+    uploads, referenced = 0, set()
+    for _tenant_id, scope in _scopes():
+        with scope():
+            for upload in AttachmentUpload.query.filter(
+                    AttachmentUpload.created_at < now - UPLOAD_TTL):
+                try:
+                    os.remove(upload_path(upload.id))
+                except FileNotFoundError:
+                    pass
+                db.session.delete(upload)
+                uploads += 1
+            db.session.commit()
+            referenced.update(db.session.scalars(select(Attachment.sha256).distinct()))
+
+    files = 0
+    grace = (now - PRUNE_GRACE).replace(tzinfo=timezone.utc).timestamp()
+    for top in ("blobs", "previews"):
+        for directory, _dirs, names in os.walk(os.path.join(storage_root(), top)):
+            for name in names:
+                path = os.path.join(directory, name)
+                if name[:64] in referenced or os.path.getmtime(path) > grace:
+                    continue
+                os.remove(path)
+                files += 1
+    return uploads, files
@@ -0,0 +1,103 @@
+"""
+ETag sources for conditional GETs (see decorators.conditional).
+
+Each function returns a short string that changes whenever the data behind a
+page or API response may have changed, using only indexed MAX() and COUNT()
+lookups so a revalidation costs far less than rebuilding the response.
+"""
+import hashlib
+
+from flask import request
+from flask_login import current_user
+from sqlalchemy import func, or_, select
+
+from .models import db, Record, RecordHistory, ArchivedRecord
+from .templating import reference_version
+from .tenancy import current_tenant_id
+
+# Cache-Control policies per kind of response.
+PAGE_CACHE_CONTROL = "private, no-cache"
+API_CACHE_CONTROL = "private, no-cache"
+ANALYTICS_CACHE_CONTROL = "private, max-age=30"
+
+
+def _tag(*parts):
+    raw = "|".join(str(p) for p in parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def department_watermark_statements(department):
+    """
+    Newest history row touching ``department`` plus the newest record update
+    anywhere. The latter is global on purpose: a document stays visible to every
+    office it passed through, and later edits elsewhere do not mention them.
+    Neither moves when a record is deleted, purged or archived, so the record
+    count is part of the watermark too.
+    """
+    return (
+        select(func.max(RecordHistory.id)).where(
+            or_(RecordHistory.from_department == department,
+                RecordHistory.to_department == department)
+        ),
+        select(func.max(Record.updated_at)),
+        select(func.count(Record.id)),
+    )
+
+
+def department_watermark(department):
+    return tuple(db.session.scalar(s) for s in department_watermark_statements(department))
+
+
+def viewer_key(user):
+    return current_tenant_id(), user.id, user.role, user.department
+
+
+def _viewer():
+    return viewer_key(current_user)
+
+
+def document_etag(record_id):
+    row = db.session.execute(
+        select(Record.version, Record.updated_at).where(Record.id == record_id)
+    ).first()
+    if row is None:
+        # Archived records never change; a record not found anywhere gets no ETag.
+        if db.session.get(ArchivedRecord, record_id) is None:
+            return None
+        return _tag("archived", record_id, *_viewer())
+    last_history = db.session.scalar(
+        select(func.max(RecordHistory.id)).where(RecordHistory.record_id == record_id)
+    )
+    # The transfer dialog lists the departments, so reference data is part of the page.
+    return _tag("document", record_id, row.version, row.updated_at, last_history,
+                reference_version(), *_viewer())
+
+
+def department_tag(path, query_string, watermark, viewer):
+    """ETag of a department-scoped list; shared with the async read path (asgi.py)."""
+    return _tag(path, query_string, *watermark, *viewer)
+
+
+def department_etag(**_):
+    """For department-scoped lists; the query string is part of the key."""
+    return department_tag(request.path, request.query_string,
+                          department_watermark(current_user.department), _viewer())
+
+
+def analytics_watermark_statements():
+    # prediction_scored_at: scoring leaves updated_at alone but changes the
+    # payload; the count moves when records are removed.
+    return (select(func.max(RecordHistory.id)),
+            select(func.max(Record.updated_at)),
+            select(func.max(Record.prediction_scored_at)),
+            select(func.count(Record.id)))
+
+
+def analytics_tag(path, watermark):
+    """ETag of the analytics payload; shared with the async read path (asgi.py)."""
+    return _tag(path, current_tenant_id(), *watermark)
+
+
+def analytics_etag(**_):
+    return analytics_tag(request.path,
+                         [db.session.scalar(s) for s in analytics_watermark_statements()])
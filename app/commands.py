@@ -0,0 +1,301 @@
+"""
+Maintenance commands registered on the ``flask`` CLI.
+"""
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+
+@click.command("archive-records")
+@click.option("--days", default=365, show_default=True,
+              help="Archive records closed more than this many days ago.")
+@click.option("--batch-size", default=500, show_default=True,
+              help="Records moved per transaction.")
+@with_appcontext
+def archive_records_command(days, batch_size):
+    """Move old closed records and their history into the archive tables."""
+    from .archive import archive_closed_records
+    from .tenancy import dedicated_tenants, tenant_scope
+    # The shared database holds every other tenant, so it is archived in one pass.
+    count = archive_closed_records(days, batch_size=batch_size)
+    for tenant in dedicated_tenants():
+        with tenant_scope(tenant):
+            count += archive_closed_records(days, batch_size=batch_size)
+    click.echo(f"Archived {count} record(s) closed more than {days} day(s) ago.")
+
+
+@click.command("snapshot-records")
+@click.option("--interval", default=None, type=int,
+              help="Events between two snapshots of a record (default: SNAPSHOT_INTERVAL).")
+@with_appcontext
+def snapshot_records_command(interval):
+    """Snapshot long record histories so point-in-time lookups stay fast."""
+    from .snapshots import SNAPSHOT_INTERVAL, take_snapshots
+    from .tenancy import dedicated_tenants, tenant_scope
+    interval = interval or SNAPSHOT_INTERVAL
+    count = take_snapshots(interval)
+    for tenant in dedicated_tenants():
+        with tenant_scope(tenant):
+            count += take_snapshots(interval)
+    click.echo(f"Wrote {count} snapshot(s).")
+
+
+def _each_tenant():
+    """Every tenant in turn, for per-tenant state such as watermarks and models."""
+    from .models import Tenant
+    from .tenancy import tenant_scope
+    for tenant in Tenant.query.order_by(Tenant.id).all():
+        with tenant_scope(tenant):
+            yield tenant
+
+
+@click.command("refresh-flow")
+@click.option("--batch-size", default=None, type=int,
+              help="History events folded per transaction (default: FLOW_BATCH_SIZE).")
+@with_appcontext
+def refresh_flow_command(batch_size):
+    """Bring the department/status flow analytics up to date with the history."""
+    from .flow import FLOW_BATCH_SIZE, refresh_all
+    # Watermarks are per tenant, so every tenant runs in its own scope,
+    # including those sharing the main database.
+    count = 0
+    for _tenant in _each_tenant():
+        count += refresh_all(batch_size or FLOW_BATCH_SIZE)
+    click.echo(f"Folded {count} history event(s) into the flow analytics.")
+
+
+@click.command("train-completion-model")
+@click.option("--alpha", default=None, type=float, help="Ridge penalty (default: RIDGE_ALPHA).")
+@with_appcontext
+def train_completion_model_command(alpha):
+    """Fit the completion-time model from the history, then score open documents."""
+    from .prediction import RIDGE_ALPHA, require_numpy, score_records, train_model
+    try:
+        require_numpy()
+    except RuntimeError as exc:
+        raise click.ClickException(str(exc))
+    for tenant in _each_tenant():
+        model = train_model(RIDGE_ALPHA if alpha is None else alpha)
+        if model is None:
+            click.echo(f"{tenant.slug}: no closed documents to learn from yet.")
+            continue
+        scored = score_records(full=True)
+        click.echo(f"{tenant.slug}: trained on {model['samples']} sample(s) "
+                   f"(RMSE {model['rmse_log']} log-hours), scored {scored} open document(s).")
+
+
+@click.command("score-records")
+@click.option("--all", "full", is_flag=True, help="Re-score every open document.")
+@with_appcontext
+def score_records_command(full):
+    """Refresh the cached completion predictions of open documents."""
+    from .prediction import require_numpy, score_records
+    try:
+        require_numpy()
+    except RuntimeError as exc:
+        raise click.ClickException(str(exc))
+    count = 0
+    for _tenant in _each_tenant():
+        count += score_records(full=full)
+    click.echo(f"Scored {count} document(s).")
+
+
+@click.command("escalate-overdue")
+@with_appcontext
+def escalate_overdue_command():
+    """Escalate every open document past its SLA deadline (normally done by the scheduler)."""
+    from .sla import escalate_overdue
+    count = 0
+    for _tenant in _each_tenant():
+        count += escalate_overdue()[0]
+    click.echo(f"Escalated {count} overdue document(s).")
+
+
+@click.command("recount-assignments")
+@with_appcontext
+def recount_assignments_command():
+    """Rebuild the per-staff open assignment counters from the records."""
+    from .workload import recount_loads
+    count = 0
+    for _tenant in _each_tenant():
+        count += recount_loads()
+    click.echo(f"Rebuilt {count} assignment counter(s).")
+
+
+@click.command("scan-duplicates")
+@click.option("--workers", default=None, type=int,
+              help="Processes computing signatures (default: one per CPU).")
+@click.option("--threshold", default=None, type=float,
+              help="Similarity from which a pair is listed (default: DUPLICATE_THRESHOLD).")
+@click.option("--reindex", is_flag=True, help="Recompute every signature, not only missing ones.")
+@with_appcontext
+def scan_duplicates_command(workers, threshold, reindex):
+    """Index documents for duplicate detection and list likely duplicate pairs."""
+    from .duplicates import DUPLICATE_THRESHOLD, duplicate_pairs, index_missing
+    from .models import db, Record
+    threshold = DUPLICATE_THRESHOLD if threshold is None else threshold
+    indexed = found = 0
+    for _tenant in _each_tenant():
+        indexed += index_missing(workers=workers, reindex=reindex)
+        for a, b, score in duplicate_pairs(threshold):
+            first, second = db.session.get(Record, a), db.session.get(Record, b)
+            click.echo(f"{score:.2f}\t{first.document_id}\t{second.document_id}\t"
+                       f"{first.title}\t{second.title}")
+            found += 1
+    click.echo(f"Indexed {indexed} document(s); {found} likely duplicate pair(s).")
+
+
+@click.command("purge-records")
+@click.option("--document-id", "document_ids", multiple=True,
+              help="Document ID to delete; repeat for several.")
+@click.option("--title-prefix", help='Delete documents whose title starts with this, e.g. "TEST".')
+@click.option("--department", help="Only documents currently held by this office.")
+@click.option("--created-before", type=click.DateTime(formats=["%Y-%m-%d"]),
+              help="Only documents created before this date (YYYY-MM-DD).")
+@click.option("--tenant", "tenant_slug", help="Only this tenant (default: every tenant).")
+@click.option("--batch-size", default=500, show_default=True,
+              help="Records deleted per statement.")
+@click.option("--dry-run", is_flag=True, help="Only count the matching documents.")
+@click.option("--yes", is_flag=True, help="Do not ask for confirmation.")
+@with_appcontext
+def purge_records_command(document_ids, title_prefix, department, created_before,
+                          tenant_slug, batch_size, dry_run, yes):
+    """Permanently delete test/junk documents and their history."""
+    from contextlib import nullcontext
+    from .models import Tenant
+    from .purge import count_records, purge_criteria, purge_records
+    from .tenancy import dedicated_tenants, tenant_scope
+
+    criteria = purge_criteria(document_ids, title_prefix, department, created_before)
+    if not criteria:
+        raise click.UsageError("Give at least one of --document-id, --title-prefix, "
+                               "--department or --created-before.")
+    if tenant_slug:
+        tenant = Tenant.query.filter_by(slug=tenant_slug).first()
+        if tenant is None:
+            raise click.ClickException(f"No tenant '{tenant_slug}'.")
+        scopes = [lambda: tenant_scope(tenant)]
+    else:
+        # The shared database in one pass, then each tenant database.
+        scopes = [nullcontext] + [lambda t=t: tenant_scope(t) for t in dedicated_tenants()]
+
+    matched = 0
+    for scope in scopes:
+        with scope():
+            matched += count_records(criteria)
+    if dry_run or not matched:
+        click.echo(f"{matched} document(s) match.")
+        return
+    if not yes:
+        click.confirm(f"Permanently delete {matched} document(s) and their history?", abort=True)
+    purged = 0
+    for scope in scopes:
+        with scope():
+            purged += purge_records(criteria, batch_size=batch_size)
+    click.echo(f"Deleted {purged} document(s).")
+
+
+@click.command("prune-attachments")
+@with_appcontext
+def prune_attachments_command():
+    """Delete abandoned uploads and attachment files no longer referenced."""
+    from .attachments import prune_attachments
+    uploads, files = prune_attachments()
+    click.echo(f"Removed {uploads} abandoned upload(s) and {files} unreferenced file(s).")
+
+
+@click.command("worker")
+@click.option("--processes", default=2, show_default=True,
+              help="Worker processes computing reports.")
+@click.option("--interval", default=2.0, show_default=True,
+              help="Seconds between polls of an empty queue.")
+@click.option("--once", is_flag=True, help="Drain the queue and exit.")
+@with_appcontext
+def worker_command(processes, interval, once):
+    """Run queued report and export jobs and render attachment previews."""
+    from .jobs import run_worker
+    run_worker(processes=processes, poll_interval=interval, once=once, log=click.echo)
+
+
+@click.command("seed")
+@with_appcontext
+def seed_command():
+    """Create the tables and any missing default offices, types and statuses."""
+    from .models import db
+    from .seed import ensure_default_tenant, seed_reference_data
+    from .tenancy import tenant_scope
+    db.create_all()
+    with tenant_scope(ensure_default_tenant()):
+        click.echo(f"Added {seed_reference_data()} default row(s).")
+
+
+@click.command("create-tenant")
+@click.argument("slug")
+@click.option("--name", required=True, help='Display name, e.g. "Municipality of Lucban".')
+@click.option("--code", help="Document ID prefix for this tenant, e.g. LUC.")
+@click.option("--hostname", help="Host name this tenant is served on.")
+@click.option("--database-uri", help="Own database for a large tenant (default: shared).")
+@with_appcontext
+def create_tenant_command(slug, name, code, hostname, database_uri):
+    """Register a municipality and seed its offices, types and statuses."""
+    from .models import db, Tenant
+    from .seed import ensure_default_tenant, seed_reference_data
+    from .tenancy import directory, tenant_engine, tenant_scope
+    ensure_default_tenant()
+    if Tenant.query.filter_by(slug=slug).first():
+        raise click.ClickException(f"Tenant '{slug}' already exists.")
+    tenant = Tenant(slug=slug, name=name, code=code, hostname=hostname,
+                    database_uri=database_uri)
+    db.session.add(tenant)
+    db.session.commit()
+    if database_uri:
+        db.metadata.create_all(tenant_engine(current_app, database_uri))
+    with tenant_scope(tenant):
+        added = seed_reference_data()
+    directory.invalidate()
+    click.echo(f"Created tenant {slug} (id {tenant.id}) with {added} default row(s).")
+
+
+class LazyMigrateGroup(click.Group):
+    """
+    ``flask db``: Flask-Migrate pulls in all of Alembic, so it is only
+    imported and initialised when a migration command actually runs.
+    """
+
+    def _migrate_group(self):
+        from flask import current_app
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_group
+        from .models import db
+        if "migrate" not in current_app.extensions:
+            Migrate(current_app, db)
+        return db_group
+
+    def parse_args(self, ctx, args):
+        # Take over the real group's options (--directory, --x-arg) and callback.
+        group = self._migrate_group()
+        self.params, self.callback = group.params, group.callback
+        return super().parse_args(ctx, args)
+
+    def list_commands(self, ctx):
+        return self._migrate_group().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._migrate_group().get_command(ctx, name)
+
+
+def register_commands(app):
+    app.cli.add_command(archive_records_command)
+    app.cli.add_command(snapshot_records_command)
+    app.cli.add_command(refresh_flow_command)
+    app.cli.add_command(train_completion_model_command)
+    app.cli.add_command(score_records_command)
+    app.cli.add_command(escalate_overdue_command)
+    app.cli.add_command(recount_assignments_command)
+    app.cli.add_command(scan_duplicates_command)
+    app.cli.add_command(purge_records_command)
+    app.cli.add_command(prune_attachments_command)
+    app.cli.add_command(worker_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(create_tenant_command)
+    app.cli.add_command(LazyMigrateGroup("db", help="Perform database migrations."))
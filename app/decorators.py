@@ -1,5 +1,5 @@
 from functools import wraps
-from flask import redirect, url_for, flash
+from flask import redirect, url_for, flash, request, session, make_response
 from flask_login import current_user
 
 def role_required(role):
@@ -13,4 +13,33 @@ def role_required(role):
                 return redirect(url_for("main.dashboard"))
             return f(*args, **kwargs)
         return wrapped
-    return decorator
\ No newline at end of file
+    return decorator
+
+
+def conditional(etag_func, cache_control):
+    """
+    Conditional GET support. ``etag_func`` receives the view arguments and
+    returns a cheap ETag (or None to skip caching). A matching If-None-Match is
+    answered with 304 before the view runs; otherwise the response is tagged.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            # Pending flash messages are rendered once, so never serve a cached page over them.
+            if session.get("_flashes"):
+                return f(*args, **kwargs)
+            etag = etag_func(*args, **kwargs)
+            if etag is None:
+                return f(*args, **kwargs)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response("", 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = cache_control
+            response.vary.add("Cookie")
+            return response
+        return wrapped
+    return decorator
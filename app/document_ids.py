@@ -0,0 +1,66 @@
+"""
+Sequential, office-prefixed document IDs such as ``MO-2026-000123``.
+
+Numbers come from the ``document_sequences`` counter, one row per
+(prefix, year). A caller reserves a whole block with a single atomic
+``UPDATE ... RETURNING`` in its own short transaction, so concurrent intake
+never collides and never holds the counter row lock for the length of a
+request. Like a database sequence, numbers of rolled-back requests are
+skipped rather than reused.
+"""
+from datetime import date
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, Department, DocumentSequence, Tenant
+from .tenancy import current_tenant_id, primary_engine
+
+# Zero-padded width of the sequence part, keeps IDs sortable as text.
+SEQUENCE_WIDTH = 6
+
+
+def office_prefix(department: str) -> str:
+    """
+    Document ID prefix for a department: its code, else the initials of its
+    name, after the tenant code for tenants other than the default one.
+    """
+    dept = Department.query.filter_by(name=department).first()
+    if dept and dept.code:
+        prefix = dept.code.upper()
+    else:
+        initials = "".join(word[0] for word in (department or "").split() if word[0].isalnum())
+        prefix = initials.upper() or "DOC"
+    tenant = db.session.get(Tenant, current_tenant_id())
+    if tenant is not None and tenant.code:
+        prefix = f"{tenant.code.upper()}-{prefix}"
+    return prefix
+
+
+def _reserve(conn, prefix, year, count):
+    seq = DocumentSequence.__table__
+    return conn.execute(
+        update(seq)
+        .where(seq.c.prefix == prefix, seq.c.year == year)
+        .values(last_value=seq.c.last_value + count)
+        .returning(seq.c.last_value)
+    ).scalar()
+
+
+def allocate_document_ids(department: str, count: int = 1, year: int = None) -> list:
+    """Reserve ``count`` consecutive document IDs for ``department``."""
+    prefix = office_prefix(department)
+    year = year or date.today().year
+    with primary_engine().begin() as conn:
+        last = _reserve(conn, prefix, year, count)
+        if last is None:
+            # First ID of the year for this office; another worker may race us here.
+            try:
+                with conn.begin_nested():
+                    conn.execute(insert(DocumentSequence.__table__)
+                                 .values(prefix=prefix, year=year, last_value=count))
+                last = count
+            except IntegrityError:
+                last = _reserve(conn, prefix, year, count)
+    first = last - count + 1
+    return [f"{prefix}-{year}-{n:0{SEQUENCE_WIDTH}d}" for n in range(first, last + 1)]
@@ -0,0 +1,393 @@
+"""
+Near-duplicate detection for documents registered twice.
+
+Each record is reduced to a set of features: the character 4-grams of its
+normalised title, the words of its remarks and its document type. A MinHash
+signature of ``NUM_PERM`` values estimates the Jaccard similarity of two
+such sets (the share of equal values). Locality-sensitive hashing cuts the
+signature into ``BANDS`` bands of ``ROWS`` values and indexes a hash of
+each band in ``record_lsh_bands``; only records sharing at least one bucket
+are compared. With 16 bands of 4, a pair at 0.7 similarity shares a bucket
+99% of the time, one at 0.5 about 64% and one at 0.3 about 12%.
+
+Signatures are written by an ``after_flush`` hook for records created or
+edited through the ORM, and by ``index_records`` after bulk intake. ``flask
+scan-duplicates`` computes missing signatures in a process pool (after an
+upgrade, for instance) and lists the likely duplicate pairs in the backlog.
+
+With NumPy installed each process keeps the buckets and signatures in
+memory (``_BandIndex``: sorted bucket keys, about 250 bytes per record plus
+16 keys), so a check is a binary search and a vectorised comparison, well
+under a millisecond, never a LIKE over titles. Before each check the index
+reads the signatures written since its cursor. ``record_signatures.change_seq``
+follows commit order (see sequencing.py), so no other process's write is
+missed. The first check in a process loads every signature, about 20 ms per
+thousand records, and the index is rebuilt every ``INDEX_REBUILD_SECONDS``
+to drop deleted records. Without NumPy, signatures are computed in plain
+Python, several times slower, and checks query ``record_lsh_bands``.
+"""
+import hashlib
+import os
+import re
+import struct
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from sqlalchemy import and_, bindparam, delete, event, func, insert, inspect, or_, select, union_all
+from sqlalchemy.orm import Session, aliased
+
+from .models import db, DocumentType, Record, RecordBand, RecordSignature
+from .references import reference_cache
+from .sequencing import sequence_rows
+from .tenancy import current_tenant_id
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 4
+# Estimated similarity from which two records are reported as likely duplicates.
+DUPLICATE_THRESHOLD = 0.5
+# Upper bound on matches returned per lookup, best first.
+MAX_CANDIDATES = 200
+# Seconds between full reloads of a process's in-memory band index.
+INDEX_REBUILD_SECONDS = 3600
+# Keys added since the last (re)build kept in a dict before merging them into the arrays.
+INDEX_PENDING_KEYS = 16 * 1024
+# Records per signature batch in `flask scan-duplicates`.
+SCAN_BATCH_SIZE = 2000
+
+# Universal hashing (a * x + b) mod _PRIME over 32-bit feature hashes; every
+# intermediate fits in 64 bits, so NumPy can do all NUM_PERM functions at once.
+_PRIME = (1 << 31) - 1
+
+
+def _hash32(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+# Fixed (a, b) of the NUM_PERM hash functions, derived from their index so
+# signatures stay comparable across processes and releases.
+_PERMUTATIONS = [(_hash32(f"minhash-a-{i}") % (_PRIME - 1) + 1, _hash32(f"minhash-b-{i}") % _PRIME)
+                 for i in range(NUM_PERM)]
+_SIGNATURE = struct.Struct(f"<{NUM_PERM}I")
+# NumPy (optional) and the hash functions as arrays, set by _numpy() on first
+# use rather than at import, to keep it out of app start-up.
+np = _A = _B = None
+_numpy_checked = False
+
+
+def _numpy():
+    """NumPy, imported on first use; None when it is not installed."""
+    global np, _A, _B, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+        except ImportError:  # optional dependency
+            numpy = None
+        if numpy is not None:
+            _A = numpy.array([a for a, _ in _PERMUTATIONS], dtype=numpy.uint64)[:, None]
+            _B = numpy.array([b for _, b in _PERMUTATIONS], dtype=numpy.uint64)[:, None]
+        np, _numpy_checked = numpy, True
+    return np
+
+
+def _normalise(text):
+    return " ".join(re.findall(r"\w+", (text or "").lower()))
+
+
+def features(title, doc_type=None, remarks=None):
+    """The feature set MinHash is taken over."""
+    title = _normalise(title)
+    found = {title[i:i + SHINGLE] for i in range(max(len(title) - SHINGLE + 1, 1))}
+    found.update(f"w:{word}" for word in _normalise(remarks).split() if len(word) > 1)
+    if doc_type:
+        found.add(f"type:{doc_type}")
+    found.discard("")
+    return found
+
+
+def signature(feature_set):
+    """MinHash signature (a tuple of NUM_PERM ints) of ``feature_set``."""
+    values = [_hash32(f) for f in feature_set] or [0]
+    if _numpy() is not None:
+        x = np.array(values, dtype=np.uint64)[None, :]
+        return tuple(int(v) for v in ((_A * x + _B) % _PRIME).min(axis=1))
+    return tuple(min((a * x + b) % _PRIME for x in values) for a, b in _PERMUTATIONS)
+
+
+def band_buckets(sig):
+    """Bucket (a signed 64-bit int) of each band of ``sig``."""
+    return _packed_buckets(_SIGNATURE.pack(*sig))
+
+
+def _packed_buckets(packed):
+    width = ROWS * 4
+    return [int.from_bytes(hashlib.blake2b(packed[b * width:(b + 1) * width], digest_size=8)
+                           .digest(), "little", signed=True)
+            for b in range(BANDS)]
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def signature_rows(rows):
+    """[(record_id, packed signature, buckets)] for [(record_id, title, doc_type, remarks)]."""
+    result = []
+    for record_id, title, doc_type, remarks in rows:
+        sig = signature(features(title, doc_type, remarks))
+        result.append((record_id, _SIGNATURE.pack(*sig), band_buckets(sig)))
+    return result
+
+
+def _store(conn, computed, tenant_ids):
+    """Replace the signatures and bands of the ``computed`` (``signature_rows``) records."""
+    ids = [record_id for record_id, _, _ in computed]
+    signatures, bands = RecordSignature.__table__, RecordBand.__table__
+    conn.execute(delete(bands).where(bands.c.record_id.in_(ids)))
+    conn.execute(delete(signatures).where(signatures.c.record_id.in_(ids)))
+    conn.execute(insert(signatures), [
+        {"record_id": i, "tenant_id": tenant_ids[i], "signature": packed}
+        for i, packed, _ in computed
+    ])
+    conn.execute(insert(bands), [
+        {"record_id": i, "tenant_id": tenant_ids[i], "band": band, "bucket": bucket}
+        for i, _, buckets in computed for band, bucket in enumerate(buckets)
+    ])
+
+
+def _connection(session):
+    return session.connection(bind_arguments={"mapper": inspect(RecordSignature)})
+
+
+@event.listens_for(Session, "after_flush")
+def _index_flushed(session, flush_context):
+    records = [r for r in session.new if isinstance(r, Record)]
+    records += [r for r in session.dirty if isinstance(r, Record) and any(
+        inspect(r).attrs[key].history.has_changes() for key in ("title", "remarks", "doc_type_id"))]
+    if not records:
+        return
+    cache = reference_cache()
+    computed = signature_rows([(r.id, r.title, cache.name(DocumentType, r.doc_type_id), r.remarks)
+                               for r in records])
+    _store(_connection(session), computed, {r.id: r.tenant_id for r in records})
+
+
+def index_records(rows, tenant_id):
+    """Index records inserted with Core: ``rows`` are (record_id, title, doc_type, remarks)."""
+    if rows:
+        _store(_connection(db.session), signature_rows(rows), {row[0]: tenant_id for row in rows})
+
+
+def _band_key(band, bucket):
+    """One int64 per (band, bucket): the band replaces the bucket's low 4 bits."""
+    return (bucket & ~(BANDS - 1)) | band
+
+
+def _sync_statements():
+    """A tenant's signatures past ``:cursor``, alone and with a probe for an unnumbered row."""
+    table = RecordSignature.__table__
+    columns = (table.c.record_id, table.c.signature, table.c.change_seq)
+    # Core, so the tenant condition is spelled out; each half is an index range.
+    newer = select(*columns).where(table.c.tenant_id == bindparam("tenant_id"),
+                                   table.c.change_seq > bindparam("cursor"))
+    waiting = select(*columns).where(table.c.change_seq.is_(None)).limit(1)
+    return newer, union_all(waiting.subquery().select(), newer)
+
+
+_NEWER_SIGNATURES, _SYNC_STATEMENT = _sync_statements()
+
+
+class _BandIndex:
+    """In-process copy of one tenant's bands and signatures (NumPy only)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.built_at = time.monotonic()
+        self.cursor = 0
+        # Signature rows, appended as records are (re)indexed; a re-indexed
+        # record's previous row is no longer live.
+        self.matrix = np.empty((1024, NUM_PERM), dtype=np.uint32)
+        self.ids = np.empty(1024, dtype=np.int64)
+        self.live = np.zeros(1024, dtype=bool)
+        self.size = 0
+        self.row_of = {}  # record id -> its live row
+        self.keys = np.empty(0, dtype=np.int64)  # sorted band keys
+        self.rows = np.empty(0, dtype=np.int64)  # signature row of each key
+        self.pending = {}  # band key -> [row], not yet merged into the arrays
+
+    def _append(self, record_id, packed):
+        if self.size == len(self.ids):
+            grow = len(self.ids)
+            self.matrix = np.concatenate([self.matrix, np.empty_like(self.matrix[:grow])])
+            self.ids = np.concatenate([self.ids, np.empty(grow, dtype=np.int64)])
+            self.live = np.concatenate([self.live, np.zeros(grow, dtype=bool)])
+        row = self.size
+        self.size += 1
+        self.matrix[row] = np.frombuffer(packed, dtype="<u4")
+        self.ids[row] = record_id
+        self.live[row] = True
+        previous = self.row_of.get(record_id)
+        if previous is not None:
+            self.live[previous] = False
+        self.row_of[record_id] = row
+        for band, bucket in enumerate(_packed_buckets(packed)):
+            self.pending.setdefault(_band_key(band, bucket), []).append(row)
+
+    def _merge(self):
+        keys = np.array([k for k, rows in self.pending.items() for _ in rows], dtype=np.int64)
+        rows = np.array([r for found in self.pending.values() for r in found], dtype=np.int64)
+        keys = np.concatenate([self.keys, keys])
+        rows = np.concatenate([self.rows, rows])
+        order = np.argsort(keys, kind="stable")
+        self.keys, self.rows, self.pending = keys[order], rows[order], {}
+
+    def sync(self):
+        """Take in the signatures committed since the last call."""
+        if time.monotonic() - self.built_at > INDEX_REBUILD_SECONDS:
+            self._reset()
+        # One statement when nothing is waiting for a number (the usual case).
+        params = {"tenant_id": current_tenant_id(), "cursor": self.cursor}
+        rows = db.session.execute(_SYNC_STATEMENT, params).all()
+        if any(row.change_seq is None for row in rows):
+            sequence_rows(RecordSignature.__table__)
+            rows = db.session.execute(_NEWER_SIGNATURES, params).all()
+        rows.sort(key=lambda row: row.change_seq)
+        for record_id, packed, change_seq in rows:
+            self._append(record_id, packed)
+            self.cursor = change_seq
+        if len(self.pending) > INDEX_PENDING_KEYS or (rows and not len(self.keys)):
+            self._merge()
+
+    def _candidates(self, buckets):
+        """Live signature rows sharing at least one band with ``buckets``."""
+        query = np.array([_band_key(band, bucket) for band, bucket in enumerate(buckets)],
+                         dtype=np.int64)
+        starts = np.searchsorted(self.keys, query, side="left")
+        ends = np.searchsorted(self.keys, query, side="right")
+        found = [self.rows[a:b] for a, b in zip(starts.tolist(), ends.tolist()) if b > a]
+        extra = [r for key in query.tolist() for r in self.pending.get(key, ())]
+        if extra:
+            found.append(np.array(extra, dtype=np.int64))
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        rows = np.unique(np.concatenate(found))
+        return rows[self.live[rows]]
+
+    def lookup(self, sig, buckets, exclude_id, threshold, limit):
+        rows = self._candidates(buckets)
+        if exclude_id is not None:
+            rows = rows[self.ids[rows] != exclude_id]
+        if not len(rows):
+            return []
+        scores = (self.matrix[rows] == np.array(sig, dtype=np.uint32)).sum(axis=1) / NUM_PERM
+        keep = scores >= threshold
+        rows, scores = rows[keep], scores[keep]
+        ids = self.ids[rows]
+        order = np.lexsort((ids, -scores))[:limit]
+        return list(zip(ids[order].tolist(), scores[order].tolist()))
+
+
+def _band_index():
+    indexes = current_app.extensions.setdefault("duplicate_index", {})
+    return indexes.setdefault(current_tenant_id(), _BandIndex())
+
+
+def _query_duplicates(sig, buckets, exclude_id, threshold, limit):
+    """``find_duplicates`` through ``record_lsh_bands``, when NumPy is missing."""
+    # One equality per band rather than a row-value IN: SQLite only uses the
+    # (band, bucket) index for the former.
+    keys = or_(*(and_(RecordBand.band == band, RecordBand.bucket == bucket)
+                 for band, bucket in enumerate(buckets)))
+    query = select(RecordBand.record_id).where(keys)
+    if exclude_id is not None:
+        query = query.where(RecordBand.record_id != exclude_id)
+    # Most shared bands first: those are the likeliest matches.
+    candidates = db.session.scalars(
+        query.group_by(RecordBand.record_id)
+        .order_by(func.count().desc(), RecordBand.record_id)
+        .limit(MAX_CANDIDATES)
+    ).all()
+    if not candidates:
+        return []
+    rows = db.session.execute(
+        select(RecordSignature.record_id, RecordSignature.signature)
+        .where(RecordSignature.record_id.in_(candidates))
+    )
+    scored = [(record_id, similarity(sig, _SIGNATURE.unpack(packed))) for record_id, packed in rows]
+    scored = [s for s in scored if s[1] >= threshold]
+    scored.sort(key=lambda s: (-s[1], s[0]))
+    return scored[:limit]
+
+
+def find_duplicates(title, doc_type=None, remarks=None, exclude_id=None,
+                    threshold=DUPLICATE_THRESHOLD, limit=5):
+    """
+    [(record_id, similarity)] of the indexed records most like this text, best
+    first. Ids of records deleted since the index was built may appear;
+    callers look the records up anyway.
+    """
+    sig = signature(features(title, doc_type, remarks))
+    buckets = band_buckets(sig)
+    if _numpy() is None:
+        return _query_duplicates(sig, buckets, exclude_id, threshold, limit)
+    index = _band_index()
+    with index.lock:
+        index.sync()
+        return index.lookup(sig, buckets, exclude_id, threshold, limit)
+
+
+def index_missing(workers=None, reindex=False, batch_size=SCAN_BATCH_SIZE):
+    """
+    Compute the signatures of the current tenant's records that have none
+    (all with ``reindex``) in a pool of ``workers`` processes. Returns how many.
+    """
+    workers = workers or os.cpu_count() or 1
+    cache = reference_cache()
+    query = select(Record.id, Record.tenant_id, Record.title, Record.doc_type_id, Record.remarks)
+    if not reindex:
+        query = query.where(~select(RecordSignature.record_id)
+                            .where(RecordSignature.record_id == Record.id).exists())
+    indexed, last_id = 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            rows = db.session.execute(
+                query.where(Record.id > last_id).order_by(Record.id).limit(batch_size * workers)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            tenant_ids = {r.id: r.tenant_id for r in rows}
+            texts = [(r.id, r.title, cache.name(DocumentType, r.doc_type_id), r.remarks) for r in rows]
+            chunks = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+            for computed in pool.map(signature_rows, chunks):
+                _store(_connection(db.session), computed, tenant_ids)
+            db.session.commit()
+            indexed += len(rows)
+    return indexed
+
+
+def duplicate_pairs(threshold=DUPLICATE_THRESHOLD):
+    """[(record_id, record_id, similarity)] of indexed records likely duplicating each other."""
+    other = aliased(RecordBand)
+    candidates = db.session.execute(
+        select(RecordBand.record_id, other.record_id).distinct()
+        .join(other, (other.band == RecordBand.band) & (other.bucket == RecordBand.bucket)
+              & (other.record_id > RecordBand.record_id))
+        .order_by(RecordBand.record_id, other.record_id)
+    ).all()
+    ids = sorted({i for pair in candidates for i in pair})
+    signatures = {}
+    for start in range(0, len(ids), 1000):
+        rows = db.session.execute(
+            select(RecordSignature.record_id, RecordSignature.signature)
+            .where(RecordSignature.record_id.in_(ids[start:start + 1000])))
+        signatures.update((record_id, _SIGNATURE.unpack(packed)) for record_id, packed in rows)
+    pairs = [(a, b, similarity(signatures[a], signatures[b])) for a, b in candidates]
+    return [p for p in pairs if p[2] >= threshold]
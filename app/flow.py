@@ -0,0 +1,240 @@
+"""
+Document flow analytics: how documents move between departments and
+statuses, how long they stay before moving on, and how often they bounce.
+
+The aggregates live in ``flow_transitions`` and are maintained
+incrementally: ``refresh_flow`` folds only the ``record_history`` events
+after the tenant's watermark (``flow_watermarks``) into them, using the
+last known position of each record (``flow_positions``) as the starting
+point. The watermark is a ``change_seq``, which follows commit order (see
+sequencing.py), so an event whose transaction commits late is still folded. It runs at the start of ``GET /api/flow`` (a bounded number of events
+per request) and from ``flask refresh-flow`` for backfills and cron.
+
+Department moves follow the holder, as in snapshots.py: a document moves
+from A to B when B receives it, and its dwell time is how long A held it.
+A rejected transfer does not move it; it counts as rework on the A -> B
+edge instead. Status moves are every status change; those caused by a
+rejection (the status reverting) count as rework too.
+
+Dwell times are kept as counts per ``DWELL_BUCKETS`` bucket, so medians are
+approximate (interpolated inside a bucket) but cost nothing to maintain.
+"""
+import json
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from .models import (db, Department, DocumentStatus, FlowPosition, FlowTransition,
+                     FlowWatermark, RecordHistory)
+from .references import reference_cache
+from .sequencing import sequence_rows
+
+KINDS = {"department": Department, "status": DocumentStatus}
+# Upper bounds (seconds) of the dwell time histogram buckets; the last is open.
+DWELL_BUCKETS = (
+    60, 5 * 60, 15 * 60, 30 * 60, 3600, 2 * 3600, 4 * 3600, 8 * 3600, 12 * 3600,
+    86400, 2 * 86400, 3 * 86400, 5 * 86400, 7 * 86400, 14 * 86400, 30 * 86400, 60 * 86400,
+)
+# Events folded per transaction.
+FLOW_BATCH_SIZE = 5000
+# Records per position lookup.
+POSITION_CHUNK = 500
+
+
+def _watermark():
+    """This tenant's watermark row, created on first use."""
+    row = FlowWatermark.query.first()
+    if row is None:
+        db.session.add(FlowWatermark(last_change_seq=0))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+        row = FlowWatermark.query.first()
+    return row
+
+
+def _positions(record_ids):
+    positions = {}
+    record_ids = list(record_ids)
+    for start in range(0, len(record_ids), POSITION_CHUNK):
+        chunk = record_ids[start:start + POSITION_CHUNK]
+        for position in FlowPosition.query.filter(FlowPosition.record_id.in_(chunk)):
+            positions[position.record_id] = position
+    return positions
+
+
+class _Edge:
+    __slots__ = ("count", "rework", "seconds", "histogram")
+
+    def __init__(self):
+        self.count = self.rework = 0
+        self.seconds = 0.0
+        self.histogram = [0] * (len(DWELL_BUCKETS) + 1)
+
+    def add(self, since, moment, rework=False):
+        if rework:
+            self.rework += 1
+            return
+        seconds = max((moment - since).total_seconds(), 0.0) if since else 0.0
+        self.count += 1
+        self.seconds += seconds
+        self.histogram[bisect_left(DWELL_BUCKETS, seconds)] += 1
+
+
+def _fold(events, positions):
+    """Fold ``events`` (in commit order) into ``positions``; returns {(kind, source, target): _Edge}."""
+    edges = defaultdict(_Edge)
+    for event in events:
+        position = positions.get(event.record_id)
+        if position is None:
+            position = positions[event.record_id] = FlowPosition(
+                record_id=event.record_id, tenant_id=event.tenant_id)
+        action, moment = event.action_type, event.timestamp
+
+        if action == "rejected_transfer":
+            if event.from_department_id is not None and event.to_department_id is not None:
+                edges["department", event.from_department_id, event.to_department_id].add(
+                    None, moment, rework=True)
+        elif action in ("create", "received") and event.to_department_id is not None:
+            if position.department_id is None:
+                position.department_since = moment
+            elif position.department_id != event.to_department_id:
+                edges["department", position.department_id, event.to_department_id].add(
+                    position.department_since, moment)
+                position.department_since = moment
+            position.department_id = event.to_department_id
+
+        if event.status_id is not None and event.status_id != position.status_id:
+            if position.status_id is not None:
+                edge = edges["status", position.status_id, event.status_id]
+                edge.add(position.status_since, moment)
+                if action == "rejected_transfer":
+                    edge.rework += 1
+            position.status_id, position.status_since = event.status_id, moment
+    return edges
+
+
+def _merge(edges):
+    """Add ``edges`` to the stored transitions."""
+    stored = {(t.kind, t.source_id, t.target_id): t for t in FlowTransition.query}
+    for key, edge in edges.items():
+        transition = stored.get(key)
+        if transition is None:
+            kind, source, target = key
+            transition = FlowTransition(kind=kind, source_id=source, target_id=target, count=0,
+                                        rework=0, total_seconds=0.0, histogram="[]")
+            db.session.add(transition)
+        histogram = json.loads(transition.histogram) or [0] * len(edge.histogram)
+        transition.histogram = json.dumps([a + b for a, b in zip(histogram, edge.histogram)])
+        transition.count += edge.count
+        transition.rework += edge.rework
+        transition.total_seconds += edge.seconds
+
+
+def refresh_flow(limit=FLOW_BATCH_SIZE):
+    """
+    Fold up to ``limit`` history events past the watermark into the flow
+    tables, in one transaction. Returns the number folded; 0 when there was
+    nothing new or another process advanced the watermark first.
+    """
+    sequence_rows(RecordHistory.__table__)
+    watermark = _watermark()
+    start = watermark.last_change_seq
+    events = db.session.execute(
+        select(RecordHistory.change_seq, RecordHistory.record_id, RecordHistory.tenant_id,
+               RecordHistory.action_type, RecordHistory.timestamp, RecordHistory.status_id,
+               RecordHistory.from_department_id, RecordHistory.to_department_id)
+        .where(RecordHistory.change_seq > start)
+        .order_by(RecordHistory.change_seq)
+        .limit(limit)
+    ).all()
+    if not events:
+        db.session.rollback()
+        return 0
+
+    try:
+        # Claim the range first: a concurrent refresh that read the same
+        # watermark matches no row here and backs off without double counting.
+        claimed = db.session.execute(
+            update(FlowWatermark)
+            .where(FlowWatermark.id == watermark.id, FlowWatermark.last_change_seq == start)
+            .values(last_change_seq=events[-1].change_seq, updated_at=datetime.now(timezone.utc))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            db.session.rollback()
+            return 0
+        positions = _positions({e.record_id for e in events})
+        _merge(_fold(events, positions))
+        db.session.add_all(positions.values())
+        db.session.commit()
+    except OperationalError:
+        # SQLite: another writer got there first.
+        db.session.rollback()
+        return 0
+    return len(events)
+
+
+def refresh_all(batch_size=FLOW_BATCH_SIZE):
+    """Run ``refresh_flow`` until it catches up. Returns the number of events folded."""
+    total = 0
+    while True:
+        folded = refresh_flow(batch_size)
+        total += folded
+        if folded < batch_size:
+            return total
+
+
+def median_seconds(histogram):
+    """Approximate median of a dwell histogram, interpolated within its bucket."""
+    total = sum(histogram)
+    if not total:
+        return None
+    middle, seen = total / 2, 0
+    for index, count in enumerate(histogram):
+        if count and seen + count >= middle:
+            lower = DWELL_BUCKETS[index - 1] if index else 0
+            if index == len(DWELL_BUCKETS):
+                return float(lower)
+            return lower + (DWELL_BUCKETS[index] - lower) * (middle - seen) / count
+        seen += count
+    return None
+
+
+def _hours(seconds):
+    return round(seconds / 3600, 2) if seconds is not None else None
+
+
+def flow_graph(kind):
+    """
+    Sankey-ready ``{"nodes": [...], "links": [...]}`` for ``kind``
+    ("department" or "status"). Links name their source and target; ``value``
+    is the number of completed moves and ``rework`` the bounces.
+    """
+    model = KINDS[kind]
+    cache = reference_cache()
+    links, names = [], set()
+    transitions = (FlowTransition.query.filter_by(kind=kind)
+                   .order_by(FlowTransition.count.desc(), FlowTransition.id))
+    for t in transitions:
+        source, target = cache.name(model, t.source_id), cache.name(model, t.target_id)
+        names.update((source, target))
+        links.append({
+            "source": source,
+            "target": target,
+            "value": t.count,
+            "rework": t.rework,
+            "median_dwell_hours": _hours(median_seconds(json.loads(t.histogram))),
+            "avg_dwell_hours": _hours(t.total_seconds / t.count) if t.count else None,
+        })
+    watermark = FlowWatermark.query.first()
+    return {
+        "kind": kind,
+        "through_change_seq": watermark.last_change_seq if watermark else 0,
+        "nodes": [{"id": name} for name in sorted(names, key=str)],
+        "links": links,
+    }
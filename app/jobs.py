@@ -0,0 +1,238 @@
+"""
+Database-backed job queue for heavy reports and exports.
+
+Requests enqueue a ``ReportJob`` row; ``flask worker`` claims queued rows and
+computes them in a process pool, so no external broker is needed. The same
+pool renders attachment previews (see attachments.py) when no report waits. Finished
+jobs double as a result cache keyed by (department, report type, date range):
+a new request for the same key is answered by the finished job as long as no
+newer ``RecordHistory`` row exists.
+
+A running worker keeps a row in ``worker_heartbeats`` fresh. With none
+alive (the default deployment runs no worker) requests queue nothing and
+build the report themselves.
+"""
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, select, update
+
+from .models import db, RecordHistory, ReportJob, Tenant, WorkerHeartbeat
+from .tenancy import tenant_scope
+
+ACTIVE_STATUSES = ("queued", "running")
+# A job still "running" after this long is assumed lost with its worker.
+STALE_JOB_SECONDS = 15 * 60
+# How often a worker refreshes its heartbeat, and how old the newest one may
+# be for requests to still count on a worker.
+HEARTBEAT_SECONDS = 10
+WORKER_STALE_SECONDS = 3 * HEARTBEAT_SECONDS
+
+# Process-local Flask app of a pool worker, created by _init_worker.
+_worker_app = None
+
+
+def history_watermark():
+    return db.session.scalar(select(func.max(RecordHistory.id))) or 0
+
+
+def _same_key(department, report_type, date_from, date_to):
+    return ReportJob.query.filter(
+        ReportJob.department == department,
+        ReportJob.report_type == report_type,
+        ReportJob.date_from.is_(None) if date_from is None else ReportJob.date_from == date_from,
+        ReportJob.date_to.is_(None) if date_to is None else ReportJob.date_to == date_to,
+    )
+
+
+def worker_active():
+    """Whether some ``flask worker`` has sent a heartbeat lately."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=WORKER_STALE_SECONDS)
+    return db.session.scalar(
+        select(WorkerHeartbeat.worker).where(WorkerHeartbeat.seen_at >= cutoff).limit(1)
+    ) is not None
+
+
+def _heartbeat(worker):
+    now = datetime.now(timezone.utc)
+    beat = db.session.execute(
+        update(WorkerHeartbeat).where(WorkerHeartbeat.worker == worker).values(seen_at=now)
+    ).rowcount
+    if not beat:
+        db.session.add(WorkerHeartbeat(worker=worker, seen_at=now))
+    db.session.commit()
+
+
+def enqueue_report(department, report_type, date_from=None, date_to=None, requested_by=None,
+                   queue=True):
+    """
+    Return a job for the report: a finished one that is still current, one
+    already queued or running for the same key, or a newly queued job.
+    Without ``queue`` (no worker running) only a current finished job is
+    returned, else None.
+    """
+    same_key = _same_key(department, report_type, date_from, date_to)
+    cached = (same_key.filter(ReportJob.status == "done")
+              .order_by(ReportJob.id.desc()).first())
+    if cached and cached.history_watermark == history_watermark():
+        return cached
+    if not queue:
+        return None
+    active = (same_key.filter(ReportJob.status.in_(ACTIVE_STATUSES))
+              .order_by(ReportJob.id.desc()).first())
+    if active:
+        return active
+    job = ReportJob(department=department, report_type=report_type,
+                    date_from=date_from, date_to=date_to, requested_by=requested_by)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def requeue_stale_jobs():
+    """Put jobs abandoned by a crashed worker back on the queue."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=STALE_JOB_SECONDS)
+    count = db.session.execute(
+        update(ReportJob)
+        .where(ReportJob.status == "running", ReportJob.started_at < cutoff)
+        .values(status="queued", started_at=None)
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def claim_next_job():
+    """Atomically move the oldest queued job to running; returns its id or None."""
+    while True:
+        job_id = db.session.scalar(
+            select(ReportJob.id).where(ReportJob.status == "queued")
+            .order_by(ReportJob.id).limit(1)
+        )
+        if job_id is None:
+            return None
+        claimed = db.session.execute(
+            update(ReportJob)
+            .where(ReportJob.id == job_id, ReportJob.status == "queued")
+            .values(status="running", started_at=datetime.now(timezone.utc))
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return job_id
+        # Another worker took it first; try the next one.
+
+
+def run_job(job_id):
+    """Compute one claimed job and store its result. Runs inside an app context."""
+    from .reports import build_report
+
+    job = db.session.get(ReportJob, job_id)
+    tenant = db.session.get(Tenant, job.tenant_id)
+    try:
+        # The queue is shared; the report reads only the job's tenant.
+        with tenant_scope(tenant):
+            watermark = history_watermark()
+            body, mimetype, filename = build_report(job.department, job.report_type,
+                                                    job.date_from, job.date_to)
+    except Exception as exc:
+        db.session.rollback()
+        job = db.session.get(ReportJob, job_id)
+        job.status = "failed"
+        job.error = str(exc)
+    else:
+        job.status = "done"
+        job.result = body
+        job.mimetype = mimetype
+        job.filename = filename
+        job.history_watermark = watermark
+    job.finished_at = datetime.now(timezone.utc)
+    db.session.commit()
+    return job.status
+
+
+def _init_worker():
+    global _worker_app
+    from . import create_app
+    _worker_app = create_app()
+
+
+def _run_in_worker(job_id):
+    with _worker_app.app_context():
+        return run_job(job_id)
+
+
+def _render_in_worker(tenant_id, attachment_id):
+    from .attachments import render_in_tenant
+    with _worker_app.app_context():
+        return render_in_tenant(tenant_id, attachment_id)
+
+
+def _claim_next_task(pool):
+    """Submit the next report job, else the next attachment preview; returns (label, future) or None."""
+    from .attachments import claim_next_preview
+    job_id = claim_next_job()
+    if job_id is not None:
+        return f"Job {job_id}", pool.submit(_run_in_worker, job_id)
+    claimed = claim_next_preview()
+    if claimed is not None:
+        return f"Preview {claimed[1]}", pool.submit(_render_in_worker, *claimed)
+    return None
+
+
+def run_worker(processes=2, poll_interval=2.0, once=False, log=print):
+    """
+    Claim queued jobs, then attachment previews, and run them in a pool of
+    ``processes`` worker processes. With ``once`` it drains the queues and
+    returns instead of polling forever.
+    """
+    from .attachments import requeue_stale_previews
+    worker = f"{socket.gethostname()}:{os.getpid()}"[:100]
+    requeued = requeue_stale_jobs() + requeue_stale_previews()
+    if requeued:
+        log(f"Re-queued {requeued} stale job(s).")
+    running, beat_at = {}, 0.0
+    try:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker) as pool:
+            while True:
+                if time.monotonic() - beat_at >= HEARTBEAT_SECONDS:
+                    _heartbeat(worker)
+                    beat_at = time.monotonic()
+                for label, future in list(running.items()):
+                    if future.done():
+                        del running[label]
+                        try:
+                            log(f"{label}: {future.result()}")
+                        except Exception as exc:
+                            log(f"{label}: worker error {exc}")
+                while len(running) < processes:
+                    task = _claim_next_task(pool)
+                    if task is None:
+                        break
+                    running[task[0]] = task[1]
+                if once and not running:
+                    return
+                time.sleep(poll_interval if not running else min(poll_interval, 0.2))
+    finally:
+        db.session.rollback()
+        db.session.execute(delete(WorkerHeartbeat).where(WorkerHeartbeat.worker == worker))
+        db.session.commit()
+
+
+def job_payload(job):
+    from flask import url_for
+    payload = {
+        "id": job.id,
+        "report_type": job.report_type,
+        "status": job.status,
+        "date_from": job.date_from.isoformat() if job.date_from else None,
+        "date_to": job.date_to.isoformat() if job.date_to else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == "done":
+        payload["download_url"] = url_for("api.api_job_download", job_id=job.id)
+    if job.status == "failed":
+        payload["error"] = job.error
+    return payload
@@ -1,12 +1,75 @@
+import enum
 from datetime import datetime, timezone
 from flask_login import UserMixin
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.types import SmallInteger, TypeDecorator
 from werkzeug.security import generate_password_hash, check_password_hash
 
-db = SQLAlchemy()
+from .references import reference_name
+from .replicas import RoutingSession
+from .tenancy import TenantMixin
 
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
-class User(db.Model, UserMixin):
+# Statuses that mean the document is fully done (no more transfers allowed).
+COMPLETED_STATUSES = {"Closed", "With Checked and Closed"}
+PRIORITIES = ("Normal", "Urgent", "Routine")
+# Queue order of the priorities (Record.priority_rank): lower is served first.
+PRIORITY_RANKS = {"Urgent": 0, "Normal": 1, "Routine": 2}
+
+
+class ActionType(enum.IntEnum):
+    """History event kinds and their stored codes. Never renumber: codes are persisted."""
+    create = 1
+    transfer = 2
+    received = 3
+    rejected_transfer = 4
+    assigned = 5
+    edit = 6
+    close = 7
+
+
+class ActionTypeCode(TypeDecorator):
+    """
+    ``ActionType`` stored as a SMALLINT. Binds accept the name ("transfer") or the
+    enum member and results come back as the name, so comparisons, filter_by()
+    and templates keep using plain strings.
+    """
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if not isinstance(value, ActionType):
+            try:
+                value = ActionType[value]
+            except KeyError:
+                raise ValueError(f"Unknown action type {value!r}.") from None
+        return int(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else ActionType(value).name
+
+
+class Tenant(db.Model):
+    """A municipality hosted on this deployment; lives in the shared database."""
+    __tablename__ = "tenants"
+
+    id = db.Column(db.Integer, primary_key=True)
+    slug = db.Column(db.String(50), unique=True, nullable=False)
+    name = db.Column(db.String(150), nullable=False)
+    # Prepended to document IDs ("LUC-MO-2026-000001"); empty for the default tenant.
+    code = db.Column(db.String(10), nullable=True)
+    # Requests for this host name are served as this tenant.
+    hostname = db.Column(db.String(255), unique=True, nullable=True)
+    # Own database for large tenants; None means the shared database.
+    database_uri = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class User(TenantMixin, db.Model, UserMixin):
     __tablename__ = "users"
 
     id = db.Column(db.Integer, primary_key=True)
@@ -29,67 +92,409 @@ class User(db.Model, UserMixin):
         return str(self.id)
 
 
-class DocumentType(db.Model):
+class DocumentType(TenantMixin, db.Model):
     __tablename__ = 'document_type'
+    __table_args__ = (
+        db.UniqueConstraint('tenant_id', 'name', name='uq_document_type_tenant_name'),
+        # Never reuse ids on SQLite: the reference cache is keyed on count and max id.
+        {'sqlite_autoincrement': True},
+    )
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(150), unique=True, nullable=False)
+    name = db.Column(db.String(150), nullable=False)
+    # Hours from intake to the deadline of documents of this type; NULL = no SLA (see sla.py).
+    sla_hours = db.Column(db.Integer, nullable=True)
 
 
-class DocumentStatus(db.Model):
+class DocumentStatus(TenantMixin, db.Model):
     __tablename__ = 'document_status'
+    __table_args__ = (
+        db.UniqueConstraint('tenant_id', 'name', name='uq_document_status_tenant_name'),
+        # Never reuse ids on SQLite: the reference cache is keyed on count and max id.
+        {'sqlite_autoincrement': True},
+    )
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(150), unique=True, nullable=False)
+    name = db.Column(db.String(150), nullable=False)
+    # Set by the application rather than the workflow ("Assigned", "With Checked and
+    # Closed"); kept out of the status dropdowns and the next-status chain.
+    is_system = db.Column(db.Boolean, default=False, nullable=False, server_default=db.false())
 
 
-class Record(db.Model):
+class Department(TenantMixin, db.Model):
+    __tablename__ = "departments"
+    # Never reuse ids on SQLite: the reference cache is keyed on count and max id.
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    # Short office code used as the document ID prefix, e.g. "MO" for Mayor Office.
+    code = db.Column(db.String(20), nullable=True)
+
+    def __str__(self):
+        return self.name
+
+
+def _priority_rank(context):
+    """Column default for Record.priority_rank, so Core bulk inserts get it too."""
+    priority = context.get_current_parameters().get("priority") or "Normal"
+    return PRIORITY_RANKS.get(priority, PRIORITY_RANKS["Normal"])
+
+
+class Record(TenantMixin, db.Model):
     __tablename__ = 'records'
+    __table_args__ = (
+        # Work queues: a department's documents by priority, then deadline.
+        db.Index('ix_records_queue', 'department_id', 'priority_rank', 'due_at'),
+        # The escalation scheduler walks deadlines in order.
+        db.Index('ix_records_due_at', 'due_at'),
+        # Never reuse ids on SQLite: archived records keep their original id.
+        {'sqlite_autoincrement': True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     document_id = db.Column(db.String(50), unique=True, nullable=False)
     title = db.Column(db.String(255), nullable=False)
-    doc_type = db.Column(db.String(100), nullable=False)
+    doc_type_id = db.Column(db.Integer, db.ForeignKey('document_type.id'), nullable=False, index=True)
     action_taken = db.Column(db.String(100), nullable=True)
-    department = db.Column(db.String(100), nullable=False)
-    implementing_office = db.Column(db.String(100), nullable=False)
+    # department_id, received_by and status_id load their old value when set
+    # (active_history): the assignment counters in workload.py need it.
+    department_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=False, index=True),
+        active_history=True)
+    implementing_office_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=False)
     date_received = db.Column(db.Date, nullable=False)
     released_by = db.Column(db.String(100), nullable=False)
-    received_by = db.Column(db.String(100), nullable=False)
-    status = db.Column(db.String(100), nullable=False)
+    received_by = db.column_property(db.Column(db.String(100), nullable=False),
+                                     active_history=True)
+    status_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('document_status.id'), nullable=False, index=True),
+        active_history=True)
     priority = db.Column(db.String(20), default="Normal", nullable=False)
+    # PRIORITY_RANKS[priority], kept in step by _priority_rank and _sync_priority_rank.
+    priority_rank = db.Column(db.SmallInteger, nullable=False, default=_priority_rank,
+                              server_default='1')
+    # SLA deadline (created_at + DocumentType.sla_hours) and when the scheduler
+    # escalated the record for missing it.
+    due_at = db.Column(db.DateTime, nullable=True)
+    escalated_at = db.Column(db.DateTime, nullable=True)
     remarks = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
-                           onupdate=lambda: datetime.now(timezone.utc))
+                           onupdate=lambda: datetime.now(timezone.utc), index=True)
+    # Cached by `flask score-records` (see prediction.py); NULL until first scored.
+    predicted_completion_at = db.Column(db.DateTime, nullable=True)
+    prediction_scored_at = db.Column(db.DateTime, nullable=True)
+
+    # Names over the integer columns above, readable, assignable and filterable
+    # like the string columns they replaced (see references.py).
+    __references__ = {"doc_type": DocumentType, "department": Department,
+                      "implementing_office": Department, "status": DocumentStatus}
+    doc_type = reference_name("doc_type_id", DocumentType)
+    department = reference_name("department_id", Department)
+    implementing_office = reference_name("implementing_office_id", Department)
+    status = reference_name("status_id", DocumentStatus)
+    # Optimistic concurrency: every UPDATE is issued as "... WHERE version = <read version>"
+    # and raises StaleDataError if another transaction changed the row first.
+    version = db.Column(db.Integer, nullable=False, default=1)
 
+    __mapper_args__ = {"version_id_col": version}
+
+    # The database deletes the history with the record (ON DELETE CASCADE); the
+    # ORM does not load it first.
     history = db.relationship(
         'RecordHistory',
         back_populates='record',
         order_by='RecordHistory.timestamp',
-        cascade='all, delete-orphan'
+        cascade='all, delete-orphan',
+        passive_deletes=True
     )
 
 
-class RecordHistory(db.Model):
+@event.listens_for(Record.priority, "set")
+def _sync_priority_rank(target, value, oldvalue, initiator):
+    target.priority_rank = PRIORITY_RANKS.get(value, PRIORITY_RANKS["Normal"])
+
+
+class RecordHistory(TenantMixin, db.Model):
     __tablename__ = 'record_history'
+    __table_args__ = (
+        # Serves the per-record lookups too ("has this transfer been received?").
+        db.Index('ix_record_history_record_action', 'record_id', 'action_type',
+                 'to_department_id', 'timestamp'),
+        # A record's chain in time order: timelines and point-in-time replays.
+        db.Index('ix_record_history_record_timestamp', 'record_id', 'timestamp'),
+        # A tenant's events past a cursor: the change feed and flow refresh.
+        db.Index('ix_record_history_tenant_seq', 'tenant_id', 'change_seq'),
+        {'sqlite_autoincrement': True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    record_id = db.Column(db.Integer, db.ForeignKey('records.id'), nullable=False)
-    action_type = db.Column(db.String(20), nullable=False)
-    status = db.Column(db.String(100), nullable=False)
-    from_department = db.Column(db.String(100), nullable=True)
-    to_department = db.Column(db.String(100), nullable=True)
+    record_id = db.Column(db.Integer, db.ForeignKey('records.id', ondelete='CASCADE'), nullable=False)
+    action_type = db.Column(ActionTypeCode, nullable=False)
+    status_id = db.Column(db.Integer, db.ForeignKey('document_status.id'), nullable=False)
+    from_department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=True, index=True)
+    to_department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=True, index=True)
     action_by = db.Column(db.String(100), nullable=True)
     remarks = db.Column(db.Text, nullable=True)
     timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    # Commit order, for the change feed's cursor; NULL until sequencing.sequence_rows.
+    change_seq = db.Column(db.BigInteger, nullable=True, index=True)
+
+    __references__ = {"status": DocumentStatus, "from_department": Department,
+                      "to_department": Department}
+    status = reference_name("status_id", DocumentStatus)
+    from_department = reference_name("from_department_id", Department)
+    to_department = reference_name("to_department_id", Department)
 
     record = db.relationship('Record', back_populates='history')
 
 
-class Department(db.Model):
-    __tablename__ = "departments"
+class RecordSnapshot(TenantMixin, db.Model):
+    """
+    State of a record right after one of its history events, written every few
+    events by ``flask snapshot-records`` so point-in-time replays start close
+    to the requested time (see snapshots.py).
+    """
+    __tablename__ = 'record_snapshots'
+    __table_args__ = (
+        db.Index('ix_record_snapshots_record_taken', 'record_id', 'taken_at', 'history_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    record_id = db.Column(db.Integer, db.ForeignKey('records.id', ondelete='CASCADE'), nullable=False)
+    # Last history event folded into this state, and its timestamp.
+    history_id = db.Column(db.Integer, nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False)
+    # Number of history events up to and including history_id.
+    events = db.Column(db.Integer, nullable=False)
+    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=True)
+    status_id = db.Column(db.Integer, db.ForeignKey('document_status.id'), nullable=True)
+    # Target of a transfer that was neither received nor rejected yet.
+    pending_department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=True)
+    last_action = db.Column(ActionTypeCode, nullable=True)
 
-    def __str__(self):
-        return self.name
\ No newline at end of file
+    __references__ = {"department": Department, "status": DocumentStatus,
+                      "pending_department": Department}
+    department = reference_name("department_id", Department)
+    status = reference_name("status_id", DocumentStatus)
+    pending_department = reference_name("pending_department_id", Department)
+
+
+class FlowPosition(TenantMixin, db.Model):
+    """Where a record was last seen by the flow analytics, and since when (see flow.py)."""
+    __tablename__ = 'flow_positions'
+
+    record_id = db.Column(db.Integer, db.ForeignKey('records.id', ondelete='CASCADE'),
+                          primary_key=True, autoincrement=False)
+    department_id = db.Column(db.Integer, nullable=True)
+    department_since = db.Column(db.DateTime, nullable=True)
+    status_id = db.Column(db.Integer, nullable=True)
+    status_since = db.Column(db.DateTime, nullable=True)
+
+
+class FlowTransition(TenantMixin, db.Model):
+    """
+    Aggregated moves of documents from one department (or status) to another:
+    how often, how many were rework (a rejected transfer sending it back), and
+    how long documents stayed at the source first.
+    """
+    __tablename__ = 'flow_transitions'
+    __table_args__ = (
+        db.UniqueConstraint('tenant_id', 'kind', 'source_id', 'target_id',
+                            name='uq_flow_transitions_edge'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # "department" or "status"
+    # departments.id or document_status.id, depending on kind.
+    source_id = db.Column(db.Integer, nullable=False)
+    target_id = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    rework = db.Column(db.Integer, nullable=False, default=0)
+    total_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    # JSON list of counts per flow.DWELL_BUCKETS bucket; medians are read from it.
+    histogram = db.Column(db.Text, nullable=False, default="[]")
+
+
+class FlowWatermark(TenantMixin, db.Model):
+    """Highest RecordHistory.change_seq folded into the flow tables, per tenant."""
+    __tablename__ = 'flow_watermarks'
+    __table_args__ = (db.UniqueConstraint('tenant_id', name='uq_flow_watermarks_tenant'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    last_change_seq = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+
+class AssignmentLoad(TenantMixin, db.Model):
+    """Open documents a department has assigned to each person; kept by workload.py."""
+    __tablename__ = 'assignment_loads'
+    __table_args__ = (
+        db.UniqueConstraint('tenant_id', 'department_id', 'assignee',
+                            name='uq_assignment_loads_slot'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=False)
+    # A User.full_name, like Record.received_by.
+    assignee = db.Column(db.String(100), nullable=False)
+    open_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Attachment(TenantMixin, db.Model):
+    """A file attached to a record; the bytes live on disk by hash (see attachments.py)."""
+    __tablename__ = 'attachments'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign key: archived records keep their id, and their attachments stay.
+    record_id = db.Column(db.Integer, nullable=False, index=True)
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    mimetype = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    uploaded_by = db.Column(db.String(150), nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    # Thumbnail/preview rendering by `flask worker`: queued, running, done,
+    # failed, or none (nothing to render).
+    preview_status = db.Column(db.String(10), nullable=False, default="queued", index=True)
+    preview_started_at = db.Column(db.DateTime, nullable=True)
+
+
+class AttachmentUpload(TenantMixin, db.Model):
+    """A chunked upload in progress; becomes an Attachment when the last chunk arrives."""
+    __tablename__ = 'attachment_uploads'
+
+    id = db.Column(db.String(32), primary_key=True)
+    record_id = db.Column(db.Integer, nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    mimetype = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0)
+    uploaded_by = db.Column(db.String(150), nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+
+class RecordSignature(TenantMixin, db.Model):
+    """MinHash signature of a record's title, type and remarks (see duplicates.py)."""
+    __tablename__ = 'record_signatures'
+    __table_args__ = (
+        # A tenant's signatures past the in-process index's cursor.
+        db.Index('ix_record_signatures_tenant_seq', 'tenant_id', 'change_seq'),
+    )
+
+    record_id = db.Column(db.Integer, db.ForeignKey('records.id', ondelete='CASCADE'),
+                          primary_key=True, autoincrement=False)
+    # duplicates.NUM_PERM little-endian unsigned 32-bit values.
+    signature = db.Column(db.LargeBinary, nullable=False)
+    # Commit order, for the in-process band index; NULL until sequencing.sequence_rows.
+    change_seq = db.Column(db.BigInteger, nullable=True, index=True)
+
+
+class RecordBand(TenantMixin, db.Model):
+    """One LSH band bucket of a record's signature; records sharing a bucket are candidates."""
+    __tablename__ = 'record_lsh_bands'
+    __table_args__ = (db.Index('ix_record_lsh_bands_bucket', 'band', 'bucket'),)
+
+    record_id = db.Column(db.Integer, db.ForeignKey('records.id', ondelete='CASCADE'),
+                          primary_key=True, autoincrement=False)
+    band = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    bucket = db.Column(db.BigInteger, nullable=False)
+
+
+class ArchivedRecord(TenantMixin, db.Model):
+    """
+    Closed record moved out of ``records`` by the archive job; keeps its original id.
+    Departments, types and statuses are stored as names rather than ids, so the
+    archive stays readable after one is renamed or removed.
+    """
+    __tablename__ = 'archived_records'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    document_id = db.Column(db.String(50), unique=True, nullable=False)
+    title = db.Column(db.String(255), nullable=False)
+    doc_type = db.Column(db.String(100), nullable=False)
+    action_taken = db.Column(db.String(100), nullable=True)
+    department = db.Column(db.String(100), nullable=False, index=True)
+    implementing_office = db.Column(db.String(100), nullable=False)
+    date_received = db.Column(db.Date, nullable=False)
+    released_by = db.Column(db.String(100), nullable=False)
+    received_by = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(100), nullable=False)
+    priority = db.Column(db.String(20), default="Normal", nullable=False)
+    remarks = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    history = db.relationship(
+        'ArchivedRecordHistory',
+        back_populates='record',
+        order_by='ArchivedRecordHistory.timestamp',
+        cascade='all, delete-orphan'
+    )
+
+
+class ArchivedRecordHistory(TenantMixin, db.Model):
+    __tablename__ = 'archived_record_history'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    record_id = db.Column(db.Integer, db.ForeignKey('archived_records.id'), nullable=False, index=True)
+    action_type = db.Column(ActionTypeCode, nullable=False)
+    status = db.Column(db.String(100), nullable=False)
+    from_department = db.Column(db.String(100), nullable=True, index=True)
+    to_department = db.Column(db.String(100), nullable=True, index=True)
+    action_by = db.Column(db.String(100), nullable=True)
+    remarks = db.Column(db.Text, nullable=True)
+    timestamp = db.Column(db.DateTime)
+
+    record = db.relationship('ArchivedRecord', back_populates='history')
+
+
+class DocumentSequence(db.Model):
+    """Per-office, per-year counter behind sequential document IDs."""
+    __tablename__ = "document_sequences"
+
+    prefix = db.Column(db.String(20), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ChangeSequence(db.Model):
+    """Last commit-ordered number handed out for a table's ``change_seq`` (see sequencing.py)."""
+    __tablename__ = "change_sequences"
+
+    name = db.Column(db.String(50), primary_key=True)
+    last_value = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class WorkerHeartbeat(db.Model):
+    """Last sign of life of each running ``flask worker`` (see jobs.worker_active)."""
+    __tablename__ = "worker_heartbeats"
+
+    worker = db.Column(db.String(100), primary_key=True)  # host:pid
+    seen_at = db.Column(db.DateTime, nullable=False)
+
+
+class ReportJob(TenantMixin, db.Model):
+    """Queued report/export computed by the ``flask worker`` process."""
+    __tablename__ = "report_jobs"
+    __table_args__ = (
+        db.Index("ix_report_jobs_cache_key", "department", "report_type", "date_from", "date_to"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    department = db.Column(db.String(100), nullable=False)
+    report_type = db.Column(db.String(30), nullable=False)
+    date_from = db.Column(db.Date, nullable=True)
+    date_to = db.Column(db.Date, nullable=True)
+    status = db.Column(db.String(20), default="queued", nullable=False, index=True)
+    requested_by = db.Column(db.String(150), nullable=True)
+    # Highest RecordHistory.id the result was computed from; a finished job is
+    # reused as a cached result while no newer history exists.
+    history_watermark = db.Column(db.Integer, nullable=True)
+    result = db.Column(db.Text, nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+    filename = db.Column(db.String(255), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
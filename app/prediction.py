@@ -0,0 +1,310 @@
+"""
+Completion-time prediction for open documents.
+
+``flask train-completion-model`` fits a ridge regression offline from the
+history of every closed document, live and archived. Each history event of
+a closed document is one sample: the document's type, priority, status and
+holding department right after the event, its age, and how many open
+documents that department held at the time, against the hours that were
+still left until it was closed (fitted on a log scale). The weights and
+vocabularies are written as JSON to ``PREDICTION_MODEL_DIR`` (default
+``<instance>/models``), one file per tenant.
+
+``flask score-records`` (run from cron, like ``archive-records``) scores the
+open documents in vectorised batches and caches the result on the record
+(``predicted_completion_at``). It is incremental: only records changed since
+they were scored, scored before the current model, or scored longer than
+``PREDICTION_MAX_AGE`` ago are scored again. Pages sort by the cached
+column, so requests never run the model.
+
+NumPy is only needed to train and score, and only imported then.
+"""
+import heapq
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import bindparam, func, or_, select, update
+
+from .models import (db, ArchivedRecord, ArchivedRecordHistory, Department, DocumentStatus,
+                     DocumentType, Record, RecordHistory, COMPLETED_STATUSES, PRIORITIES)
+from .references import reference_cache
+from .tenancy import current_tenant_id
+
+CATEGORICAL = ("doc_type", "priority", "status", "department")
+# Ridge penalty on the (unscaled, mostly one-hot) features; the intercept is not penalised.
+RIDGE_ALPHA = 1.0
+# Samples per chunk added to the normal equations while training.
+TRAIN_CHUNK = 10000
+# Open records scored per statement.
+SCORE_BATCH_SIZE = 2000
+# Predictions depend on the document's age and the department's load too, so
+# even unchanged records are re-scored this often.
+PREDICTION_MAX_AGE = timedelta(hours=6)
+
+_models = {}
+# NumPy, imported by require_numpy: the web app never loads it.
+np = None
+
+
+def require_numpy():
+    """Import NumPy (optional dependency) for training and scoring."""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise RuntimeError("Completion predictions need numpy installed.") from None
+        np = numpy
+    return np
+
+
+def model_path(tenant_id=None):
+    directory = current_app.config.get("PREDICTION_MODEL_DIR") or \
+        os.path.join(current_app.instance_path, "models")
+    tenant_id = current_tenant_id() if tenant_id is None else tenant_id
+    return os.path.join(directory, f"completion-{tenant_id}.json")
+
+
+def load_model():
+    """The current tenant's model (a dict), re-read when the file changes; None if untrained."""
+    path = model_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _models.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding="utf-8") as fh:
+            cached = _models[path] = (mtime, json.load(fh))
+    return cached[1]
+
+
+def _save_model(model):
+    path = model_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(model, fh)
+    os.replace(tmp, path)
+
+
+def _vocabulary():
+    names = {model: sorted(db.session.scalars(select(model.name).distinct()))
+             for model in (DocumentType, DocumentStatus, Department)}
+    return {"doc_type": names[DocumentType], "priority": list(PRIORITIES),
+            "status": names[DocumentStatus], "department": names[Department]}
+
+
+def _design(vocabulary, columns, ages, loads):
+    """
+    Feature matrix: one-hot ``columns`` (name lists keyed like CATEGORICAL;
+    unseen names encode as all zeros), log age and load, and an intercept.
+    """
+    n = len(ages)
+    width = sum(len(vocabulary[key]) for key in CATEGORICAL) + 3
+    X = np.zeros((n, width))
+    rows = np.arange(n)
+    offset = 0
+    for key in CATEGORICAL:
+        index = {name: i for i, name in enumerate(vocabulary[key])}
+        cols = np.fromiter((index.get(v, -1) for v in columns[key]), dtype=np.int64, count=n)
+        known = cols >= 0
+        X[rows[known], offset + cols[known]] = 1.0
+        offset += len(index)
+    X[:, offset] = np.log1p(np.maximum(np.asarray(ages, dtype=float), 0.0))
+    X[:, offset + 1] = np.log1p(np.asarray(loads, dtype=float))
+    X[:, offset + 2] = 1.0
+    return X
+
+
+def _events():
+    """Live and archived history merged in time order, with names for departments and statuses."""
+    cache = reference_cache()
+    live = db.session.execute(
+        select(RecordHistory.record_id, RecordHistory.action_type, RecordHistory.timestamp,
+               RecordHistory.status_id, RecordHistory.to_department_id)
+        .order_by(RecordHistory.timestamp, RecordHistory.id)
+        .execution_options(yield_per=TRAIN_CHUNK)
+    )
+    live = ((e.record_id, e.action_type, e.timestamp, cache.name(DocumentStatus, e.status_id),
+             cache.name(Department, e.to_department_id)) for e in live)
+    archived = db.session.execute(
+        select(ArchivedRecordHistory.record_id, ArchivedRecordHistory.action_type,
+               ArchivedRecordHistory.timestamp, ArchivedRecordHistory.status,
+               ArchivedRecordHistory.to_department)
+        .order_by(ArchivedRecordHistory.timestamp, ArchivedRecordHistory.id)
+        .execution_options(yield_per=TRAIN_CHUNK)
+    )
+    return heapq.merge(live, (tuple(e) for e in archived), key=lambda e: e[2] or datetime.min)
+
+
+def _documents():
+    """{record_id: (doc_type, priority, created_at)} for live and archived records."""
+    cache = reference_cache()
+    rows = db.session.execute(select(Record.id, Record.doc_type_id, Record.priority, Record.created_at))
+    documents = {r.id: (cache.name(DocumentType, r.doc_type_id), r.priority, r.created_at)
+                 for r in rows}
+    rows = db.session.execute(select(ArchivedRecord.id, ArchivedRecord.doc_type,
+                                     ArchivedRecord.priority, ArchivedRecord.created_at))
+    documents.update((r.id, (r.doc_type, r.priority, r.created_at)) for r in rows)
+    return documents
+
+
+def train_model(alpha=RIDGE_ALPHA):
+    """
+    Fit and save the current tenant's model from the full history. Returns
+    the saved model, or None when no document has been closed yet.
+    """
+    require_numpy()
+    vocabulary = _vocabulary()
+    documents = _documents()
+    width = sum(len(vocabulary[key]) for key in CATEGORICAL) + 3
+    xtx, xty = np.zeros((width, width)), np.zeros(width)
+    yty, samples = 0.0, 0
+    chunk = defaultdict(list)
+
+    def flush():
+        nonlocal yty, samples
+        if not chunk["y"]:
+            return
+        X = _design(vocabulary, chunk, chunk["age"], chunk["load"])
+        y = np.log1p(np.asarray(chunk["y"]))
+        xtx[:] += X.T @ X
+        xty[:] += X.T @ y
+        yty += float(y @ y)
+        samples += len(y)
+        chunk.clear()
+
+    holder, load = {}, defaultdict(int)
+    pending = defaultdict(list)  # record_id -> samples waiting for the record to close
+    for record_id, action, moment, status, to_department in _events():
+        document = documents.get(record_id)
+        if document is None or moment is None:
+            continue
+        doc_type, priority, created_at = document
+        if action == "close":
+            if holder.get(record_id) is not None:
+                load[holder.pop(record_id)] -= 1
+            for status_then, department, at, age, held in pending.pop(record_id, ()):
+                for key, value in zip(CATEGORICAL, (doc_type, priority, status_then, department)):
+                    chunk[key].append(value)
+                chunk["age"].append(age)
+                chunk["load"].append(held)
+                chunk["y"].append(max((moment - at).total_seconds(), 0.0) / 3600)
+            if len(chunk["y"]) >= TRAIN_CHUNK:
+                flush()
+            continue
+        if action in ("create", "received") and to_department:
+            previous = holder.get(record_id)
+            if previous is not None:
+                load[previous] -= 1
+            holder[record_id] = to_department
+            load[to_department] += 1
+        department = holder.get(record_id)
+        age = ((moment - created_at).total_seconds() / 3600) if created_at else 0.0
+        pending[record_id].append(
+            (status, department, moment, age, load[department] if department else 0))
+    flush()
+    if not samples:
+        return None
+
+    penalty = alpha * np.eye(width)
+    penalty[-1, -1] = 0.0
+    weights = np.linalg.solve(xtx + penalty, xty)
+    residual = max(yty - 2 * weights @ xty + weights @ xtx @ weights, 0.0)
+    model = {
+        "version": 1,
+        "trained_at": datetime.now(timezone.utc).replace(tzinfo=None).isoformat(),
+        "samples": samples,
+        "alpha": alpha,
+        # Root mean squared error of log1p(hours left) on the training samples.
+        "rmse_log": round(float(np.sqrt(residual / samples)), 4),
+        "vocabulary": vocabulary,
+        "weights": [float(w) for w in weights],
+    }
+    _save_model(model)
+    return model
+
+
+def _open_loads():
+    """{department_id: open records held}."""
+    rows = db.session.execute(
+        select(Record.department_id, func.count(Record.id))
+        .where(Record.status.notin_(list(COMPLETED_STATUSES)))
+        .group_by(Record.department_id)
+    )
+    return dict(rows.all())
+
+
+def score_records(full=False, batch_size=SCORE_BATCH_SIZE):
+    """
+    Cache ``predicted_completion_at`` on the open records that need it (all
+    of them with ``full``). Returns the number scored; 0 without a model.
+    """
+    require_numpy()
+    model = load_model()
+    if model is None:
+        return 0
+    vocabulary, weights = model["vocabulary"], np.asarray(model["weights"])
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    cutoff = max(now - PREDICTION_MAX_AGE, datetime.fromisoformat(model["trained_at"]))
+    criteria = [Record.status.notin_(list(COMPLETED_STATUSES))]
+    if not full:
+        criteria.append(or_(Record.prediction_scored_at.is_(None),
+                            Record.prediction_scored_at < Record.updated_at,
+                            Record.prediction_scored_at < cutoff))
+    loads = _open_loads()
+    cache = reference_cache()
+    records = Record.__table__
+    # Keep updated_at (and so ETags and the incremental check) untouched.
+    write = (update(records).where(records.c.id == bindparam("record"))
+             .values(predicted_completion_at=bindparam("predicted"),
+                     prediction_scored_at=bindparam("scored"),
+                     updated_at=records.c.updated_at))
+    scored, last_id = 0, 0
+    while True:
+        rows = db.session.execute(
+            select(Record.id, Record.doc_type_id, Record.priority, Record.status_id,
+                   Record.department_id, Record.created_at)
+            .where(Record.id > last_id, *criteria)
+            .order_by(Record.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        columns = {
+            "doc_type": [cache.name(DocumentType, r.doc_type_id) for r in rows],
+            "priority": [r.priority for r in rows],
+            "status": [cache.name(DocumentStatus, r.status_id) for r in rows],
+            "department": [cache.name(Department, r.department_id) for r in rows],
+        }
+        ages = [((now - r.created_at).total_seconds() / 3600) if r.created_at else 0.0 for r in rows]
+        X = _design(vocabulary, columns, ages, [loads.get(r.department_id, 0) for r in rows])
+        hours = np.expm1(np.clip(X @ weights, 0.0, 12.0))
+        db.session.execute(write, [
+            {"record": r.id, "predicted": now + timedelta(hours=float(h)), "scored": now}
+            for r, h in zip(rows, hours)
+        ])
+        db.session.commit()
+        scored += len(rows)
+    return scored
+
+
+def prediction_summary_statement():
+    """Open records, how many have a prediction, and when they were last scored."""
+    return (select(func.count(Record.id).label("open"),
+                   func.count(Record.predicted_completion_at).label("scored"),
+                   func.max(Record.prediction_scored_at).label("scored_at"))
+            .where(Record.status.notin_(list(COMPLETED_STATUSES))))
+
+
+def prediction_summary(row):
+    """``api_analytics`` "predictions" block from a ``prediction_summary_statement`` row."""
+    return {
+        "open_documents": row.open,
+        "scored_documents": row.scored,
+        "scored_at": row.scored_at.isoformat() if row.scored_at else None,
+    }
@@ -0,0 +1,55 @@
+"""
+Bulk removal of test and junk documents.
+
+Records are deleted with one DELETE per batch; their history rows go with
+them through ``ON DELETE CASCADE`` on ``record_history.record_id``, so
+nothing is loaded into Python; the assignment counters are adjusted in the
+same transaction. Attachment rows are deleted too; their files go with the
+next ``flask prune-attachments``. Unlike archiving, this is permanent.
+"""
+from sqlalchemy import delete, select
+
+from .models import db, Attachment, Record
+from .workload import release_records
+
+
+def purge_criteria(document_ids=(), title_prefix=None, department=None, created_before=None):
+    """WHERE clauses for ``purge_records``; empty when no filter was given."""
+    criteria = []
+    if document_ids:
+        criteria.append(Record.document_id.in_(list(document_ids)))
+    if title_prefix:
+        criteria.append(Record.title.startswith(title_prefix, autoescape=True))
+    if department:
+        criteria.append(Record.department == department)
+    if created_before:
+        criteria.append(Record.created_at < created_before)
+    return criteria
+
+
+def count_records(criteria):
+    return db.session.query(Record).filter(*criteria).count()
+
+
+def purge_records(criteria, batch_size=500):
+    """
+    Delete the records matching ``criteria`` (and, in the database, their
+    history). Each batch is its own transaction. Returns the number deleted.
+    """
+    if not criteria:
+        raise ValueError("Refusing to purge without criteria.")
+    records = Record.__table__
+    purged = 0
+    while True:
+        ids = db.session.scalars(
+            select(Record.id).where(*criteria).order_by(Record.id).limit(batch_size)
+        ).all()
+        if not ids:
+            break
+        release_records(ids)
+        attachments = Attachment.__table__
+        db.session.execute(delete(attachments).where(attachments.c.record_id.in_(ids)))
+        db.session.execute(delete(records).where(records.c.id.in_(ids)))
+        db.session.commit()
+        purged += len(ids)
+    return purged
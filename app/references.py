@@ -0,0 +1,221 @@
+"""
+Name-compatible access to integer reference columns.
+
+``Record`` and ``RecordHistory`` store departments, document types and
+statuses as integer foreign keys (``department_id``, ``status_id`` ...).
+``reference_name`` keeps the old string attribute working on top of them:
+
+* on instances, ``record.department`` reads the name and assigning a name
+  stores its id, both through a small per-tenant id <-> name cache;
+* in queries, ``Record.department == "Mayor Office"``, ``in_``, ``!=`` and
+  ``filter_by(department=...)`` compare the integer column against the ids
+  of that name, and selecting ``Record.department`` returns the name.
+
+So views, templates and the API keep speaking in names while rows and
+indexes hold integers.
+
+The cache is keyed on ``reference_version()``, so a department, type or
+status added or deleted in another process is picked up on the next request
+rather than resolving a name to a stale id. Reference tables never reuse
+ids (``sqlite_autoincrement``), which keeps that stamp honest.
+"""
+import threading
+
+from flask import current_app, g
+from sqlalchemy import func, select
+from sqlalchemy.ext.hybrid import Comparator, hybrid_property
+
+from .tenancy import current_tenant
+
+
+class UnknownReference(ValueError):
+    """A name that has no row in its reference table."""
+
+
+def reference_version():
+    """
+    Row count and max id of each reference table, in one query, once per app
+    context and tenant. Changes whenever a row is added or deleted.
+    """
+    from .models import db, Department, DocumentType, DocumentStatus
+    ctx = current_tenant()
+    key = ctx.id if ctx is not None else None
+    versions = g.setdefault("reference_versions", {})
+    if key not in versions:
+        def stamp(model):
+            return (select(func.count(model.id)).scalar_subquery(),
+                    select(func.max(model.id)).scalar_subquery())
+        # No autoflush: this runs from attribute setters on half-built objects.
+        with db.session.no_autoflush:
+            row = db.session.execute(
+                select(*stamp(Department), *stamp(DocumentType), *stamp(DocumentStatus))
+            ).one()
+        versions[key] = "-".join(str(v or 0) for v in row)
+    return versions[key]
+
+
+class ReferenceCache:
+    """
+    Per-tenant id <-> name maps of the reference tables, reloaded on a miss
+    and whenever ``reference_version()`` has moved on.
+    """
+
+    def __init__(self):
+        self._maps = {}  # (model, tenant key) -> (version, by_id, by_name)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(model):
+        ctx = current_tenant()
+        return model, ctx.id if ctx is not None else None
+
+    def _load(self, model):
+        from .models import db
+        version = reference_version()
+        # No autoflush: this runs from attribute setters on half-built objects.
+        with db.session.no_autoflush:
+            rows = db.session.execute(select(model.id, model.name).order_by(model.id)).all()
+        maps = (version, {i: n for i, n in rows}, {})
+        for i, n in rows:
+            maps[2].setdefault(n, i)
+        with self._lock:
+            self._maps[self._key(model)] = maps
+        return maps[1:]
+
+    def _maps_for(self, model):
+        with self._lock:
+            maps = self._maps.get(self._key(model))
+        if maps is None or maps[0] != reference_version():
+            return self._load(model)
+        return maps[1:]
+
+    def name(self, model, ref_id):
+        if ref_id is None:
+            return None
+        name = self._maps_for(model)[0].get(ref_id)
+        if name is None:
+            name = self._load(model)[0].get(ref_id)
+        return name
+
+    def id_for(self, model, name):
+        ref_id = self._maps_for(model)[1].get(name)
+        if ref_id is None:
+            ref_id = self._load(model)[1].get(name)
+        if ref_id is None:
+            raise UnknownReference(f"Unknown {model.__name__} '{name}'.")
+        return ref_id
+
+    def clear(self):
+        """Forget every map; call after writing to a reference table."""
+        with self._lock:
+            self._maps.clear()
+        g.pop("reference_versions", None)
+
+
+def reference_cache():
+    cache = current_app.extensions.get("reference_cache")
+    if cache is None:
+        cache = current_app.extensions.setdefault("reference_cache", ReferenceCache())
+    return cache
+
+
+def reference_ids(model, names):
+    """SELECT of the ids carrying any of ``names`` in the current tenant."""
+    query = select(model.id).where(model.name.in_(names))
+    ctx = current_tenant()
+    if ctx is not None:
+        query = query.where(model.tenant_id == ctx.id)
+    return query
+
+
+class ReferenceComparator(Comparator):
+    """Compares by id; selecting the attribute yields the referenced name."""
+
+    def __init__(self, id_column, model, key):
+        self.id_column = id_column
+        self.model = model
+        name = (select(model.name).where(model.id == id_column)
+                .correlate_except(model).scalar_subquery().label(key))
+        super().__init__(name)
+
+    def _names(self, other):
+        values = list(other)
+        return values if all(isinstance(v, str) for v in values) else None
+
+    def __eq__(self, other):
+        if other is None:
+            return self.id_column.is_(None)
+        if isinstance(other, ReferenceComparator) and other.model is self.model:
+            return self.id_column == other.id_column
+        if isinstance(other, str):
+            return self.id_column.in_(reference_ids(self.model, [other]))
+        return self.expression == other
+
+    def __ne__(self, other):
+        if other is None:
+            return self.id_column.is_not(None)
+        if isinstance(other, ReferenceComparator) and other.model is self.model:
+            return self.id_column != other.id_column
+        if isinstance(other, str):
+            return self.id_column.not_in(reference_ids(self.model, [other]))
+        return self.expression != other
+
+    def in_(self, other):
+        names = self._names(other)
+        if names is None:
+            return self.expression.in_(other)
+        return self.id_column.in_(reference_ids(self.model, names))
+
+    def not_in(self, other):
+        names = self._names(other)
+        if names is None:
+            return self.expression.not_in(other)
+        return self.id_column.not_in(reference_ids(self.model, names))
+
+    notin_ = not_in
+
+    def is_(self, other):
+        return self.id_column.is_(other)
+
+    def is_not(self, other):
+        return self.id_column.is_not(other)
+
+    isnot = is_not
+
+
+def reference_name(id_attr, model):
+    """
+    Name attribute for the integer column ``id_attr`` referencing ``model``;
+    ``department_id`` becomes ``department``.
+    """
+    key = id_attr[:-len("_id")]
+
+    def fget(self):
+        return reference_cache().name(model, getattr(self, id_attr))
+
+    def fset(self, value):
+        setattr(self, id_attr, None if value is None else reference_cache().id_for(model, value))
+
+    def comparator(cls):
+        return ReferenceComparator(getattr(cls, id_attr), model, key)
+
+    def update_expr(cls, value):
+        if isinstance(value, str):
+            value = reference_ids(model, [value]).limit(1).scalar_subquery()
+        return [(getattr(cls, id_attr), value)]
+
+    fget.__name__ = key
+    return hybrid_property(fget, fset, custom_comparator=comparator, update_expr=update_expr)
+
+
+def reference_values(model, values):
+    """
+    Copy of a Core insert/update row with name keys (``status="Closed"``)
+    replaced by their id columns (``status_id=3``).
+    """
+    row = dict(values)
+    for key, ref_model in model.__references__.items():
+        if key in row:
+            name = row.pop(key)
+            row[f"{key}_id"] = None if name is None else reference_cache().id_for(ref_model, name)
+    return row
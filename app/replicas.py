@@ -0,0 +1,151 @@
+"""
+Read-replica routing.
+
+With ``SQLALCHEMY_REPLICA_URIS`` set, GET/HEAD requests to the ``main`` and
+``api`` blueprints run their SELECTs on a replica, picked at random among
+those whose replication lag is within ``REPLICA_MAX_LAG_SECONDS``. Everything
+else uses the primary:
+
+* any flush, INSERT/UPDATE/DELETE or SELECT ... FOR UPDATE, and every read
+  that follows it in the same request;
+* every request of a user for ``REPLICA_MAX_LAG_SECONDS`` after they wrote,
+  so the page they are redirected to shows their own change;
+* CLI commands, the job worker and anything outside a request.
+
+Lag is measured on PostgreSQL replicas and cached for
+``REPLICA_LAG_CHECK_SECONDS``; replicas on other backends (e.g. a copied
+SQLite file in development) are assumed current.
+"""
+import random
+import threading
+import time
+
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+
+from .tenancy import current_tenant
+
+REPLICA_BLUEPRINTS = {"main", "api"}
+# Tables that stay in the shared database when a tenant has its own (see tenancy.py).
+CATALOG_TABLES = {"tenants", "report_jobs", "worker_heartbeats"}
+READ_METHODS = {"GET", "HEAD"}
+
+POSTGRES_LAG_SQL = sa.text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class ReplicaSet:
+    """Replica engines plus a cached view of how far behind each one is."""
+
+    def __init__(self, engines, max_lag, check_interval):
+        self.engines = engines
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lag = {}  # engine index -> (checked_at, lag seconds)
+        self._lock = threading.Lock()
+
+    def _measure(self, engine):
+        if engine.dialect.name != "postgresql":
+            return 0.0
+        try:
+            with engine.connect() as conn:
+                return float(conn.execute(POSTGRES_LAG_SQL).scalar() or 0)
+        except sa.exc.DBAPIError:
+            return float("inf")  # unreachable: skip it until the next check
+
+    def lag(self, index):
+        now = time.monotonic()
+        with self._lock:
+            checked = self._lag.get(index)
+        if checked and now - checked[0] < self.check_interval:
+            return checked[1]
+        lag = self._measure(self.engines[index])
+        with self._lock:
+            self._lag[index] = (now, lag)
+        return lag
+
+    def choose(self):
+        """A replica engine within the lag tolerance, or None to use the primary."""
+        healthy = [engine for i, engine in enumerate(self.engines)
+                   if self.lag(i) <= self.max_lag]
+        return random.choice(healthy) if healthy else None
+
+
+def _is_write(clause):
+    if clause is None:
+        return False
+    if isinstance(clause, sa.UpdateBase):
+        return True
+    return getattr(clause, "_for_update_arg", None) is not None
+
+
+def _is_catalog(mapper, clause):
+    if mapper is not None:
+        table = sa.inspect(mapper).local_table
+    elif isinstance(clause, sa.UpdateBase):
+        table = clause.table
+    else:
+        table = clause
+    return getattr(table, "name", None) in CATALOG_TABLES
+
+
+class RoutingSession(Session):
+    """
+    ``db.session`` class that sends a dedicated tenant's queries to its own
+    database and eligible reads to a replica.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        tenant = current_tenant()
+        if (bind is None and tenant is not None and tenant.engine is not None
+                and not _is_catalog(mapper, clause)):
+            return tenant.engine
+        if bind is None and has_request_context():
+            if self._flushing or _is_write(clause):
+                # From here on this request reads its own writes from the primary.
+                g.read_replica = None
+                g.wrote_to_primary = True
+            elif g.get("read_replica") is not None:
+                return g.read_replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _route_request():
+    replicas = current_app.extensions.get("replicas")
+    if (replicas is None or request.method not in READ_METHODS
+            or request.blueprint not in REPLICA_BLUEPRINTS
+            or session.get("_primary_until", 0) > time.time()):
+        return
+    g.read_replica = replicas.choose()
+
+
+def _pin_after_write(response):
+    if g.get("wrote_to_primary"):
+        replicas = current_app.extensions["replicas"]
+        session["_primary_until"] = time.time() + replicas.max_lag
+    return response
+
+
+def init_replicas(app):
+    """Create the replica engines and install the per-request routing hooks."""
+    urls = app.config.get("SQLALCHEMY_REPLICA_URIS") or []
+    if not urls:
+        return
+    options = app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {}
+    engines = [sa.create_engine(url, pool_pre_ping=True, **options) for url in urls]
+    if app.config.get("SQLITE_PRAGMAS"):
+        from .sqlite_tuning import pragma_listener
+        for engine in engines:
+            if engine.dialect.name == "sqlite":
+                sa.event.listen(engine, "connect", pragma_listener(app.config["SQLITE_PRAGMAS"]))
+    app.extensions["replicas"] = ReplicaSet(
+        engines,
+        max_lag=app.config.get("REPLICA_MAX_LAG_SECONDS", 5.0),
+        check_interval=app.config.get("REPLICA_LAG_CHECK_SECONDS", 5.0),
+    )
+    app.before_request(_route_request)
+    app.after_request(_pin_after_write)
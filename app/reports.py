@@ -0,0 +1,74 @@
+"""
+Report builders shared by the export views and the background job worker.
+Each builder returns ``(body, mimetype, filename)``.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy.orm import selectinload
+
+from .models import db, Record
+from .routes import visible_documents
+from .routes_api import analytics_statement, bottleneck_summary
+
+
+def parse_report_date(value):
+    """``YYYY-MM-DD`` -> date; blank or malformed values mean "no bound"."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date() if value else None
+    except ValueError:
+        return None
+
+
+def _records(department, date_from, date_to):
+    records_q = visible_documents(department)
+    if date_from:
+        records_q = records_q.filter(Record.date_received >= date_from)
+    if date_to:
+        records_q = records_q.filter(Record.date_received <= date_to)
+    return records_q
+
+
+def export_documents_csv(department, date_from=None, date_to=None):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["Document ID", "Title", "Type", "Department", "Status",
+                     "Amount", "Date Received", "Released By", "Received By", "Remarks"])
+    for r in _records(department, date_from, date_to):
+        writer.writerow([r.document_id, r.title, r.doc_type, r.department, r.status,
+                         getattr(r, "amount", None) or 0, r.date_received, r.released_by,
+                         r.received_by, r.remarks or ""])
+    return output.getvalue(), "text/csv", "doctrack_documents_export.csv"
+
+
+def export_history_csv(department, date_from=None, date_to=None):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["Document ID", "Action", "From", "To", "By", "Status", "Timestamp"])
+    for r in _records(department, date_from, date_to).options(selectinload(Record.history)):
+        for h in r.history:
+            writer.writerow([r.document_id, h.action_type, h.from_department,
+                             h.to_department, h.action_by, h.status, h.timestamp])
+    return output.getvalue(), "text/csv", "doctrack_history_export.csv"
+
+
+def analytics_report(department, date_from=None, date_to=None):
+    summary = bottleneck_summary(db.session.execute(analytics_statement()))
+    return json.dumps(summary), "application/json", "doctrack_analytics.json"
+
+
+REPORT_BUILDERS = {
+    "documents": export_documents_csv,
+    "history": export_history_csv,
+    "analytics": analytics_report,
+}
+# Report types limited to admins, like the pages they back.
+ADMIN_REPORT_TYPES = {"analytics"}
+# Report types that cover every date; their jobs are cached without a range.
+UNDATED_REPORT_TYPES = {"analytics"}
+
+
+def build_report(department, report_type, date_from=None, date_to=None):
+    return REPORT_BUILDERS[report_type](department, date_from, date_to)
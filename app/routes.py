@@ -1,22 +1,41 @@
-import csv
-import io
-import uuid
+import re
 from collections import defaultdict
 
 from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify, abort
 from flask_login import login_required, current_user
-from sqlalchemy import func, or_
+from sqlalchemy import false, func, insert, or_
 from sqlalchemy.orm import aliased
+from sqlalchemy.orm.exc import StaleDataError
 from datetime import datetime, date, timezone
 
 from . import db
-from .models import Record, Department, RecordHistory, User, DocumentType, DocumentStatus
-from .decorators import role_required
+from .models import (Record, Department, RecordHistory, User, DocumentType, DocumentStatus,
+                     ArchivedRecord, Attachment, ActionType, COMPLETED_STATUSES, PRIORITIES)
+from .decorators import role_required, conditional
+from .caching import document_etag, department_etag, PAGE_CACHE_CONTROL
+from .archive import visible_archived_documents
+from .document_ids import allocate_document_ids
+from .duplicates import MAX_CANDIDATES, find_duplicates
+from .references import UnknownReference, reference_cache, reference_values
+from .sla import apply_sla, recompute_due_dates
+from .workload import by_load, department_loads
 
 bp = Blueprint("main", __name__)
 
-# Statuses that mean the document is fully done (no more transfers allowed).
-COMPLETED_STATUSES = {"Closed", "With Checked and Closed"}
+CONCURRENT_UPDATE_MESSAGE = ("This document was just updated by someone else. "
+                             "Please refresh and try again.")
+
+# Trace queries that look like (the start of) a document ID are matched by
+# prefix so the document_id index can be used: "MO-2026-0001" or, with a
+# tenant code, "LUC-MO-2026", and the older random "DOC-A1B2C3D4". Hyphenated
+# words ("follow-up") do not qualify; a match-less prefix search falls back to
+# the title search.
+DOCUMENT_ID_QUERY = re.compile(r"^(?:[A-Za-z0-9]+-){1,2}\d[\d-]*$|^DOC-[0-9A-Fa-f]+$")
+
+# Upper bound on records handled by a single batch transfer/receive/assign call.
+MAX_BULK_RECORDS = 500
+# Likely duplicates named when a document is registered.
+DUPLICATE_WARNINGS = 5
 
 
 def get_next_status(current_status_name: str) -> str:
@@ -24,10 +43,10 @@ def get_next_status(current_status_name: str) -> str:
     Returns the next status in sequence from the DocumentStatus table.
     If there is no next step, returns 'With Checked and Closed'.
     """
-    current = DocumentStatus.query.filter_by(name=current_status_name).first()
+    current = DocumentStatus.query.filter_by(name=current_status_name, is_system=False).first()
     if current:
         nxt = (DocumentStatus.query
-               .filter(DocumentStatus.id > current.id)
+               .filter(DocumentStatus.id > current.id, DocumentStatus.is_system.is_(False))
                .order_by(DocumentStatus.id.asc())
                .first())
         if nxt:
@@ -35,6 +54,64 @@ def get_next_status(current_status_name: str) -> str:
     return "With Checked and Closed"
 
 
+def commit_transition() -> bool:
+    """
+    Commit a document state change. Returns False, after rolling back, when
+    another request changed one of the records first (its version moved on).
+    """
+    try:
+        db.session.commit()
+        return True
+    except StaleDataError:
+        db.session.rollback()
+        return False
+
+
+def status_successors() -> dict:
+    """
+    Map every DocumentStatus name to the status that follows it, in one query.
+    Set-based counterpart of get_next_status for batch operations.
+    """
+    names = [name for (name,) in db.session.query(DocumentStatus.name)
+             .filter(DocumentStatus.is_system.is_(False))
+             .order_by(DocumentStatus.id.asc())]
+    return {name: names[i + 1] if i + 1 < len(names) else "With Checked and Closed"
+            for i, name in enumerate(names)}
+
+
+def unresolved_transfers(record_ids) -> dict:
+    """
+    Return {record_id: last transfer} for records whose latest transfer has been
+    neither received nor rejected by its target department.
+    """
+    events = (RecordHistory.query
+              .filter(RecordHistory.record_id.in_(record_ids))
+              .filter(RecordHistory.action_type.in_(["transfer", "received", "rejected_transfer"]))
+              .order_by(RecordHistory.timestamp.asc())
+              .all())
+    pending = {}
+    for h in events:
+        if h.action_type == "transfer":
+            pending[h.record_id] = h
+        else:
+            last_transfer = pending.get(h.record_id)
+            if last_transfer and h.to_department == last_transfer.to_department \
+                    and h.timestamp > last_transfer.timestamp:
+                del pending[h.record_id]
+    return pending
+
+
+def bulk_record_ids(data):
+    """Validated, de-duplicated list of record ids from a batch request body."""
+    ids = data.get("record_ids")
+    if not isinstance(ids, list) or not ids:
+        return None
+    try:
+        return list(dict.fromkeys(int(i) for i in ids))
+    except (TypeError, ValueError):
+        return None
+
+
 # ---------------------------------------------------------------------------
 
 def visible_documents(department):
@@ -82,9 +159,10 @@ def dashboard():
         "completed":  records_q.filter(Record.status == "With Checked and Closed").count(),
         "in_process": records_q.filter(Record.status.notin_(list(COMPLETED_STATUSES))).count(),
     }
-    status_data = (records_q
-                   .with_entities(Record.status, func.count(Record.id))
-                   .group_by(Record.status).all())
+    status_data = [(reference_cache().name(DocumentStatus, status_id), count)
+                   for status_id, count in (records_q
+                                            .with_entities(Record.status_id, func.count(Record.id))
+                                            .group_by(Record.status_id).all())]
     records = records_q.order_by(Record.created_at.desc()).limit(5).all()
     return render_template("dashboard.html", stats=stats, charts_combined=status_data, records=records)
 
@@ -111,14 +189,17 @@ def documents():
 
 @bp.route("/documents/<int:record_id>")
 @login_required
+@conditional(document_etag, PAGE_CACHE_CONTROL)
 def document_detail(record_id):
     record = visible_documents(current_user.department).filter_by(id=record_id).first()
+    archived = False
+    if not record:
+        # Old closed documents live in the archive tables.
+        record = visible_archived_documents(current_user.department).filter_by(id=record_id).first()
+        archived = True
     if not record:
         abort(404)
-    departments = Department.query.all()
-    document_statuses = DocumentStatus.query.all()
-    return render_template("document_detail.html", record=record,
-                           departments=departments, document_statuses=document_statuses)
+    return render_template("document_detail.html", record=record, archived=archived)
 
 
 @bp.route("/documents/edit/<int:record_id>", methods=["GET", "POST"])
@@ -128,12 +209,22 @@ def edit_document(record_id):
     record = db.session.get(Record, record_id) or abort(404)
     if request.method == "POST":
         record.title = request.form.get("title", record.title)
-        record.doc_type = request.form.get("doc_type", record.doc_type)
-        record.implementing_office = request.form.get("implementing_office", record.implementing_office)
+        doc_type_id = record.doc_type_id
+        try:
+            record.doc_type = request.form.get("doc_type", record.doc_type)
+            record.implementing_office = request.form.get("implementing_office", record.implementing_office)
+            record.status = request.form.get("status", record.status)
+        except UnknownReference as e:
+            db.session.rollback()
+            flash(str(e), "danger")
+            return redirect(url_for("main.edit_document", record_id=record_id))
+        if request.form.get("priority") in PRIORITIES:
+            record.priority = request.form["priority"]
+        if record.doc_type_id != doc_type_id:
+            apply_sla(record)
         amount = request.form.get("amount")
         record.amount = float(amount) if amount else None
         record.received_by = request.form.get("received_by", record.received_by)
-        record.status = request.form.get("status", record.status)
         record.remarks = request.form.get("remarks", record.remarks)
         date_str = request.form.get("date_received", "").strip()
         if date_str:
@@ -148,14 +239,12 @@ def edit_document(record_id):
             action_by=current_user.full_name, status=record.status,
             timestamp=datetime.now(timezone.utc),
         ))
-        db.session.commit()
+        if not commit_transition():
+            flash(CONCURRENT_UPDATE_MESSAGE, "warning")
+            return redirect(url_for("main.edit_document", record_id=record_id))
         flash("Document updated successfully.", "success")
         return redirect(url_for("main.document_detail", record_id=record.id))
-    departments = Department.query.all()
-    document_types = DocumentType.query.all()
-    document_statuses = DocumentStatus.query.all()
-    return render_template("document_edit.html", record=record, departments=departments,
-                           document_types=document_types, document_statuses=document_statuses)
+    return render_template("document_edit.html", record=record)
 
 
 @bp.route("/documents/delete/<int:record_id>", methods=["POST"])
@@ -163,6 +252,8 @@ def edit_document(record_id):
 @role_required("admin")
 def delete_document(record_id):
     record = db.session.get(Record, record_id) or abort(404)
+    # Attachments are not tied by a foreign key (they outlive archiving); files go with prune-attachments.
+    Attachment.query.filter_by(record_id=record.id).delete()
     db.session.delete(record)
     db.session.commit()
     flash("Document deleted.", "info")
@@ -182,7 +273,8 @@ def close_document(record_id):
         action_by=current_user.full_name, status="Closed",
         timestamp=datetime.now(timezone.utc),
     ))
-    db.session.commit()
+    if not commit_transition():
+        return jsonify(success=False, message=CONCURRENT_UPDATE_MESSAGE)
     return jsonify(success=True)
 
 
@@ -279,38 +371,43 @@ def delete_user(id):
     return redirect(url_for("main.users"))
 
 
+def first_status_name() -> str:
+    """New documents start at the first status of the DocumentStatus table."""
+    first_status = (DocumentStatus.query.filter_by(is_system=False)
+                    .order_by(DocumentStatus.id.asc()).first())
+    return first_status.name if first_status else "Pending"
+
+
 @bp.route("/add_document", methods=["GET", "POST"])
 @login_required
 def add_document():
-    dept_users = User.query.filter_by(department=current_user.department).all()
-    document_type = DocumentType.query.all()
-    document_status = DocumentStatus.query.all()
-    departments = Department.query.all()
-
     if request.method == "POST":
         date_received = date.today()
 
         doc_type = request.form["doc_type"]
-        # Auto-assign the first status from the DocumentStatus table.
-        first_status = DocumentStatus.query.order_by(DocumentStatus.id.asc()).first()
-        auto_status = first_status.name if first_status else "Pending"
-
-        record = Record(
-            document_id=f"DOC-{uuid.uuid4().hex[:8].upper()}",
-            title=request.form["title"],
-            doc_type=doc_type,
-            action_taken=request.form.get("action_taken", ""),
-            department=current_user.department,
-            implementing_office=current_user.department,
-            date_received=date_received,
-            released_by=current_user.full_name,
-            received_by="",
-            status=auto_status,
-            priority=request.form.get("priority", "Normal"),
-            remarks=request.form.get("remarks", ""),
-            created_at=datetime.now(timezone.utc),
-            updated_at=datetime.now(timezone.utc),
-        )
+        auto_status = first_status_name()
+
+        try:
+            record = Record(
+                title=request.form["title"],
+                doc_type=doc_type,
+                action_taken=request.form.get("action_taken", ""),
+                department=current_user.department,
+                implementing_office=current_user.department,
+                date_received=date_received,
+                released_by=current_user.full_name,
+                received_by="",
+                status=auto_status,
+                priority=request.form.get("priority", "Normal"),
+                remarks=request.form.get("remarks", ""),
+                created_at=datetime.now(timezone.utc),
+                updated_at=datetime.now(timezone.utc),
+            )
+        except UnknownReference as e:
+            flash(str(e), "danger")
+            return redirect(url_for("main.add_document"))
+        apply_sla(record)
+        record.document_id = allocate_document_ids(current_user.department)[0]
         db.session.add(record)
         db.session.flush()
         db.session.add(RecordHistory(
@@ -321,17 +418,49 @@ def add_document():
         ))
         db.session.commit()
         flash(f"Document {record.document_id} added successfully.", "success")
+        duplicates = likely_duplicates(record.title, doc_type, record.remarks, exclude_id=record.id)
+        if duplicates:
+            flash("Possible duplicate of " + ", ".join(
+                f"{d.document_id} ({d.title})" for d, _ in duplicates
+            ) + ". Please check before processing.", "warning")
         return redirect(url_for("main.document_detail", record_id=record.id))
 
-    return render_template("admin/new_doc.html", users=dept_users,
-                           document_type=document_type, document_status=document_status,
-                           departments=departments)
+    dept_users = User.query.filter_by(department=current_user.department).all()
+    return render_template("admin/new_doc.html", users=dept_users)
+
+
+def likely_duplicates(title, doc_type, remarks, exclude_id=None):
+    """[(record, similarity)] of the user's visible documents that look like this one."""
+    # Every match, not just the best few: the best may be other offices' documents.
+    matches = dict(find_duplicates(title, doc_type, remarks, exclude_id=exclude_id,
+                                   limit=MAX_CANDIDATES))
+    if not matches:
+        return []
+    records = (visible_documents(current_user.department)
+               .filter(Record.id.in_(list(matches))).all())
+    ranked = sorted(((r, matches[r.id]) for r in records), key=lambda m: (-m[1], m[0].id))
+    return ranked[:DUPLICATE_WARNINGS]
+
+
+def queue_order(sort):
+    """
+    ORDER BY for the work queues. By default the most urgent first, then the
+    nearest SLA deadline (see sla.py), then the oldest. ``?sort=predicted``
+    puts documents predicted to finish last (see prediction.py) first;
+    ``?sort=recent`` the latest updated.
+    """
+    if sort == "predicted":
+        return (Record.predicted_completion_at.desc().nulls_last(), Record.updated_at.desc())
+    if sort == "recent":
+        return (Record.updated_at.desc(),)
+    return (Record.priority_rank, Record.due_at.asc().nulls_last(), Record.created_at)
 
 
 @bp.route("/incoming")
 @login_required
 def incoming_documents():
     q = request.args.get("q", "").strip()
+    sort = request.args.get("sort", "")
 
     records = (visible_documents(current_user.department)
                .filter(Record.department == current_user.department)
@@ -356,8 +485,12 @@ def incoming_documents():
                 RejH.timestamp > RecordHistory.timestamp
             ).exists()
         )
-        .order_by(RecordHistory.timestamp.desc())
     )
+    if sort == "recent":
+        pending_q = pending_q.order_by(RecordHistory.timestamp.desc())
+    else:
+        pending_q = (pending_q.join(Record, Record.id == RecordHistory.record_id)
+                     .order_by(*queue_order(sort), RecordHistory.timestamp.desc()))
 
     history_q = (
         RecordHistory.query
@@ -391,7 +524,7 @@ def incoming_documents():
 
     return render_template("incoming_doc.html", records=records,
                            pending_transfers=pending_transfers,
-                           transfer_history=transfer_history, q=q)
+                           transfer_history=transfer_history, q=q, sort=sort)
 
 
 @bp.route("/outgoing")
@@ -464,9 +597,7 @@ def outgoing_documents():
         else:
             transfer_status[h.id] = "pending"
 
-    departments = Department.query.filter(Department.name != current_user.department).all()
     return render_template("outgoing_doc.html", outgoing=outgoing, records=my_records,
-                           departments=departments,
                            pending_transfer_ids=pending_transfer_ids,
                            received_transfer_ids=received_transfer_ids,
                            transfer_status=transfer_status)
@@ -476,14 +607,18 @@ def outgoing_documents():
 @login_required
 def processing_documents():
     # Open = docs in this dept, not yet assigned to anyone
+    sort = request.args.get("sort", "")
     records = (visible_documents(current_user.department)
                .filter(Record.department == current_user.department)
                .filter(Record.status.notin_(list(COMPLETED_STATUSES)))
                .filter(Record.status != "Assigned")
                .filter(or_(Record.received_by == None, Record.received_by == ""))
-               .order_by(Record.updated_at.desc()).all())
-    dept_users = User.query.filter_by(department=current_user.department, is_deactivated=False).all()
-    return render_template("processing_doc.html", records=records, dept_users=dept_users)
+               .order_by(*queue_order(sort)).all())
+    loads = department_loads(current_user.department)
+    dept_users = by_load(User.query.filter_by(department=current_user.department,
+                                              is_deactivated=False), loads)
+    return render_template("processing_doc.html", records=records, dept_users=dept_users,
+                           loads=loads, sort=sort)
 
 
 @bp.route("/archived")
@@ -521,6 +656,8 @@ def transfer_document(record_id):
     # Can't transfer to own department
     if to_dept == current_user.department:
         return jsonify(success=False, message="Cannot transfer to your own department.")
+    if not Department.query.filter_by(name=to_dept).first():
+        return jsonify(success=False, message=f"Unknown department \"{to_dept}\".")
 
     # Block if there's already a pending unresolved transfer
     last_transfer = (
@@ -564,7 +701,8 @@ def transfer_document(record_id):
         action_by=current_user.full_name, status=new_status, remarks=remarks,
         timestamp=datetime.now(timezone.utc),
     ))
-    db.session.commit()
+    if not commit_transition():
+        return jsonify(success=False, message=CONCURRENT_UPDATE_MESSAGE)
     return jsonify(success=True,
                    message=f"Document released to {to_dept}.",
                    record_id=record.id, status=new_status)
@@ -584,8 +722,11 @@ def cancel_transfer(transfer_history_id):
     )
     if was_received:
         return jsonify(success=False, message="Cannot cancel a transfer that has already been received.")
+    # Touch the record so a cancel racing a receive fails its version check.
+    transfer.record.updated_at = datetime.now(timezone.utc)
     db.session.delete(transfer)
-    db.session.commit()
+    if not commit_transition():
+        return jsonify(success=False, message=CONCURRENT_UPDATE_MESSAGE)
     return jsonify(success=True, message="Transfer cancelled successfully.")
 
 
@@ -623,7 +764,8 @@ def receive_document(record_id):
         action_by=current_user.full_name, status="Assigned",
         timestamp=datetime.now(timezone.utc),
     ))
-    db.session.commit()
+    if not commit_transition():
+        return jsonify(success=False, message=CONCURRENT_UPDATE_MESSAGE)
     return jsonify(success=True, message="Document received and assigned to you.",
                    record_id=record.id, new_department=current_user.department,
                    status="Assigned", received_by=current_user.full_name)
@@ -658,7 +800,8 @@ def reject_document(record_id):
     )
     if previous_history:
         record.status = previous_history.status
-        record.updated_at = datetime.now(timezone.utc)
+    # Always bump the record version so concurrent receive/reject cannot both win.
+    record.updated_at = datetime.now(timezone.utc)
 
     db.session.add(RecordHistory(
         record_id=record.id, action_type="rejected_transfer",
@@ -667,7 +810,8 @@ def reject_document(record_id):
         action_by=current_user.full_name, status=record.status,
         timestamp=datetime.now(timezone.utc),
     ))
-    db.session.commit()
+    if not commit_transition():
+        return jsonify(success=False, message=CONCURRENT_UPDATE_MESSAGE)
     return jsonify(success=True,
                    message=f"Transfer rejected. Document returned to {pending.from_department}.",
                    record_id=record.id)
@@ -675,14 +819,40 @@ def reject_document(record_id):
 
 @bp.route("/trace")
 @login_required
+@conditional(department_etag, PAGE_CACHE_CONTROL)
 def trace():
     q = request.args.get("q", "").strip()
     results = []
-    if q:
+    archived_results = []
+    if q and DOCUMENT_ID_QUERY.match(q):
+        prefix = q.upper()
+        results = (visible_documents(current_user.department)
+                   .filter(Record.document_id.startswith(prefix, autoescape=True))
+                   .all())
+        archived_results = (visible_archived_documents(current_user.department)
+                            .filter(ArchivedRecord.document_id.startswith(prefix, autoescape=True))
+                            .all())
+    if q and not results and not archived_results:
         results = (visible_documents(current_user.department)
                    .filter(or_(Record.document_id.ilike(f"%{q}%"), Record.title.ilike(f"%{q}%")))
                    .all())
-    return render_template("trace.html", q=q, results=results)
+        archived_results = (visible_archived_documents(current_user.department)
+                            .filter(or_(ArchivedRecord.document_id.ilike(f"%{q}%"),
+                                        ArchivedRecord.title.ilike(f"%{q}%")))
+                            .all())
+    as_of, states = None, {}
+    if request.args.get("as_of", "").strip():
+        from .snapshots import archived_record_states, parse_as_of, record_states
+        try:
+            as_of = parse_as_of(request.args["as_of"])
+        except ValueError:
+            flash("Enter the point in time as a date and time.", "warning")
+        else:
+            states = record_states([r.id for r in results], as_of)
+            states.update(archived_record_states([r.id for r in archived_results], as_of))
+    return render_template("trace.html", q=q, results=results + archived_results,
+                           archived_ids={r.id for r in archived_results},
+                           as_of=as_of, states=states)
 
 
 @bp.route("/analytics")
@@ -766,38 +936,17 @@ def reports():
 @bp.route("/reports/export")
 @login_required
 def export_report():
+    from .reports import build_report, parse_report_date
     report_type = request.args.get("type", "documents")
-    date_from = request.args.get("from", "")
-    date_to = request.args.get("to", "")
-    records_q = visible_documents(current_user.department)
-    if date_from:
-        try:
-            records_q = records_q.filter(Record.date_received >= datetime.strptime(date_from, "%Y-%m-%d").date())
-        except ValueError:
-            pass
-    if date_to:
-        try:
-            records_q = records_q.filter(Record.date_received <= datetime.strptime(date_to, "%Y-%m-%d").date())
-        except ValueError:
-            pass
-    records = records_q.all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    if report_type == "history":
-        writer.writerow(["Document ID", "Action", "From", "To", "By", "Status", "Timestamp"])
-        for r in records:
-            for h in r.history:
-                writer.writerow([r.document_id, h.action_type, h.from_department,
-                                  h.to_department, h.action_by, h.status, h.timestamp])
-    else:
-        writer.writerow(["Document ID", "Title", "Type", "Department", "Status",
-                         "Amount", "Date Received", "Released By", "Received By", "Remarks"])
-        for r in records:
-            writer.writerow([r.document_id, r.title, r.doc_type, r.department, r.status,
-                              r.amount or 0, r.date_received, r.released_by, r.received_by, r.remarks or ""])
-    output.seek(0)
-    return Response(output.getvalue(), mimetype="text/csv",
-                    headers={"Content-Disposition": f"attachment;filename=doctrack_{report_type}_export.csv"})
+    if report_type != "history":
+        report_type = "documents"
+    body, mimetype, filename = build_report(
+        current_user.department, report_type,
+        parse_report_date(request.args.get("from", "")),
+        parse_report_date(request.args.get("to", "")),
+    )
+    return Response(body, mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment;filename={filename}"})
 
 
 @bp.route("/office_settings", methods=["GET", "POST"])
@@ -811,32 +960,54 @@ def office_settings():
             if name and not DocumentType.query.filter_by(name=name).first():
                 db.session.add(DocumentType(name=name))
                 db.session.commit()
+                reference_cache().clear()
                 flash(f'Document type "{name}" added.', "success")
             elif name:
                 flash("Document type already exists.", "warning")
         elif action == "delete_doc_type":
             dt = db.session.get(DocumentType, request.form.get("id"))
-            if dt:
+            if dt and Record.query.filter_by(doc_type_id=dt.id).first():
+                flash(f'"{dt.name}" is still used by documents and cannot be deleted.', "warning")
+            elif dt:
                 db.session.delete(dt)
                 db.session.commit()
+                reference_cache().clear()
                 flash(f'"{dt.name}" deleted.', "info")
+        elif action == "set_sla":
+            dt = db.session.get(DocumentType, request.form.get("id"))
+            hours = request.form.get("sla_hours", "").strip()
+            if dt and (not hours or (hours.isdigit() and int(hours) > 0)):
+                dt.sla_hours = int(hours) if hours else None
+                db.session.commit()
+                updated = recompute_due_dates(dt)
+                flash(f'SLA for "{dt.name}" set to '
+                      f'{f"{dt.sla_hours} hour(s)" if dt.sla_hours else "none"}; '
+                      f'{updated} open document(s) updated.', "success")
+            elif dt:
+                flash("SLA must be a whole number of hours.", "warning")
         elif action == "add_status":
             name = request.form.get("name", "").strip()
             if name and not DocumentStatus.query.filter_by(name=name).first():
                 db.session.add(DocumentStatus(name=name))
                 db.session.commit()
+                reference_cache().clear()
                 flash(f'Status "{name}" added.', "success")
             elif name:
                 flash("Status already exists.", "warning")
         elif action == "delete_status":
             ds = db.session.get(DocumentStatus, request.form.get("id"))
-            if ds:
+            if ds and (ds.is_system
+                       or Record.query.filter_by(status_id=ds.id).first()
+                       or RecordHistory.query.filter_by(status_id=ds.id).first()):
+                flash(f'"{ds.name}" is still used by documents and cannot be deleted.', "warning")
+            elif ds:
                 db.session.delete(ds)
                 db.session.commit()
+                reference_cache().clear()
                 flash(f'"{ds.name}" deleted.', "info")
         return redirect(url_for("main.office_settings"))
     doc_types = DocumentType.query.order_by(DocumentType.name).all()
-    doc_statuses = DocumentStatus.query.order_by(DocumentStatus.name).all()
+    doc_statuses = DocumentStatus.query.filter_by(is_system=False).order_by(DocumentStatus.name).all()
     staff_count = User.query.filter_by(department=current_user.department).count()
     return render_template("office_settings.html", doc_types=doc_types,
                            doc_statuses=doc_statuses, staff_count=staff_count)
@@ -851,8 +1022,10 @@ def activity_logs():
                  .filter((RecordHistory.from_department == current_user.department)
                          | (RecordHistory.to_department == current_user.department))
                  .order_by(RecordHistory.timestamp.desc()))
-    if action_filter:
+    if action_filter in ActionType.__members__:
         records_q = records_q.filter(RecordHistory.action_type == action_filter)
+    elif action_filter:
+        records_q = records_q.filter(false())
     records = records_q.all()
     return render_template("logs.html", records=records, action_filter=action_filter)
 
@@ -870,12 +1043,16 @@ def not_found(e):
 @bp.route("/assigned")
 @login_required
 def assigned_documents():
+    sort = request.args.get("sort", "")
     records = (visible_documents(current_user.department)
                .filter(Record.department == current_user.department)
                .filter(Record.status == "Assigned")
-               .order_by(Record.updated_at.desc()).all())
-    dept_users = User.query.filter_by(department=current_user.department, is_deactivated=False).all()
-    return render_template("assigned.html", records=records, dept_users=dept_users)
+               .order_by(*queue_order(sort)).all())
+    loads = department_loads(current_user.department)
+    dept_users = by_load(User.query.filter_by(department=current_user.department,
+                                              is_deactivated=False), loads)
+    return render_template("assigned.html", records=records, dept_users=dept_users,
+                           loads=loads, sort=sort)
 
 
 @bp.route("/documents/assign/<int:record_id>", methods=["POST"])
@@ -898,5 +1075,188 @@ def assign_document(record_id):
         remarks=f"Assigned to {assigned_to}" + (f" \u2014 {remarks}" if remarks else ""),
         timestamp=datetime.now(timezone.utc),
     ))
-    db.session.commit()
-    return jsonify(success=True, message=f"Document assigned to {assigned_to}.")
\ No newline at end of file
+    if not commit_transition():
+        return jsonify(success=False, message=CONCURRENT_UPDATE_MESSAGE)
+    return jsonify(success=True, message=f"Document assigned to {assigned_to}.")
+
+
+def _bulk_response(results):
+    succeeded = sum(1 for r in results if r["success"])
+    return jsonify(success=True, succeeded=succeeded,
+                   failed=len(results) - succeeded, results=results)
+
+
+def _bulk_request():
+    data = request.get_json() or {}
+    ids = bulk_record_ids(data)
+    if ids is None:
+        return data, None, jsonify(success=False, message="Please select at least one document.")
+    if len(ids) > MAX_BULK_RECORDS:
+        return data, None, jsonify(success=False,
+                                   message=f"At most {MAX_BULK_RECORDS} documents per batch.")
+    # Documents the caller cannot see are reported as not found.
+    records = {r.id: r for r in visible_documents(current_user.department)
+               .filter(Record.id.in_(ids))}
+    return data, (ids, records), None
+
+
+@bp.route("/documents/transfer/bulk", methods=["POST"])
+@login_required
+def bulk_transfer_documents():
+    data, batch, error = _bulk_request()
+    if error:
+        return error
+    ids, records = batch
+    to_dept = data.get("to_department", "").strip()
+    remarks = data.get("remarks", "").strip()
+    if not to_dept:
+        return jsonify(success=False, message="Please select a target department.")
+    if to_dept == current_user.department:
+        return jsonify(success=False, message="Cannot transfer to your own department.")
+    if not Department.query.filter_by(name=to_dept).first():
+        return jsonify(success=False, message=f"Unknown department \"{to_dept}\".")
+
+    successors = status_successors()
+    pending = unresolved_transfers(list(records))
+    now = datetime.now(timezone.utc)
+    results, history = [], []
+    for record_id in ids:
+        record = records.get(record_id)
+        if record is None:
+            message = "Document not found."
+        elif record.status in COMPLETED_STATUSES:
+            message = "This document is already completed and cannot be transferred."
+        elif record.received_by != current_user.full_name:
+            message = "Only the staff assigned to this document can release it."
+        elif record.status != "Assigned":
+            message = "Document must be assigned before it can be released."
+        elif record_id in pending:
+            message = f"Document is still pending with {pending[record_id].to_department}."
+        else:
+            message = None
+        if message:
+            results.append({"record_id": record_id, "success": False, "message": message})
+            continue
+
+        new_status = successors.get(record.status, "With Checked and Closed")
+        record.received_by = ""
+        record.status = new_status
+        record.updated_at = now
+        history.append({
+            "record_id": record_id, "action_type": "transfer",
+            "from_department": current_user.department, "to_department": to_dept,
+            "action_by": current_user.full_name, "status": new_status, "remarks": remarks,
+            "timestamp": now,
+        })
+        results.append({"record_id": record_id, "success": True, "status": new_status,
+                        "message": f"Document released to {to_dept}."})
+
+    if history:
+        db.session.execute(insert(RecordHistory.__table__),
+                           [reference_values(RecordHistory, h) for h in history])
+    if not commit_transition():
+        return jsonify(success=False, message=CONCURRENT_UPDATE_MESSAGE)
+    return _bulk_response(results)
+
+
+@bp.route("/documents/receive/bulk", methods=["POST"])
+@login_required
+def bulk_receive_documents():
+    _, batch, error = _bulk_request()
+    if error:
+        return error
+    ids, records = batch
+    department = current_user.department
+
+    pending = unresolved_transfers(list(records))
+    now = datetime.now(timezone.utc)
+    results, history = [], []
+    for record_id in ids:
+        record = records.get(record_id)
+        transfer = pending.get(record_id)
+        if record is None:
+            message = "Document not found."
+        elif transfer is None or transfer.to_department != department:
+            message = "No pending transfer to your office."
+        # A transfer out of "Assigned" itself records a completed status; only
+        # a document completed since it was sent (closed in transit) is refused.
+        elif record.status in COMPLETED_STATUSES and record.status != transfer.status:
+            message = "This document is already completed and cannot be received."
+        else:
+            message = None
+        if message:
+            results.append({"record_id": record_id, "success": False, "message": message})
+            continue
+
+        record.department = department
+        record.received_by = current_user.full_name
+        record.status = "Assigned"
+        record.updated_at = now
+        history.append({
+            "record_id": record_id, "action_type": "received",
+            "from_department": transfer.from_department,
+            "to_department": department,
+            "action_by": current_user.full_name, "status": "Assigned",
+            "timestamp": now,
+        })
+        results.append({"record_id": record_id, "success": True, "status": "Assigned",
+                        "message": "Document received and assigned to you."})
+
+    if history:
+        db.session.execute(insert(RecordHistory.__table__),
+                           [reference_values(RecordHistory, h) for h in history])
+    if not commit_transition():
+        return jsonify(success=False, message=CONCURRENT_UPDATE_MESSAGE)
+    return _bulk_response(results)
+
+
+@bp.route("/documents/assign/bulk", methods=["POST"])
+@login_required
+@role_required("admin")
+def bulk_assign_documents():
+    data, batch, error = _bulk_request()
+    if error:
+        return error
+    ids, records = batch
+    assigned_to = data.get("assigned_to", "").strip()
+    remarks = data.get("remarks", "").strip()
+    if not assigned_to:
+        return jsonify(success=False, message="Please select a staff to assign.")
+    if not User.query.filter_by(department=current_user.department, full_name=assigned_to,
+                                is_deactivated=False).first():
+        return jsonify(success=False, message=f"{assigned_to} is not staff of your office.")
+
+    now = datetime.now(timezone.utc)
+    note = f"Assigned to {assigned_to}" + (f" \u2014 {remarks}" if remarks else "")
+    results, history = [], []
+    for record_id in ids:
+        record = records.get(record_id)
+        if record is None:
+            message = "Document not found."
+        elif record.department != current_user.department:
+            message = "This document is not in your office."
+        elif record.status in COMPLETED_STATUSES:
+            message = "This document is already completed and cannot be assigned."
+        else:
+            message = None
+        if message:
+            results.append({"record_id": record_id, "success": False, "message": message})
+            continue
+        record.received_by = assigned_to
+        record.status = "Assigned"
+        record.updated_at = now
+        history.append({
+            "record_id": record_id, "action_type": "assigned",
+            "from_department": current_user.department, "to_department": current_user.department,
+            "action_by": current_user.full_name, "status": "Assigned", "remarks": note,
+            "timestamp": now,
+        })
+        results.append({"record_id": record_id, "success": True, "status": "Assigned",
+                        "message": f"Document assigned to {assigned_to}."})
+
+    if history:
+        db.session.execute(insert(RecordHistory.__table__),
+                           [reference_values(RecordHistory, h) for h in history])
+    if not commit_transition():
+        return jsonify(success=False, message=CONCURRENT_UPDATE_MESSAGE)
+    return _bulk_response(results)
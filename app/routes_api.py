@@ -2,35 +2,67 @@
 API routes for analytics and real-time data endpoints.
 This module is imported and registered in __init__.py.
 """
-from flask import Blueprint, jsonify
+from flask import (Blueprint, Response, abort, jsonify, request, send_file, stream_with_context,
+                   url_for)
 from flask_login import login_required, current_user
 from collections import defaultdict
-import statistics
-from .models import Record, RecordHistory
+from datetime import date, datetime, timezone
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.orm import aliased
+from .models import db, Record, RecordHistory, DocumentType, PRIORITIES
+from .decorators import conditional
+from .duplicates import index_records
+from .references import reference_values
+from .sequencing import sequence_rows
+from .sla import due_at
+from .tenancy import current_tenant_id
+from .serialization import (NDJSON_MIMETYPE, accepted_encoding, compress_response,
+                            json_response, ndjson_response)
+from .caching import analytics_etag, department_etag, API_CACHE_CONTROL, ANALYTICS_CACHE_CONTROL
 
 api_bp = Blueprint("api", __name__, url_prefix="/api")
 
+# Upper bound on rows accepted by a single bulk intake request.
+MAX_BULK_DOCUMENTS = 5000
+# Rows per INSERT statement during bulk intake.
+BULK_INSERT_CHUNK = 1000
+# Rows fetched per round trip when streaming NDJSON.
+NDJSON_BATCH_SIZE = 1000
+# Change feed page size (default / maximum).
+CHANGES_PAGE_SIZE = 500
+MAX_CHANGES_PAGE_SIZE = 5000
 
-@api_bp.route("/analytics", methods=["GET"])
-@login_required
-def api_analytics():
-    """
-    JSON endpoint for real-time bottleneck analytics.
-    Returns avg hours per department, bottlenecks, and ML summary.
-    Frontend can poll this for live updates.
-    """
+
+@api_bp.after_request
+def compress(response):
+    return compress_response(response, request)
+
+
+# ---------------------------------------------------------------------------
+# Statements and payload builders shared by the Flask views below and the
+# async read path in asgi.py. They only build SQL / shape rows, so they work
+# the same against a sync Session and an AsyncSession.
+
+def analytics_statement():
+    """History rows needed for bottleneck analytics, grouped per record in time order."""
+    return (select(RecordHistory.record_id, RecordHistory.to_department, RecordHistory.timestamp)
+            .order_by(RecordHistory.record_id, RecordHistory.timestamp))
+
+
+def bottleneck_summary(rows):
+    """Avg hours per department and bottlenecks from ``analytics_statement`` rows."""
     dept_durations = defaultdict(list)
 
-    records = Record.query.options().all()
-    for record in records:
-        hist = sorted(record.history, key=lambda h: h.timestamp) if record.history else []
-        for i in range(len(hist) - 1):
-            cur = hist[i]
-            nxt = hist[i + 1]
-            if cur.to_department and cur.timestamp and nxt.timestamp:
-                delta = (nxt.timestamp - cur.timestamp).total_seconds()
-                if delta > 0:
-                    dept_durations[cur.to_department].append(delta)
+    prev = None
+    for row in rows:
+        cur = prev
+        prev = row
+        if cur is None or cur.record_id != row.record_id:
+            continue
+        if cur.to_department and cur.timestamp and row.timestamp:
+            delta = (row.timestamp - cur.timestamp).total_seconds()
+            if delta > 0:
+                dept_durations[cur.to_department].append(delta)
 
     # compute averages in hours
     avg_hours = {}
@@ -38,6 +70,7 @@ def api_analytics():
         avg_hours[dept] = (sum(secs) / len(secs)) / 3600.0
 
     # overall stats
+    import statistics
     avg_values = list(avg_hours.values())
     overall_mean = statistics.mean(avg_values) if avg_values else 0
     overall_stdev = statistics.stdev(avg_values) if len(avg_values) > 1 else 0
@@ -51,48 +84,635 @@ def api_analytics():
     labels = list(avg_hours.keys())
     values = [round(v, 2) for v in avg_hours.values()]
 
-    return jsonify({
+    return {
         "labels": labels,
         "values": values,
         "bottlenecks": bottlenecks,
         "overall_mean": round(overall_mean, 2),
         "overall_stdev": round(overall_stdev, 2)
-    })
+    }
+
+
+# Fields /api/documents can return; DEFAULT_DOCUMENT_FIELDS when ?fields= is absent.
+DOCUMENT_FIELDS = {
+    "id": Record.id,
+    "document_id": Record.document_id,
+    "title": Record.title,
+    "doc_type": Record.doc_type,
+    "status": Record.status,
+    "priority": Record.priority,
+    "department": Record.department,
+    "implementing_office": Record.implementing_office,
+    "received_by": Record.received_by,
+    "date_received": Record.date_received,
+    "created_at": Record.created_at,
+    "updated_at": Record.updated_at,
+}
+DEFAULT_DOCUMENT_FIELDS = ("id", "document_id", "title", "status", "department", "created_at")
+
+
+def parse_document_fields(value):
+    """``?fields=a,b`` -> list of field names; raises ValueError on unknown names."""
+    if not value:
+        return list(DEFAULT_DOCUMENT_FIELDS)
+    fields = [f.strip() for f in value.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in DOCUMENT_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. "
+                         f"Available: {', '.join(DOCUMENT_FIELDS)}.")
+    return list(dict.fromkeys(fields))
+
+
+def documents_statement(department, fields=DEFAULT_DOCUMENT_FIELDS):
+    """Selected columns of the documents visible to ``department``, newest first."""
+    touched_ids = select(RecordHistory.record_id).where(
+        (RecordHistory.from_department == department)
+        | (RecordHistory.to_department == department)
+    )
+    return (select(*[DOCUMENT_FIELDS[f].label(f) for f in fields])
+            .where(or_(Record.department == department, Record.id.in_(touched_ids)))
+            .order_by(Record.created_at.desc()))
+
+
+def documents_payload(rows):
+    """Plain dicts straight from the result rows; the encoder formats dates."""
+    documents = [dict(r._mapping) for r in rows]
+    return {"total": len(documents), "documents": documents}
+
+
+def pending_transfers_statement(department):
+    """Count of transfers to ``department`` still waiting to be received or rejected."""
+    received_ids = select(RecordHistory.record_id).where(
+        RecordHistory.action_type == "received",
+        RecordHistory.to_department == department,
+    )
+    RejH = aliased(RecordHistory)
+    rejected_later = select(RejH.id).where(
+        RejH.record_id == RecordHistory.record_id,
+        RejH.action_type == "rejected_transfer",
+        RejH.to_department == department,
+        RejH.timestamp > RecordHistory.timestamp,
+    ).exists()
+    return (select(func.count(RecordHistory.id))
+            .where(RecordHistory.action_type == "transfer",
+                   RecordHistory.to_department == department,
+                   RecordHistory.record_id.not_in(received_ids),
+                   ~rejected_later))
+
+
+def changes_statement(department, since, limit):
+    """History events after cursor ``since`` for records visible to ``department``."""
+    touched_ids = select(RecordHistory.record_id).where(
+        (RecordHistory.from_department == department)
+        | (RecordHistory.to_department == department)
+    )
+    owned_ids = select(Record.id).where(Record.department == department)
+    return (select(RecordHistory.change_seq.label("seq"), RecordHistory.id,
+                   RecordHistory.record_id, RecordHistory.action_type,
+                   RecordHistory.status, RecordHistory.from_department,
+                   RecordHistory.to_department, RecordHistory.action_by,
+                   RecordHistory.remarks, RecordHistory.timestamp)
+            .where(RecordHistory.change_seq > since,
+                   or_(RecordHistory.record_id.in_(touched_ids),
+                       RecordHistory.record_id.in_(owned_ids)))
+            .order_by(RecordHistory.change_seq)
+            .limit(limit))
+
+
+def changes_page(department, since, limit, fields):
+    """One page of the change feed: events, current state of their records, next cursor."""
+    # Number newly committed events first: the cursor follows commit order (see sequencing.py).
+    sequence_rows(RecordHistory.__table__)
+    events = [dict(r._mapping) for r in
+              db.session.execute(changes_statement(department, since, limit + 1))]
+    has_more = len(events) > limit
+    events = events[:limit]
+    record_ids = list(dict.fromkeys(e["record_id"] for e in events))
+    records = []
+    if record_ids:
+        columns = [DOCUMENT_FIELDS[f].label(f) for f in fields]
+        records = [dict(r._mapping) for r in
+                   db.session.execute(select(*columns).where(Record.id.in_(record_ids)))]
+    return {
+        "cursor": events[-1]["seq"] if events else since,
+        "has_more": has_more,
+        "events": events,
+        "records": records,
+    }
+
+
+@api_bp.route("/analytics", methods=["GET"])
+@login_required
+@conditional(analytics_etag, ANALYTICS_CACHE_CONTROL)
+def api_analytics():
+    """
+    JSON endpoint for real-time bottleneck analytics.
+    Returns avg hours per department, bottlenecks, and a summary of the
+    completion predictions (see prediction.py).
+    Frontend can poll this for live updates.
+    """
+    from .prediction import prediction_summary, prediction_summary_statement
+    summary = bottleneck_summary(db.session.execute(analytics_statement()))
+    summary["predictions"] = prediction_summary(
+        db.session.execute(prediction_summary_statement()).one())
+    return jsonify(summary)
 
 
 @api_bp.route("/documents", methods=["GET"])
 @login_required
+@conditional(department_etag, API_CACHE_CONTROL)
 def api_documents():
     """
     Return all visible documents as JSON for external integrations or dashboards.
+    ``?fields=id,title`` limits the columns; ``?format=ndjson`` (or an
+    ``Accept: application/x-ndjson`` header) streams one document per line.
+    """
+    try:
+        fields = parse_document_fields(request.args.get("fields", ""))
+    except ValueError as exc:
+        return jsonify(success=False, message=str(exc)), 400
+    statement = documents_statement(current_user.department, fields)
+
+    if request.args.get("format") == "ndjson" or \
+            request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        result = db.session.execute(statement.execution_options(yield_per=NDJSON_BATCH_SIZE))
+        rows = (dict(r._mapping) for r in result)
+        return ndjson_response(stream_with_context(rows), accepted_encoding(request))
+
+    return json_response(documents_payload(db.session.execute(statement)))
+
+
+@api_bp.route("/pending-transfers", methods=["GET"])
+@login_required
+@conditional(department_etag, API_CACHE_CONTROL)
+def api_pending_transfers():
+    """
+    Number of incoming transfers waiting for this department.
+    Polled by the sidebar badge on every page.
+    """
+    count = db.session.execute(pending_transfers_statement(current_user.department)).scalar()
+    return jsonify({"count": count})
+
+
+@api_bp.route("/changes", methods=["GET"])
+@login_required
+def api_changes():
+    """
+    Incremental sync for integrations. ``?since=<cursor>`` returns the history
+    events after the cursor that the caller's department can see, plus the
+    current state of the records they touched, and the cursor to pass next.
+    Start with ``since=0``; keep paging while ``has_more`` is true.
+    ``?format=ndjson`` streams every page in one response instead, one event or
+    record per line, ending with a ``{"cursor": ...}`` line.
+    Records removed by delete or archival drop out of the feed without an event.
+    The cursor follows commit order (``seq``), so an event whose transaction
+    commits late is still delivered after the cursor has moved past its id.
+    """
+    try:
+        since = max(int(request.args.get("since", 0)), 0)
+        limit = min(max(int(request.args.get("limit", CHANGES_PAGE_SIZE)), 1), MAX_CHANGES_PAGE_SIZE)
+        fields = parse_document_fields(request.args.get("fields", ""))
+    except ValueError as exc:
+        return jsonify(success=False, message=str(exc) or "Invalid cursor."), 400
+    department = current_user.department
+
+    if request.args.get("format") == "ndjson" or \
+            request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        def pages(cursor):
+            while True:
+                page = changes_page(department, cursor, limit, fields)
+                for event in page["events"]:
+                    yield {"type": "event", **event}
+                for record in page["records"]:
+                    yield {"type": "record", **record}
+                cursor = page["cursor"]
+                if not page["has_more"]:
+                    yield {"cursor": cursor}
+                    return
+        return ndjson_response(stream_with_context(pages(since)), accepted_encoding(request))
+
+    return json_response(changes_page(department, since, limit, fields))
+
+
+def _as_of_arg():
+    """``?as_of=`` as a datetime (None when absent); raises ValueError."""
+    from .snapshots import parse_as_of
+    value = request.args.get("as_of", "").strip()
+    return parse_as_of(value) if value else None
+
+
+def _state_payload(state, archived=False):
+    return {**state._asdict(), "archived": archived}
+
+
+@api_bp.route("/documents/state", methods=["GET"])
+@login_required
+def api_department_state():
+    """
+    Documents held by the caller's department at ``?as_of=`` (ISO date or
+    datetime, default now), rebuilt from their history.
+    """
+    from .snapshots import department_states
+    try:
+        as_of = _as_of_arg()
+    except ValueError:
+        return jsonify(success=False, message="as_of must be an ISO date or datetime."), 400
+    states = department_states(current_user.department, as_of)
+    return json_response({"success": True, "department": current_user.department,
+                          "as_of": as_of, "total": len(states),
+                          "documents": [_state_payload(s) for s in states]})
+
+
+@api_bp.route("/documents/duplicates", methods=["GET"])
+@login_required
+def api_document_duplicates():
+    """Visible documents that look like ``?title=&doc_type=&remarks=``, for the intake form."""
+    from .routes import likely_duplicates
+    title = request.args.get("title", "").strip()
+    if not title:
+        return jsonify(success=True, duplicates=[])
+    duplicates = likely_duplicates(title, request.args.get("doc_type") or None,
+                                   request.args.get("remarks"))
+    return jsonify(success=True, duplicates=[
+        {"id": r.id, "document_id": r.document_id, "title": r.title,
+         "department": r.department, "similarity": round(score, 2),
+         "url": url_for("main.document_detail", record_id=r.id)}
+        for r, score in duplicates
+    ])
+
+
+@api_bp.route("/documents/<int:record_id>/state", methods=["GET"])
+@login_required
+def api_document_state(record_id):
+    """Where a visible document was, and its status, at ``?as_of=``; null before it existed."""
+    from .archive import visible_archived_documents
+    from .routes import visible_documents
+    from .snapshots import archived_record_states, record_states
+    try:
+        as_of = _as_of_arg()
+    except ValueError:
+        return jsonify(success=False, message="as_of must be an ISO date or datetime."), 400
+    if visible_documents(current_user.department).filter(Record.id == record_id).first():
+        state, archived = record_states([record_id], as_of).get(record_id), False
+    elif visible_archived_documents(current_user.department).filter_by(id=record_id).first():
+        state, archived = archived_record_states([record_id], as_of).get(record_id), True
+    else:
+        abort(404)
+    return json_response({"success": True, "as_of": as_of,
+                          "state": _state_payload(state, archived) if state else None})
+
+
+@api_bp.route("/flow", methods=["GET"])
+@login_required
+def api_flow():
     """
-    from sqlalchemy import or_
-    
-    records = Record.query.filter(
-        or_(
-            Record.department == current_user.department,
-            Record.id.in_(
-                RecordHistory.query.with_entities(RecordHistory.record_id)
-                .filter(
-                    (RecordHistory.from_department == current_user.department) |
-                    (RecordHistory.to_department == current_user.department)
-                )
-                .subquery()
-            )
+    Department (``?kind=department``, default) or status (``?kind=status``)
+    transition matrix for Sankey charts: nodes, and links with move counts,
+    rework (rejected transfers) and median/average dwell hours at the source.
+    Folds the latest history into the aggregates first.
+    """
+    from .flow import FLOW_BATCH_SIZE, KINDS, flow_graph, refresh_flow
+    kind = request.args.get("kind", "department")
+    if kind not in KINDS:
+        return jsonify(success=False, message="kind must be 'department' or 'status'."), 400
+    refresh_flow(FLOW_BATCH_SIZE)
+    return json_response({"success": True, **flow_graph(kind)})
+
+
+def _decode_csv(data, charset):
+    """Text of a CSV body in its declared ``charset``, else UTF-8 (a BOM is dropped)."""
+    import codecs
+
+    try:
+        if not charset or codecs.lookup(charset).name == "utf-8":
+            charset = "utf-8-sig"
+        return data.decode(charset)
+    except (LookupError, UnicodeDecodeError):
+        raise ValueError("The CSV file is not valid UTF-8. Save it as \"CSV UTF-8\" or "
+                         "declare its charset in the Content-Type.") from None
+
+
+def _bulk_rows_from_request():
+    """
+    Read bulk intake rows from a multipart ``file`` upload, a ``text/csv`` body
+    or a JSON body (either a list or ``{"documents": [...]}``). Raises
+    ValueError for a CSV that cannot be decoded.
+    """
+    import csv
+    import io
+
+    upload = request.files.get("file")
+    if upload is not None:
+        text = _decode_csv(upload.read(), upload.mimetype_params.get("charset"))
+        return list(csv.DictReader(io.StringIO(text)))
+    if request.mimetype == "text/csv":
+        text = _decode_csv(request.get_data(), request.mimetype_params.get("charset"))
+        return list(csv.DictReader(io.StringIO(text)))
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get("documents")
+    return data if isinstance(data, list) else None
+
+
+def _validate_bulk_row(row, doc_types):
+    """Return (values, error) for one bulk intake row."""
+    if not isinstance(row, dict):
+        return None, "Row must be an object."
+    for field in ("title", "doc_type", "action_taken", "priority", "remarks"):
+        if row.get(field) is not None and not isinstance(row[field], str):
+            return None, f'"{field}" must be a string.'
+    title = (row.get("title") or "").strip()
+    doc_type = (row.get("doc_type") or "").strip()
+    action_taken = (row.get("action_taken") or "").strip()
+    priority = (row.get("priority") or "Normal").strip()
+    remarks = (row.get("remarks") or "").strip()
+    if not title:
+        return None, "Title is required."
+    if len(title) > 255:
+        return None, "Title must be at most 255 characters."
+    if doc_type not in doc_types:
+        return None, f'Unknown document type "{doc_type}".'
+    if len(action_taken) > 100:
+        return None, "Action taken must be at most 100 characters."
+    if priority not in PRIORITIES:
+        return None, f'Priority must be one of {", ".join(PRIORITIES)}.'
+    return {"title": title, "doc_type": doc_type, "action_taken": action_taken,
+            "priority": priority, "remarks": remarks}, None
+
+
+@api_bp.route("/documents/bulk", methods=["POST"])
+@login_required
+def api_documents_bulk():
+    """
+    Create many documents in one request, from JSON or CSV.
+    Records and their 'create' history rows are inserted in batched statements.
+    Returns a result per input row.
+    """
+    from .routes import first_status_name
+    from .document_ids import allocate_document_ids
+
+    try:
+        rows = _bulk_rows_from_request()
+    except ValueError as exc:
+        return jsonify(success=False, message=str(exc)), 400
+    if rows is None:
+        return jsonify(success=False, message="Send a JSON list of documents or a CSV file."), 400
+    if len(rows) > MAX_BULK_DOCUMENTS:
+        return jsonify(success=False,
+                       message=f"At most {MAX_BULK_DOCUMENTS} documents per request."), 400
+
+    # doc type name -> SLA hours (None = no deadline)
+    doc_types = dict(db.session.execute(select(DocumentType.name, DocumentType.sla_hours)).all())
+    status = first_status_name()
+    now = datetime.now(timezone.utc)
+    today = date.today()
+
+    results = []
+    pending = []
+    for index, row in enumerate(rows, start=1):
+        values, error = _validate_bulk_row(row, doc_types)
+        if error:
+            results.append({"row": index, "success": False, "message": error})
+            continue
+        values.update(
+            department=current_user.department,
+            implementing_office=current_user.department,
+            date_received=today,
+            released_by=current_user.full_name,
+            received_by="",
+            status=status,
+            created_at=now,
+            updated_at=now,
+            due_at=due_at(now, doc_types[values["doc_type"]]),
         )
-    ).order_by(Record.created_at.desc()).all()
+        result = {"row": index, "success": True}
+        results.append(result)
+        pending.append((result, values))
+
+    if pending:
+        document_ids = allocate_document_ids(current_user.department, len(pending))
+        for (result, values), document_id in zip(pending, document_ids):
+            result["document_id"] = values["document_id"] = document_id
+
+    records = Record.__table__
+    for start in range(0, len(pending), BULK_INSERT_CHUNK):
+        chunk = pending[start:start + BULK_INSERT_CHUNK]
+        inserted = db.session.execute(
+            insert(records).returning(records.c.id, records.c.document_id),
+            [reference_values(Record, values) for _, values in chunk],
+        )
+        ids = {document_id: record_id for record_id, document_id in inserted}
+        for result, values in chunk:
+            result["id"] = ids[values["document_id"]]
+        index_records([(result["id"], values["title"], values["doc_type"], values["remarks"])
+                       for result, values in chunk], current_tenant_id())
+        db.session.execute(insert(RecordHistory.__table__), [
+            reference_values(RecordHistory, {
+                "record_id": result["id"], "action_type": "create",
+                "from_department": current_user.department,
+                "to_department": current_user.department,
+                "action_by": current_user.full_name, "status": status,
+                "timestamp": now,
+            })
+            for result, _ in chunk
+        ])
+    db.session.commit()
 
     return jsonify({
-        "total": len(records),
-        "documents": [
-            {
-                "id": r.id,
-                "document_id": r.document_id,
-                "title": r.title,
-                "status": r.status,
-                "department": r.department,
-                "created_at": r.created_at.isoformat() if r.created_at else None
-            }
-            for r in records
-        ]
+        "success": True,
+        "created": len(pending),
+        "failed": len(results) - len(pending),
+        "results": results,
     })
+
+
+@api_bp.route("/jobs", methods=["POST"])
+@login_required
+def api_jobs_create():
+    """
+    Queue a report/export for the background worker.
+    Answers straight away with a finished job when a current cached result exists,
+    and without a job when no worker is running to build one.
+    """
+    from .jobs import enqueue_report, job_payload, worker_active
+    from .reports import (REPORT_BUILDERS, ADMIN_REPORT_TYPES, UNDATED_REPORT_TYPES,
+                          parse_report_date)
+
+    data = request.get_json(silent=True) or {}
+    report_type = data.get("report_type", "")
+    if report_type not in REPORT_BUILDERS:
+        return jsonify(success=False, message="Unknown report type."), 400
+    if report_type in ADMIN_REPORT_TYPES and current_user.role != "admin":
+        return jsonify(success=False, message="You are not authorized to run this report."), 403
+    date_from = parse_report_date(data.get("from", ""))
+    date_to = parse_report_date(data.get("to", ""))
+    if report_type in UNDATED_REPORT_TYPES:
+        date_from = date_to = None
+    active = worker_active()
+    job = enqueue_report(current_user.department, report_type, date_from, date_to,
+                         requested_by=current_user.full_name, queue=active)
+    if job is None:
+        return jsonify(success=False, worker_active=False,
+                       message="No report worker is running.")
+    return jsonify(success=True, job=job_payload(job), worker_active=active)
+
+
+def _department_job(job_id):
+    from .models import ReportJob
+    job = db.session.get(ReportJob, job_id)
+    if job is None or job.department != current_user.department:
+        abort(404)
+    return job
+
+
+@api_bp.route("/jobs/<int:job_id>", methods=["GET"])
+@login_required
+def api_job_status(job_id):
+    from .jobs import job_payload
+    return jsonify(success=True, job=job_payload(_department_job(job_id)))
+
+
+@api_bp.route("/jobs/<int:job_id>/download", methods=["GET"])
+@login_required
+def api_job_download(job_id):
+    job = _department_job(job_id)
+    if job.status != "done":
+        return jsonify(success=False, message="Report is not ready yet."), 409
+    return Response(job.result, mimetype=job.mimetype,
+                    headers={"Content-Disposition": f"attachment;filename={job.filename}"})
+
+
+# ---------------------------------------------------------------------------
+# Attachments (see attachments.py)
+
+def _check_record_visible(record_id, archived=True):
+    """404 unless the user can see record ``record_id``; archived records only with ``archived``."""
+    from .archive import visible_archived_documents
+    from .routes import visible_documents
+    if visible_documents(current_user.department).filter(Record.id == record_id).first():
+        return
+    if archived and visible_archived_documents(current_user.department).filter_by(id=record_id).first():
+        return
+    abort(404)
+
+
+def _visible_attachment(attachment_id):
+    from .models import Attachment
+    attachment = db.session.get(Attachment, attachment_id) or abort(404)
+    _check_record_visible(attachment.record_id)
+    return attachment
+
+
+@api_bp.route("/documents/<int:record_id>/attachments", methods=["GET"])
+@login_required
+def api_attachments(record_id):
+    """A document's attachments (metadata only); document_detail loads this lazily."""
+    from .attachments import attachment_payload, record_attachments
+    _check_record_visible(record_id)
+    return jsonify(success=True,
+                   attachments=[attachment_payload(a) for a in record_attachments(record_id)])
+
+
+@api_bp.route("/documents/<int:record_id>/attachments", methods=["POST"])
+@login_required
+def api_attachment_upload_start(record_id):
+    """Start a chunked upload: {"filename", "size", "mimetype"}; PUT the chunks to upload_url."""
+    from .attachments import UploadError, chunk_bytes, start_upload
+    _check_record_visible(record_id, archived=False)
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = start_upload(record_id, data.get("filename"), data.get("size"),
+                              data.get("mimetype"), uploaded_by=current_user.full_name)
+    except UploadError as e:
+        return jsonify(success=False, message=str(e)), 400
+    return jsonify(success=True, upload_id=upload.id, offset=0, chunk_size=chunk_bytes(),
+                   upload_url=url_for("api.api_attachment_upload", upload_id=upload.id)), 201
+
+
+def _own_upload(upload_id):
+    from .models import AttachmentUpload
+    upload = db.session.get(AttachmentUpload, upload_id)
+    if upload is None or upload.uploaded_by != current_user.full_name:
+        abort(404)
+    return upload
+
+
+@api_bp.route("/attachments/uploads/<upload_id>", methods=["GET"])
+@login_required
+def api_attachment_upload_status(upload_id):
+    """Where an interrupted upload stands, to resume from ``offset``."""
+    upload = _own_upload(upload_id)
+    return jsonify(success=True, offset=upload.received, size=upload.size)
+
+
+@api_bp.route("/attachments/uploads/<upload_id>", methods=["PUT"])
+@login_required
+def api_attachment_upload(upload_id):
+    """
+    Append the request body at ``?offset=``. A wrong offset is answered 409
+    with the offset to continue from; the last chunk returns the attachment.
+    """
+    from .attachments import UploadError, attachment_payload, chunk_bytes, write_chunk
+    upload = _own_upload(upload_id)
+    offset = request.args.get("offset", type=int)
+    length = request.content_length
+    if offset is None or length is None:
+        return jsonify(success=False, message="offset and Content-Length are required."), 400
+    if length > chunk_bytes():
+        return jsonify(success=False, message=f"Chunks are limited to {chunk_bytes()} bytes."), 413
+    try:
+        attachment = write_chunk(upload, offset, request.stream, length)
+    except UploadError as e:
+        return jsonify(success=False, message=str(e), offset=e.offset), \
+            409 if e.offset is not None else 400
+    if attachment is None:
+        return jsonify(success=True, offset=upload.received)
+    return jsonify(success=True, offset=attachment.size, attachment=attachment_payload(attachment)), 201
+
+
+def _untrusted_file(response):
+    """Headers for user-uploaded content: no sniffing, no script, no same-origin access."""
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    response.headers["Content-Security-Policy"] = "sandbox"
+    return response
+
+
+@api_bp.route("/attachments/<int:attachment_id>/download", methods=["GET"])
+@login_required
+def api_attachment_download(attachment_id):
+    """
+    The file, streamed from disk with ETag and Range support. ``?inline=1``
+    shows it in the browser if it is a raster image or a PDF; anything else
+    is always a download.
+    """
+    from .attachments import INLINE_MIMETYPES, blob_path
+    attachment = _visible_attachment(attachment_id)
+    inline = bool(request.args.get("inline")) and attachment.mimetype in INLINE_MIMETYPES
+    return _untrusted_file(send_file(
+        blob_path(attachment.sha256),
+        mimetype=attachment.mimetype if inline else "application/octet-stream",
+        as_attachment=not inline, download_name=attachment.filename,
+        etag=attachment.sha256, conditional=True))
+
+
+@api_bp.route("/attachments/<int:attachment_id>/<any(thumbnail, preview):kind>", methods=["GET"])
+@login_required
+def api_attachment_preview(attachment_id, kind):
+    from .attachments import preview_path
+    attachment = _visible_attachment(attachment_id)
+    if attachment.preview_status != "done":
+        abort(404)
+    return _untrusted_file(send_file(preview_path(attachment.sha256, kind), mimetype="image/png",
+                                     etag=f"{attachment.sha256}-{kind}", conditional=True))
+
+
+@api_bp.route("/attachments/<int:attachment_id>", methods=["DELETE"])
+@login_required
+def api_attachment_delete(attachment_id):
+    """Remove an attachment (admins); its file goes with `flask prune-attachments`."""
+    if current_user.role != "admin":
+        return jsonify(success=False, message="You are not authorized to remove attachments."), 403
+    attachment = _visible_attachment(attachment_id)
+    db.session.delete(attachment)
+    db.session.commit()
+    return jsonify(success=True, message="Attachment removed.")
@@ -0,0 +1,138 @@
+"""
+Default reference data: one admin per office, departments, document types and
+the document status workflow, seeded per tenant.
+
+Seeding runs from ``create_app`` unless ``SEED_ON_STARTUP`` is off, and on
+demand with ``flask seed``. Each table is read once and only missing rows are
+added, in a single commit, so a boot against an already seeded database costs
+a handful of queries.
+"""
+from sqlalchemy import text
+
+from .models import db, User, Department, DocumentStatus, DocumentType, Tenant
+from .references import reference_cache
+from .tenancy import DEFAULT_TENANT_ID, current_tenant_id
+
+DEFAULT_TENANT_NAME = "Municipality of Unisan"
+
+# Department name -> office code used as the document ID prefix.
+DEPARTMENTS = {
+    "ABC Office": "ABC",
+    "Accounting Office": "ACCT",
+    "Agriculture Office": "AGRI",
+    "Assessors Office": "ASSR",
+    "Bids and Awards Committee": "BAC",
+    "COMELEC Office": "COMELEC",
+    "Engineering": "ENG",
+    "Human Resources Office": "HRO",
+    "Library Office": "LIB",
+    "Mayor Office": "MO",
+    "MENRO Office": "MENRO",
+    "MDRRMO Office": "MDRRMO",
+    "MPDC Office": "MPDC",
+    "Municipal Health Office": "MHO",
+    "Treasurer Office": "TO",
+    "Vice Mayor Office": "VMO",
+}
+
+DOCUMENT_TYPES = [
+    "SVP",
+    "Bidding",
+    "Reimbursement of Diesel",
+    "Reimbursement of Tarpaulin",
+    "Burial Assistance",
+    "T.E.V"
+]
+
+DOCUMENT_STATUSES = [
+    "For Signature Mayor",
+    "Request for PR",
+    "Request for PO",
+    "Request for OBR",
+    "For Signature BAC Members - BAC Office",
+    "For Accounting Staff Validation",
+    "For Processing",
+    "With Checked",
+    "Closed"
+]
+
+# Statuses the application sets itself; not part of the workflow order.
+SYSTEM_STATUSES = [
+    "Assigned",
+    "With Checked and Closed",
+]
+
+
+def admin_email(department, tenant=None):
+    """Seeded admin login; e-mails are unique across tenants, so others get a subdomain."""
+    domain = "site.com" if tenant is None or tenant.id == DEFAULT_TENANT_ID \
+        else f"{tenant.slug}.site.com"
+    return f"{department.lower().replace(' ', '')}@{domain}"
+
+
+def ensure_default_tenant():
+    """The tenant that existing single-municipality data belongs to; created if missing."""
+    tenant = db.session.get(Tenant, DEFAULT_TENANT_ID)
+    if tenant is None:
+        tenant = Tenant(id=DEFAULT_TENANT_ID, slug="default", name=DEFAULT_TENANT_NAME)
+        db.session.add(tenant)
+        db.session.flush()
+        if db.session.get_bind(Tenant).dialect.name == "postgresql":
+            # The id was given explicitly; move the serial past it.
+            db.session.execute(text("SELECT setval(pg_get_serial_sequence('tenants', 'id'), "
+                                    "(SELECT max(id) FROM tenants))"))
+        db.session.commit()
+    return tenant
+
+
+def seed_reference_data():
+    """
+    Create any missing default rows for the current tenant (see
+    ``tenancy.tenant_scope``). Returns the number of rows added.
+    """
+    added = 0
+    tenant = db.session.get(Tenant, current_tenant_id())
+
+    existing_emails = {email for (email,) in db.session.query(User.email)}
+    for dept in DEPARTMENTS:
+        if admin_email(dept, tenant) not in existing_emails:
+            admin = User(
+                full_name=f"{dept} Admin",
+                email=admin_email(dept, tenant),
+                role="admin",
+                department=dept
+            )
+            admin.set_password("123")  # default password
+            db.session.add(admin)
+            added += 1
+
+    existing_depts = {d.name: d for d in Department.query.all()}
+    for name, code in DEPARTMENTS.items():
+        dept = existing_depts.get(name)
+        if dept is None:
+            db.session.add(Department(name=name, code=code))
+            added += 1
+        elif not dept.code:
+            dept.code = code
+
+    existing_types = {name for (name,) in db.session.query(DocumentType.name)}
+    for name in DOCUMENT_TYPES:
+        if name not in existing_types:
+            db.session.add(DocumentType(name=name))
+            added += 1
+
+    # Statuses are added in workflow order; get_next_status relies on their ids.
+    existing_statuses = {name for (name,) in db.session.query(DocumentStatus.name)}
+    for name in DOCUMENT_STATUSES:
+        if name not in existing_statuses:
+            db.session.add(DocumentStatus(name=name))
+            added += 1
+    for name in SYSTEM_STATUSES:
+        if name not in existing_statuses:
+            db.session.add(DocumentStatus(name=name, is_system=True))
+            added += 1
+
+    db.session.commit()
+    if added:
+        reference_cache().clear()
+    return added
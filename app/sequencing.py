@@ -0,0 +1,69 @@
+"""
+Commit-ordered numbers for tables read incrementally.
+
+An auto-increment id is handed out at INSERT but only becomes visible at
+COMMIT, so a reader remembering "the highest id I have seen" skips any row
+whose transaction commits after a higher id was read. Tables read that way
+carry a nullable ``change_seq`` column instead, which writers leave NULL.
+``sequence_rows`` numbers the committed NULL rows in id order while holding
+the table's counter row in ``change_sequences``. A row still uncommitted at
+that point is invisible, and gets a higher number on a later call. So
+``change_seq > cursor`` never misses a row, whatever the commit order, and
+Core bulk inserts need no hook. Used by the change feed (``record_history``)
+and the in-process duplicate index (``record_signatures``).
+
+Readers call ``sequence_rows`` before reading; it costs one indexed lookup
+when every row is numbered already.
+"""
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, ChangeSequence
+
+# Rows numbered per statement batch.
+SEQUENCE_BATCH_SIZE = 5000
+
+
+def _take(name, count):
+    """Reserve ``count`` numbers from counter ``name``; returns the last number before them."""
+    table = ChangeSequence.__table__
+    bump = (update(table).where(table.c.name == name)
+            .values(last_value=table.c.last_value + count).returning(table.c.last_value))
+    last = db.session.execute(bump).scalar()
+    if last is None:
+        # First use of this counter; another request may race us.
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(table).values(name=name, last_value=count))
+            last = count
+        except IntegrityError:
+            last = db.session.execute(bump).scalar()
+    return last - count
+
+
+def sequence_rows(table):
+    """
+    Give the committed rows of ``table`` (a Core table with a single-column
+    primary key and ``change_seq``) that have no number yet the next ones, in
+    key order, and commit. Returns how many were numbered.
+    """
+    key = list(table.primary_key.columns)[0]
+    unsequenced = select(key).where(table.c.change_seq.is_(None))
+    if db.session.execute(unsequenced.limit(1)).first() is None:
+        return 0
+    # Lock the counter first, so two readers number disjoint rows in order.
+    _take(table.name, 0)
+    numbered = 0
+    while True:
+        ids = db.session.scalars(unsequenced.order_by(key).limit(SEQUENCE_BATCH_SIZE)).all()
+        if not ids:
+            break
+        first = _take(table.name, len(ids)) + 1
+        db.session.execute(
+            update(table).where(key == bindparam("row_id"))
+            .values(change_seq=bindparam("seq")),
+            [{"row_id": row_id, "seq": first + n} for n, row_id in enumerate(ids)],
+        )
+        numbered += len(ids)
+    db.session.commit()
+    return numbered
@@ -0,0 +1,108 @@
+"""
+Fast JSON encoding and response compression for the API.
+
+Uses ``orjson`` when it is installed and the standard library otherwise.
+Rows are passed to the encoder as-is, so dates and datetimes are encoded by
+the encoder instead of one ``isoformat()`` call per field in Python.
+Responses are compressed with brotli (if installed) or gzip when the client
+accepts it.
+"""
+import gzip
+import json
+import zlib
+
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+# Bodies smaller than this are not worth compressing.
+MIN_COMPRESS_SIZE = 1024
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/csv"}
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def _default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype="application/json")
+
+
+def accepted_encoding(request):
+    """Best supported Content-Encoding the client accepts, or None."""
+    accept = request.accept_encodings
+    if brotli is not None and accept["br"]:
+        return "br"
+    if accept["gzip"]:
+        return "gzip"
+    return None
+
+
+def ndjson_response(rows, encoding=None):
+    """
+    Stream one JSON document per line. With ``encoding`` the stream is
+    compressed incrementally, so large result sets never sit in memory whole.
+    """
+    def generate():
+        if encoding == "br":
+            compressor = brotli.Compressor()
+            compress, flush = compressor.process, compressor.finish
+        elif encoding == "gzip":
+            compressor = zlib.compressobj(wbits=31)
+            compress, flush = compressor.compress, compressor.flush
+        else:
+            compress = flush = None
+        for row in rows:
+            line = dumps(row) + b"\n"
+            chunk = compress(line) if compress else line
+            if chunk:
+                yield chunk
+        if flush:
+            yield flush()
+
+    response = Response(generate(), mimetype=NDJSON_MIMETYPE)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def compress_response(response, request):
+    """Compress a buffered response in place when worthwhile and accepted."""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code != 200
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or "Content-Encoding" in response.headers):
+        return response
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    encoding = accepted_encoding(request)
+    if encoding is None or len(body) < MIN_COMPRESS_SIZE:
+        return response
+    if encoding == "br":
+        response.set_data(brotli.compress(body))
+    else:
+        response.set_data(gzip.compress(body, compresslevel=6))
+    response.headers["Content-Encoding"] = encoding
+    # Same entity, different bytes: keep the ETag but mark it weak.
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
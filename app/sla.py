@@ -0,0 +1,195 @@
+"""
+SLA deadlines and escalation.
+
+A document's deadline (``Record.due_at``) is its intake time plus the
+``sla_hours`` of its document type, set at intake and whenever the type or
+its SLA changes. Types without an SLA give no deadline.
+
+Open documents past their deadline are escalated: flagged with
+``escalated_at`` and raised to Urgent, which moves them to the front of the
+work queues. ``EscalationScheduler`` does this in-process every
+``SLA_ESCALATION_SECONDS``. Each tick only walks the deadlines that passed
+since the previous one, through ``ix_records_due_at``; the first tick after
+start-up catches up on everything already due. Code that moves a deadline
+into the past (a shorter SLA, a different type) escalates on the spot, so
+the scheduler never needs to look back. ``flask escalate-overdue`` runs a
+full pass once.
+
+Escalation is a conditional UPDATE (``escalated_at IS NULL``), so several
+processes running the scheduler at once do not escalate a document twice.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, bindparam, or_, select, update
+
+from .models import db, DocumentType, Record, Tenant, COMPLETED_STATUSES, PRIORITY_RANKS
+
+log = logging.getLogger(__name__)
+
+# Records read or updated per statement.
+ESCALATION_BATCH_SIZE = 500
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def sla_hours():
+    """{doc_type_id: sla_hours} of the types that have an SLA."""
+    return dict(db.session.execute(
+        select(DocumentType.id, DocumentType.sla_hours).where(DocumentType.sla_hours.isnot(None))
+    ).all())
+
+
+def due_at(created_at, hours):
+    if not hours or created_at is None:
+        return None
+    return created_at.replace(tzinfo=None) + timedelta(hours=hours)
+
+
+def apply_sla(record, hours=None, now=None):
+    """
+    Set the deadline of an ORM ``record`` from its type (or ``hours``) and
+    escalate it right away if that deadline has already passed.
+    """
+    if hours is None:
+        hours = db.session.scalar(select(DocumentType.sla_hours)
+                                  .where(DocumentType.id == record.doc_type_id))
+    now = now or _utcnow()
+    record.due_at = due_at(record.created_at or now, hours)
+    if (record.due_at is not None and record.due_at <= now and record.escalated_at is None
+            and record.status not in COMPLETED_STATUSES):
+        record.escalated_at = now
+        record.priority = "Urgent"
+
+
+def escalate(record_ids, now=None):
+    """Escalate the open, not yet escalated records among ``record_ids``. Returns how many."""
+    if not record_ids:
+        return 0
+    now = now or _utcnow()
+    records = Record.__table__
+    result = db.session.execute(
+        update(records)
+        .where(records.c.id.in_(list(record_ids)), records.c.escalated_at.is_(None))
+        .values(escalated_at=now, priority="Urgent", priority_rank=PRIORITY_RANKS["Urgent"],
+                updated_at=now, version=records.c.version + 1)
+    )
+    return result.rowcount
+
+
+def escalate_overdue(since=None, now=None, batch_size=ESCALATION_BATCH_SIZE):
+    """
+    Escalate open records whose deadline is after ``since`` (None = any) and
+    not after ``now``. Returns ``(escalated, now)``; pass ``now`` back as
+    ``since`` next time.
+    """
+    now = now or _utcnow()
+    escalated, after = 0, None
+    while True:
+        query = (select(Record.id, Record.due_at)
+                 .where(Record.due_at <= now, Record.escalated_at.is_(None),
+                        Record.status.notin_(list(COMPLETED_STATUSES)))
+                 .order_by(Record.due_at, Record.id)
+                 .limit(batch_size))
+        if since is not None:
+            query = query.where(Record.due_at > since)
+        if after is not None:
+            query = query.where(or_(Record.due_at > after[0],
+                                    and_(Record.due_at == after[0], Record.id > after[1])))
+        rows = db.session.execute(query).all()
+        if not rows:
+            break
+        after = rows[-1]
+        escalated += escalate([r.id for r in rows], now)
+        db.session.commit()
+    db.session.rollback()
+    return escalated, now
+
+
+def recompute_due_dates(doc_type, batch_size=ESCALATION_BATCH_SIZE):
+    """
+    Re-derive the deadlines of the open records of ``doc_type`` after its
+    SLA changed, escalating those now overdue. Returns the number updated.
+    """
+    now = _utcnow()
+    records = Record.__table__
+    write = update(records).where(records.c.id == bindparam("record")).values(
+        due_at=bindparam("due"), updated_at=now, version=records.c.version + 1)
+    updated, last_id = 0, 0
+    while True:
+        rows = db.session.execute(
+            select(Record.id, Record.created_at)
+            .where(Record.doc_type_id == doc_type.id, Record.id > last_id,
+                   Record.status.notin_(list(COMPLETED_STATUSES)))
+            .order_by(Record.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        dues = {r.id: due_at(r.created_at, doc_type.sla_hours) for r in rows}
+        db.session.execute(write, [{"record": i, "due": d} for i, d in dues.items()])
+        escalate([i for i, d in dues.items() if d is not None and d <= now], now)
+        db.session.commit()
+        updated += len(rows)
+    return updated
+
+
+class EscalationScheduler:
+    """Background thread running ``escalate_overdue`` for every tenant on an interval."""
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._checked = {}  # tenant id -> deadlines escalated up to here
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sla-escalation",
+                                                daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        """One tick over every tenant; returns the number of records escalated."""
+        from .tenancy import tenant_scope
+        escalated = 0
+        with self.app.app_context():
+            try:
+                for tenant in Tenant.query.order_by(Tenant.id).all():
+                    with tenant_scope(tenant, self.app):
+                        count, self._checked[tenant.id] = escalate_overdue(
+                            since=self._checked.get(tenant.id))
+                        escalated += count
+            finally:
+                db.session.remove()
+        return escalated
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                escalated = self.run_once()
+                if escalated:
+                    log.info("Escalated %d overdue document(s).", escalated)
+            except Exception:
+                log.exception("SLA escalation pass failed.")
+
+
+def init_sla(app):
+    """Start the escalation scheduler with the first request (so not for CLI commands)."""
+    interval = app.config.get("SLA_ESCALATION_SECONDS") or 0
+    if interval <= 0:
+        return
+    scheduler = app.extensions["sla_scheduler"] = EscalationScheduler(app, interval)
+
+    @app.before_request
+    def _start_scheduler():
+        scheduler.start()
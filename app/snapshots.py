@@ -0,0 +1,248 @@
+"""
+Point-in-time document state: where a document was, and with what status,
+at a given moment.
+
+``record_history`` is the event log; a record's state at time T is every
+event up to T folded together (``_apply``). Replaying a long chain from the
+start gets slow, so ``take_snapshots`` (``flask snapshot-records``, run from
+cron like ``archive-records``) stores the folded state every
+``SNAPSHOT_INTERVAL`` events in ``record_snapshots``. A replay starts from
+the newest snapshot at or before T and folds only the events after it, so
+it costs at most ``SNAPSHOT_INTERVAL`` events per record, plus whatever
+arrived since the last snapshot run.
+
+Archived records have no snapshots; their (finished) chains are replayed
+from ``archived_record_history``.
+
+    states = record_states([42], as_of=parse_as_of("2026-03-01"))
+"""
+from collections import namedtuple
+from datetime import datetime, time, timezone
+
+from sqlalchemy import and_, func, insert, or_, select
+
+from .models import (db, Department, DocumentStatus, Record, RecordHistory, RecordSnapshot,
+                     ArchivedRecordHistory)
+from .references import reference_cache
+
+# Events folded between two snapshots of the same record.
+SNAPSHOT_INTERVAL = 50
+# Records per query while replaying or snapshotting.
+REPLAY_BATCH_SIZE = 500
+
+RecordState = namedtuple(
+    "RecordState",
+    "record_id department status pending_department last_action last_event_at history_id events",
+)
+
+
+def parse_as_of(value):
+    """
+    ``?as_of=`` value -> naive UTC datetime, like the stored timestamps.
+    A bare date means the end of that day. Raises ValueError.
+    """
+    value = (value or "").strip()
+    moment = datetime.fromisoformat(value)
+    if len(value) == 10:
+        moment = datetime.combine(moment.date(), time.max)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _apply(state, event):
+    """Fold one history event into ``state``."""
+    department, pending = state.department, state.pending_department
+    action = event.action_type
+    if action in ("create", "received"):
+        department, pending = event.to_department, None
+    elif action == "transfer":
+        pending = event.to_department
+    elif action == "rejected_transfer":
+        pending = None
+    return state._replace(
+        department=department,
+        status=event.status if event.status is not None else state.status,
+        pending_department=pending,
+        last_action=action,
+        last_event_at=event.timestamp,
+        history_id=event.id,
+        events=state.events + 1,
+    )
+
+
+def _empty(record_id):
+    return RecordState(record_id, None, None, None, None, None, None, 0)
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), REPLAY_BATCH_SIZE):
+        yield ids[start:start + REPLAY_BATCH_SIZE]
+
+
+def _latest_snapshots(record_ids, as_of):
+    """Subquery: the newest snapshot at or before ``as_of`` of each record."""
+    ranked = select(
+        RecordSnapshot.id,
+        func.row_number().over(
+            partition_by=RecordSnapshot.record_id,
+            order_by=(RecordSnapshot.taken_at.desc(), RecordSnapshot.history_id.desc()),
+        ).label("rank"),
+    ).where(RecordSnapshot.record_id.in_(record_ids))
+    if as_of is not None:
+        ranked = ranked.where(RecordSnapshot.taken_at <= as_of)
+    ranked = ranked.subquery()
+    return (select(RecordSnapshot.record_id, RecordSnapshot.history_id, RecordSnapshot.taken_at,
+                   RecordSnapshot.events, RecordSnapshot.department_id, RecordSnapshot.status_id,
+                   RecordSnapshot.pending_department_id, RecordSnapshot.last_action)
+            .join(ranked, ranked.c.id == RecordSnapshot.id)
+            .where(ranked.c.rank == 1)
+            .subquery())
+
+
+def _from_snapshot(row):
+    return RecordState(row.record_id, row.department_id, row.status_id,
+                       row.pending_department_id, row.last_action, row.taken_at,
+                       row.history_id, row.events)
+
+
+def _events_after(snap, record_ids, as_of):
+    """
+    Statements for the history of ``record_ids`` after their snapshot in
+    ``snap``: one for records with a snapshot (an index range from the
+    snapshot onwards), one for those without. Each yields events in replay order.
+    """
+    columns = (RecordHistory.id, RecordHistory.record_id, RecordHistory.tenant_id,
+               RecordHistory.action_type, RecordHistory.timestamp,
+               RecordHistory.status_id.label("status"),
+               RecordHistory.to_department_id.label("to_department"))
+    order = (RecordHistory.record_id, RecordHistory.timestamp, RecordHistory.id)
+    after_snapshot = (
+        select(*columns)
+        .join(snap, and_(snap.c.record_id == RecordHistory.record_id,
+                         RecordHistory.timestamp >= snap.c.taken_at))
+        .where(or_(RecordHistory.timestamp > snap.c.taken_at,
+                   RecordHistory.id > snap.c.history_id))
+        .order_by(*order)
+    )
+    from_start = (
+        select(*columns)
+        .where(RecordHistory.record_id.in_(record_ids),
+               RecordHistory.record_id.not_in(select(snap.c.record_id)))
+        .order_by(*order)
+    )
+    if as_of is not None:
+        after_snapshot = after_snapshot.where(RecordHistory.timestamp <= as_of)
+        from_start = from_start.where(RecordHistory.timestamp <= as_of)
+    return after_snapshot, from_start
+
+
+def _replay_ids(record_ids, as_of):
+    """
+    {record_id: RecordState} with department/status as ids, for live records
+    that had at least one event by ``as_of`` (None = now).
+    """
+    states = {}
+    for chunk in _chunks(record_ids):
+        snap = _latest_snapshots(chunk, as_of)
+        for row in db.session.execute(select(snap)):
+            states[row.record_id] = _from_snapshot(row)
+
+        for statement in _events_after(snap, chunk, as_of):
+            for event in db.session.execute(statement):
+                state = states.get(event.record_id) or _empty(event.record_id)
+                states[event.record_id] = _apply(state, event)
+    return states
+
+
+def _named(state):
+    cache = reference_cache()
+    return state._replace(
+        department=cache.name(Department, state.department),
+        status=cache.name(DocumentStatus, state.status),
+        pending_department=cache.name(Department, state.pending_department),
+    )
+
+
+def record_states(record_ids, as_of=None):
+    """{record_id: RecordState} as of ``as_of`` for live records; absent if not created yet."""
+    return {rid: _named(state) for rid, state in _replay_ids(record_ids, as_of).items()}
+
+
+def archived_record_states(record_ids, as_of=None):
+    """``record_states`` for archived records, replayed from their full history."""
+    states = {}
+    for chunk in _chunks(record_ids):
+        events = (select(ArchivedRecordHistory.id, ArchivedRecordHistory.record_id,
+                         ArchivedRecordHistory.action_type, ArchivedRecordHistory.timestamp,
+                         ArchivedRecordHistory.status, ArchivedRecordHistory.to_department)
+                  .where(ArchivedRecordHistory.record_id.in_(chunk))
+                  .order_by(ArchivedRecordHistory.record_id, ArchivedRecordHistory.timestamp,
+                            ArchivedRecordHistory.id))
+        if as_of is not None:
+            events = events.where(ArchivedRecordHistory.timestamp <= as_of)
+        for event in db.session.execute(events):
+            state = states.get(event.record_id) or _empty(event.record_id)
+            states[event.record_id] = _apply(state, event)
+    return states
+
+
+def department_states(department, as_of=None):
+    """
+    States of the records held by ``department`` as of ``as_of``, live and
+    archived, oldest arrival first. A record can only be there if one of its
+    events up to then moved it there, which bounds the records replayed.
+    """
+    def arrived(model):
+        query = select(model.record_id).where(model.to_department == department).distinct()
+        if as_of is not None:
+            query = query.where(model.timestamp <= as_of)
+        return db.session.scalars(query).all()
+
+    states = list(record_states(arrived(RecordHistory), as_of).values())
+    states += archived_record_states(arrived(ArchivedRecordHistory), as_of).values()
+    return sorted((s for s in states if s.department == department),
+                  key=lambda s: (s.last_event_at or datetime.min, s.record_id))
+
+
+def take_snapshots(interval=SNAPSHOT_INTERVAL, batch_size=REPLAY_BATCH_SIZE):
+    """
+    Store a snapshot every ``interval`` events for every record whose chain
+    grew past its last snapshot by that much. Returns the number written.
+    """
+    written = 0
+    last_id = 0
+    while True:
+        ids = db.session.scalars(
+            select(Record.id).where(Record.id > last_id).order_by(Record.id).limit(batch_size)
+        ).all()
+        if not ids:
+            break
+        last_id = ids[-1]
+        snap = _latest_snapshots(ids, None)
+        base = {row.record_id: row for row in db.session.execute(select(snap))}
+        rows, states, since = [], {}, {}
+        events = (event for statement in _events_after(snap, ids, None)
+                  for event in db.session.execute(statement))
+        for event in events:
+            state = states.get(event.record_id)
+            if state is None:
+                row = base.get(event.record_id)
+                state = _empty(event.record_id) if row is None else _from_snapshot(row)
+            state = states[event.record_id] = _apply(state, event)
+            since[event.record_id] = since.get(event.record_id, 0) + 1
+            if since[event.record_id] == interval:
+                since[event.record_id] = 0
+                rows.append({
+                    "tenant_id": event.tenant_id, "record_id": state.record_id,
+                    "history_id": state.history_id, "taken_at": state.last_event_at,
+                    "events": state.events, "department_id": state.department,
+                    "status_id": state.status, "pending_department_id": state.pending_department,
+                    "last_action": state.last_action,
+                })
+        if rows:
+            db.session.execute(insert(RecordSnapshot.__table__), rows)
+        db.session.commit()
+        written += len(rows)
+    return written
@@ -0,0 +1,40 @@
+"""
+Connection tuning for single-node deployments running on SQLite.
+
+Every new SQLite connection gets the pragmas from ``SQLITE_PRAGMAS``: WAL
+lets readers keep going while one request writes, ``synchronous=NORMAL`` is
+safe under WAL and skips an fsync per commit, and ``busy_timeout`` makes a
+second writer (two offices transferring at once) wait for the lock instead
+of failing with "database is locked".
+
+The sqlite3 module's own transaction handling is kept on purpose: it only
+opens a transaction at the first write, so a request's reads never pin an
+old WAL snapshot that would make its later write fail immediately (instead
+of waiting) once another office has committed. PostgreSQL and other
+backends are left untouched.
+"""
+from sqlalchemy import event
+
+from .models import db
+
+
+def pragma_listener(pragmas):
+    """A "connect" event listener that applies ``pragmas`` to a new connection."""
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return on_connect
+
+
+def init_sqlite_tuning(app):
+    """Register the pragmas on every SQLite engine of ``app``."""
+    pragmas = app.config.get("SQLITE_PRAGMAS") or {}
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+                continue
+            event.listen(engine, "connect", pragma_listener(pragmas))
+            # Connections opened before this point (none normally) miss the pragmas.
+            engine.dispose()
@@ -0,0 +1,120 @@
+"""
+Template rendering speed-ups: an on-disk Jinja bytecode cache and
+``{% cache %}`` fragment caching.
+
+Fragments are cached in-process and keyed by whatever the template passes to
+the tag. Fragments built from the reference tables (departments, document
+types, statuses) include ``reference_version()`` in their key, which changes
+whenever a row is added to or removed from one of those tables, so every
+worker picks up office settings changes on its next render.
+
+    {% cache "department-options", reference_version() %}
+      {% for d in reference.departments %}...{% endfor %}
+    {% endcache %}
+"""
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from sqlalchemy import select
+
+from .models import db, Department, DocumentType, DocumentStatus
+from .references import reference_version
+from .tenancy import current_tenant_id
+
+# Maximum number of rendered fragments kept per worker.
+FRAGMENT_CACHE_SIZE = 512
+
+RefItem = namedtuple("RefItem", "id name")
+
+
+class FragmentCache:
+    """Small thread-safe LRU of rendered template fragments."""
+
+    def __init__(self, maxsize=FRAGMENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache key, *vary %}...{% endcache %}`` block tag."""
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_render", [nodes.List(args)]),
+                               [], [], body).set_lineno(lineno)
+
+    def _render(self, key_parts, caller):
+        # Tenants have their own reference data, so their fragments never mix.
+        key = (current_tenant_id(),) + tuple(str(part) for part in key_parts)
+        cache = self.environment.fragment_cache
+        rendered = cache.get(key)
+        if rendered is None:
+            rendered = caller()
+            cache.set(key, rendered)
+        return rendered
+
+
+class ReferenceData:
+    """Reference lists for templates, only queried when a template actually reads them."""
+
+    @property
+    def departments(self):
+        return [RefItem(*row) for row in db.session.execute(
+            select(Department.id, Department.name).order_by(Department.id))]
+
+    @property
+    def document_types(self):
+        return [RefItem(*row) for row in db.session.execute(
+            select(DocumentType.id, DocumentType.name).order_by(DocumentType.id))]
+
+    @property
+    def document_statuses(self):
+        return [RefItem(*row) for row in db.session.execute(
+            select(DocumentStatus.id, DocumentStatus.name)
+            .where(DocumentStatus.is_system.is_(False)).order_by(DocumentStatus.id))]
+
+
+def init_templating(app):
+    """Enable the bytecode cache and fragment caching. Call before the first render."""
+    cache_dir = app.config.get("JINJA_BYTECODE_CACHE_DIR") or \
+        os.path.join(app.instance_path, "jinja_cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    extensions = list(app.jinja_options.get("extensions", [])) + [FragmentCacheExtension]
+    app.jinja_options = {**app.jinja_options,
+                         "bytecode_cache": FileSystemBytecodeCache(cache_dir),
+                         "extensions": extensions}
+
+    @app.context_processor
+    def inject_reference_data():
+        return {"reference": ReferenceData(), "reference_version": reference_version}
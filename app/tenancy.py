@@ -0,0 +1,200 @@
+"""
+Multi-tenancy: one deployment serving several municipalities.
+
+Every tenant-owned table carries ``tenant_id`` (``TenantMixin``). The tenant
+of a request is picked from its host name (``Tenant.hostname``), falling back
+to the default tenant, and kept in a context variable for the rest of the
+request. While it is set:
+
+* every ORM SELECT, UPDATE and DELETE on a tenant-owned model, including the
+  async read path and the Flask-Login user lookup, is filtered to that
+  tenant by a ``do_orm_execute`` hook;
+* new rows get the tenant's id through the column default, which also covers
+  Core ``insert()`` executemany in the bulk endpoints;
+* if the tenant has its own ``database_uri`` the session talks to that
+  database instead of the shared one (see ``RoutingSession.get_bind``).
+
+With no tenant set (CLI commands, the job worker between jobs) nothing is
+filtered. The ``tenants`` registry and the ``report_jobs`` queue always live
+in the shared database.
+
+    with tenant_scope(tenant):
+        seed_reference_data()
+"""
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy.orm import Session, declared_attr, with_loader_criteria
+
+DEFAULT_TENANT_ID = 1
+# How long a resolved host -> tenant mapping is reused before re-reading ``tenants``.
+TENANT_CACHE_SECONDS = 60
+
+TenantContext = namedtuple("TenantContext", "id engine")
+
+_current_tenant = ContextVar("current_tenant", default=None)
+
+
+def current_tenant():
+    """The ``TenantContext`` of the running request/job, or None."""
+    return _current_tenant.get()
+
+
+def current_tenant_id():
+    """Tenant id for new rows: the current tenant, else the default one."""
+    ctx = _current_tenant.get()
+    return ctx.id if ctx is not None else DEFAULT_TENANT_ID
+
+
+class TenantMixin:
+    """Adds the ``tenant_id`` column and opts the model into automatic scoping."""
+
+    @declared_attr
+    def tenant_id(cls):
+        # No foreign key: tenants with their own database don't have the registry there.
+        return sa.Column(sa.Integer, nullable=False, index=True,
+                         default=current_tenant_id, server_default=str(DEFAULT_TENANT_ID))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _scope_to_tenant(execute_state):
+    ctx = _current_tenant.get()
+    if (ctx is None or execute_state.is_column_load or execute_state.is_relationship_load
+            or not (execute_state.is_select or execute_state.is_update or execute_state.is_delete)
+            or execute_state.execution_options.get("skip_tenant_filter", False)):
+        return
+    tenant_id = ctx.id
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(TenantMixin, lambda cls: cls.tenant_id == tenant_id,
+                             include_aliases=True)
+    )
+
+
+# ---------------------------------------------------------------------------
+# Tenant databases
+# ---------------------------------------------------------------------------
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def tenant_engine(app, database_uri):
+    """Shared engine for a dedicated tenant database, created on first use."""
+    with _engines_lock:
+        engine = _engines.get(database_uri)
+        if engine is None:
+            options = app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {}
+            engine = sa.create_engine(database_uri, pool_pre_ping=True, **options)
+            if engine.dialect.name == "sqlite" and app.config.get("SQLITE_PRAGMAS"):
+                from .sqlite_tuning import pragma_listener
+                event.listen(engine, "connect", pragma_listener(app.config["SQLITE_PRAGMAS"]))
+            _engines[database_uri] = engine
+        return engine
+
+
+def context_for(app, tenant):
+    engine = tenant_engine(app, tenant.database_uri) if tenant.database_uri else None
+    return TenantContext(tenant.id, engine)
+
+
+def dedicated_tenants():
+    """Tenants that have a database of their own."""
+    from .models import Tenant
+    return Tenant.query.filter(Tenant.database_uri.isnot(None)).all()
+
+
+@contextmanager
+def tenant_context(ctx):
+    """Make ``ctx`` (a ``TenantContext``) the current tenant for the block."""
+    token = _current_tenant.set(ctx)
+    try:
+        yield
+    finally:
+        _current_tenant.reset(token)
+
+
+def tenant_scope(tenant, app=None):
+    """Run a block as ``tenant`` (a ``Tenant`` row), e.g. in CLI commands and jobs."""
+    from flask import current_app
+    return tenant_context(context_for(app or current_app, tenant))
+
+
+def primary_engine():
+    """Engine that takes writes for the current tenant, bypassing read replicas."""
+    from .models import db
+    ctx = _current_tenant.get()
+    return ctx.engine if ctx is not None and ctx.engine is not None else db.engine
+
+
+# ---------------------------------------------------------------------------
+# Per-request resolution
+# ---------------------------------------------------------------------------
+
+class TenantDirectory:
+    """Host name -> tenant lookups, cached per worker for TENANT_CACHE_SECONDS."""
+
+    def __init__(self):
+        self._by_host = {}
+        self._default = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        from .models import db, Tenant
+        rows = db.session.execute(sa.select(Tenant)).scalars().all()
+        for tenant in rows:
+            db.session.expunge(tenant)
+        return rows
+
+    def lookup(self, host):
+        """(tenant for ``host``, default tenant); either may be None before seeding."""
+        now = time.monotonic()
+        with self._lock:
+            stale = now - self._loaded_at > TENANT_CACHE_SECONDS
+        if stale:
+            tenants = self._load()
+            with self._lock:
+                self._by_host = {t.hostname.lower(): t for t in tenants if t.hostname}
+                self._default = next((t for t in tenants if t.id == DEFAULT_TENANT_ID), None)
+                self._loaded_at = now
+        host = (host or "").split(":", 1)[0].lower()
+        with self._lock:
+            return self._by_host.get(host), self._default
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = 0.0
+
+
+directory = TenantDirectory()
+
+
+def resolve_tenant(host):
+    tenant, default = directory.lookup(host)
+    return tenant or default
+
+
+def init_tenancy(app):
+    from flask import g, request
+
+    @app.before_request
+    def set_request_tenant():
+        tenant = resolve_tenant(request.host)
+        g.tenant = tenant
+        if tenant is not None:
+            g.tenant_token = _current_tenant.set(context_for(app, tenant))
+
+    @app.teardown_request
+    def clear_request_tenant(exc=None):
+        token = g.pop("tenant_token", None)
+        if token is not None:
+            _current_tenant.reset(token)
+
+    @app.context_processor
+    def inject_tenant():
+        return {"tenant": g.get("tenant")}
@@ -0,0 +1,135 @@
+"""
+Open-assignment counters for the assign dialogs.
+
+``assignment_loads`` holds, per department and assignee, how many open
+documents the department has assigned to that person (``received_by`` set,
+status not completed). A ``before_flush`` hook keeps them in step: when a
+flush inserts or deletes a record, or changes its holder, assignee or
+status, the old (department, assignee) counter gets -1 and the new one +1,
+in the same transaction. Assigning, receiving, transferring, editing and
+closing therefore keep them right without the routes doing anything, and
+the dialogs read a few counter rows instead of counting ``records``.
+
+Core statements bypass the hook: ``purge_records`` releases what it deletes
+through ``release_records``, and ``flask recount-assignments`` rebuilds the
+counters from ``records`` should they ever drift.
+"""
+from collections import Counter
+
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import NO_VALUE
+
+from .models import db, AssignmentLoad, Department, DocumentStatus, Record, COMPLETED_STATUSES
+from .references import UnknownReference, reference_cache
+from .tenancy import current_tenant_id
+
+TRACKED = ("department_id", "received_by", "status_id")
+
+
+def _slot(tenant_id, department_id, assignee, status_id):
+    """The counter a record with these values counts towards; None if it counts nowhere."""
+    if not assignee or department_id is None or status_id is None:
+        return None
+    if reference_cache().name(DocumentStatus, status_id) in COMPLETED_STATUSES:
+        return None
+    return tenant_id or current_tenant_id(), department_id, assignee
+
+
+def _record_slot(record, before=False):
+    """The counter ``record`` counts towards now, or before its pending changes."""
+    committed = inspect(record).committed_state if before else {}
+    values = []
+    for key in TRACKED:
+        value = committed.get(key, getattr(record, key))
+        values.append(None if value is NO_VALUE else value)
+    return _slot(record.tenant_id, *values)
+
+
+@event.listens_for(Session, "before_flush")
+def _track_assignments(session, flush_context, instances):
+    deltas = Counter()
+    for record in session.new:
+        if isinstance(record, Record):
+            deltas[_record_slot(record)] += 1
+    for record in session.dirty:
+        if isinstance(record, Record) and session.is_modified(record):
+            deltas[_record_slot(record, before=True)] -= 1
+            deltas[_record_slot(record)] += 1
+    for record in session.deleted:
+        if isinstance(record, Record):
+            deltas[_record_slot(record, before=True)] -= 1
+    deltas.pop(None, None)
+    if any(deltas.values()):
+        adjust_loads(session.connection(bind_arguments={"mapper": inspect(AssignmentLoad)}),
+                     deltas)
+
+
+def adjust_loads(conn, deltas):
+    """Add ``deltas`` ({(tenant_id, department_id, assignee): n}) to the counters on ``conn``."""
+    table = AssignmentLoad.__table__
+    # A fixed order, so two transactions touching the same counters cannot deadlock.
+    for (tenant_id, department_id, assignee), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        bump = (update(table)
+                .where(table.c.tenant_id == tenant_id, table.c.department_id == department_id,
+                       table.c.assignee == assignee)
+                .values(open_count=table.c.open_count + delta))
+        if conn.execute(bump).rowcount:
+            continue
+        # First document for this person here; another request may race us.
+        try:
+            with conn.begin_nested():
+                conn.execute(insert(table).values(tenant_id=tenant_id, department_id=department_id,
+                                                  assignee=assignee, open_count=delta))
+        except IntegrityError:
+            conn.execute(bump)
+
+
+def _open_assignments():
+    """SELECT of (tenant_id, department_id, assignee, open count) over ``records``."""
+    return (select(Record.tenant_id, Record.department_id, Record.received_by,
+                   func.count(Record.id))
+            .where(Record.received_by != "", Record.status.notin_(list(COMPLETED_STATUSES)))
+            .group_by(Record.tenant_id, Record.department_id, Record.received_by))
+
+
+def release_records(record_ids):
+    """Take ``record_ids`` out of the counters before deleting them with a Core statement."""
+    rows = db.session.execute(_open_assignments().where(Record.id.in_(list(record_ids)))).all()
+    if rows:
+        adjust_loads(db.session.connection(bind_arguments={"mapper": inspect(AssignmentLoad)}),
+                     {(t, d, a): -n for t, d, a, n in rows})
+
+
+def recount_loads():
+    """Rebuild the current tenant's counters from ``records``. Returns how many were written."""
+    rows = db.session.execute(_open_assignments()).all()
+    db.session.execute(delete(AssignmentLoad))
+    if rows:
+        db.session.execute(insert(AssignmentLoad.__table__), [
+            {"tenant_id": t, "department_id": d, "assignee": a, "open_count": n}
+            for t, d, a, n in rows
+        ])
+    db.session.commit()
+    return len(rows)
+
+
+def department_loads(department):
+    """{assignee: open documents} assigned within ``department`` (a name)."""
+    try:
+        department_id = reference_cache().id_for(Department, department)
+    except UnknownReference:
+        return {}
+    rows = db.session.execute(
+        select(AssignmentLoad.assignee, AssignmentLoad.open_count)
+        .where(AssignmentLoad.department_id == department_id)
+    )
+    return {assignee: max(count, 0) for assignee, count in rows}
+
+
+def by_load(users, loads):
+    """``users`` least loaded first (then by name): the first is the one to suggest."""
+    return sorted(users, key=lambda u: (loads.get(u.full_name, 0), u.full_name))
@@ -0,0 +1,115 @@
+"""
+Intake duplicate check latency, LSH bucket lookup versus comparing the new
+document with every stored signature.
+
+Builds a throwaway SQLite database with ``--records`` documents whose titles
+are drawn from a small vocabulary (so many share words and buckets), indexes
+them with ``index_missing`` as ``flask scan-duplicates`` does, then times
+``find_duplicates`` for reworded copies of random documents against a full
+signature scan.
+
+    python benchmarks/duplicate_lookup.py --records 50000 --queries 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SUBJECTS = ["burial", "medical", "financial", "educational", "travel", "fuel", "repair",
+            "purchase", "payroll", "scholarship", "relief", "rental", "permit", "clearance"]
+OBJECTS = ["assistance", "request", "voucher", "order", "reimbursement", "certificate",
+           "endorsement", "liquidation", "allowance", "supplies"]
+NAMES = ["Juan Dela Cruz", "Maria Santos", "Pedro Reyes", "Ana Bautista", "Jose Garcia",
+         "Rosa Mendoza", "Carlo Ramos", "Liza Villanueva", "Mark Aquino", "Grace Torres"]
+
+
+def title(rng):
+    return (f"{rng.choice(SUBJECTS).title()} {rng.choice(OBJECTS)} for "
+            f"{rng.choice(NAMES)} {rng.randint(1, 999)}")
+
+
+def reworded(text, rng):
+    words = text.split()
+    words.remove("for")
+    rng.shuffle(words[:2])
+    return " - ".join([" ".join(words[:2]).lower(), " ".join(words[2:])])
+
+
+def populate(records, rng):
+    from sqlalchemy import insert, select
+    from app.models import db, Department, DocumentStatus, DocumentType, Record
+
+    dept = db.session.scalar(select(Department.id))
+    status = db.session.scalar(select(DocumentStatus.id))
+    doc_type = db.session.scalar(select(DocumentType.id))
+    now = datetime(2025, 1, 1)
+    titles = [title(rng) for _ in range(records)]
+    for start in range(0, records, 5000):
+        db.session.execute(insert(Record.__table__), [
+            {"document_id": f"BENCH-{n:07d}", "title": titles[n], "doc_type_id": doc_type,
+             "department_id": dept, "implementing_office_id": dept, "date_received": now.date(),
+             "released_by": "bench", "received_by": "", "status_id": status,
+             "priority": "Normal", "version": 1, "created_at": now, "updated_at": now}
+            for n in range(start, min(start + 5000, records))
+        ])
+    db.session.commit()
+    return titles
+
+
+def measure(label, fn, items):
+    timings = []
+    for item in items:
+        began = time.perf_counter()
+        fn(item)
+        timings.append((time.perf_counter() - began) * 1000)
+    print(f"{label:>24}: median {statistics.median(timings):8.3f} ms   "
+          f"p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes computing signatures (default: one per CPU).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ["JINJA_BYTECODE_CACHE_DIR"] = tmp
+        from app import create_app
+        from sqlalchemy import select
+        from app.duplicates import features, find_duplicates, index_missing, signature, similarity
+        from app.duplicates import DUPLICATE_THRESHOLD, _SIGNATURE
+        from app.models import db, RecordSignature
+
+        app = create_app()
+        with app.app_context():
+            rng = random.Random(7)
+            titles = populate(args.records, rng)
+            began = time.perf_counter()
+            indexed = index_missing(workers=args.workers)
+            print(f"{'index_missing':>24}: {indexed} record(s) in "
+                  f"{time.perf_counter() - began:.1f} s")
+            queries = [reworded(rng.choice(titles), rng) for _ in range(args.queries)]
+            found = sum(bool(find_duplicates(q)) for q in queries)
+            print(f"{'reworded copies found':>24}: {found} / {len(queries)}")
+            measure("find_duplicates", find_duplicates, queries)
+
+            def full_scan(text):
+                sig = signature(features(text))
+                rows = db.session.execute(select(RecordSignature.record_id, RecordSignature.signature))
+                return [(record_id, score) for record_id, packed in rows
+                        if (score := similarity(sig, _SIGNATURE.unpack(packed))) >= DUPLICATE_THRESHOLD]
+
+            measure("full signature scan", full_scan, queries[:50])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Point-in-time replay latency over long history chains, with and without
+record snapshots.
+
+Builds a throwaway SQLite database with ``--records`` documents, each with a
+``--chain``-event history bouncing between offices, then times
+``record_states`` for one record and ``department_states`` for one office at
+random points in time: first with no snapshots (full replay), then after
+``take_snapshots``.
+
+    python benchmarks/snapshot_replay.py --records 100 --chain 2000 --queries 30
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Events of one record alternate: transfer to an office, received there.
+OFFICES = ["Mayor Office", "Accounting Office", "Treasurer Office", "Engineering"]
+
+
+def populate(records, chain):
+    from sqlalchemy import insert, select
+    from app.models import db, Department, DocumentStatus, DocumentType, Record, RecordHistory
+
+    dept = dict(db.session.execute(select(Department.name, Department.id)).all())
+    status = dict(db.session.execute(select(DocumentStatus.name, DocumentStatus.id)).all())
+    doc_type = db.session.scalar(select(DocumentType.id))
+    start = datetime(2025, 1, 1)
+    for n in range(records):
+        record_id = db.session.execute(insert(Record.__table__).values(
+            document_id=f"BENCH-{n:06d}", title=f"Document {n}", doc_type_id=doc_type,
+            department_id=dept[OFFICES[0]], implementing_office_id=dept[OFFICES[0]],
+            date_received=start.date(), released_by="bench", received_by="bench",
+            status_id=status["Assigned"], priority="Normal", version=1,
+            created_at=start, updated_at=start,
+        )).inserted_primary_key[0]
+        rows, holder, moment = [], OFFICES[0], start
+        rows.append({"record_id": record_id, "action_type": "create", "status_id": status["Assigned"],
+                     "from_department_id": dept[holder], "to_department_id": dept[holder],
+                     "timestamp": moment})
+        for i in range(1, chain):
+            moment += timedelta(minutes=random.randint(1, 600))
+            if i % 2:
+                target = random.choice([o for o in OFFICES if o != holder])
+                rows.append({"record_id": record_id, "action_type": "transfer",
+                             "status_id": status["For Processing"],
+                             "from_department_id": dept[holder], "to_department_id": dept[target],
+                             "timestamp": moment})
+            else:
+                rows.append({"record_id": record_id, "action_type": "received",
+                             "status_id": status["Assigned"],
+                             "from_department_id": dept[holder], "to_department_id": dept[target],
+                             "timestamp": moment})
+                holder = target
+        db.session.execute(insert(RecordHistory.__table__), rows)
+    db.session.commit()
+    return start, moment
+
+
+def measure(label, fn, points):
+    timings = []
+    for point in points:
+        began = time.perf_counter()
+        fn(point)
+        timings.append((time.perf_counter() - began) * 1000)
+    print(f"{label:>34}: median {statistics.median(timings):8.2f} ms   "
+          f"p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--records", type=int, default=100)
+    parser.add_argument("--chain", type=int, default=2000, help="History events per record.")
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--interval", type=int, default=None,
+                        help="Snapshot interval (default: SNAPSHOT_INTERVAL).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ["JINJA_BYTECODE_CACHE_DIR"] = tmp
+        from app import create_app
+        from app.snapshots import SNAPSHOT_INTERVAL, department_states, record_states, take_snapshots
+
+        app = create_app()
+        with app.app_context():
+            random.seed(7)
+            first, last = populate(args.records, args.chain)
+            span = (last - first).total_seconds()
+            points = [first + timedelta(seconds=random.uniform(0, span)) for _ in range(args.queries)]
+            print(f"{args.records} record(s) x {args.chain} event(s), {args.queries} point(s) in time")
+
+            def one(point):
+                record_states([random.randint(1, args.records)], point)
+
+            def office(point):
+                department_states(OFFICES[1], point)
+
+            measure("record_states, no snapshots", one, points)
+            measure("department_states, no snapshots", office, points)
+            began = time.perf_counter()
+            written = take_snapshots(args.interval or SNAPSHOT_INTERVAL)
+            print(f"{'take_snapshots':>34}: {written} snapshot(s) in "
+                  f"{time.perf_counter() - began:.1f} s")
+            measure("record_states, snapshots", one, points)
+            measure("department_states, snapshots", office, points)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Concurrent read/write throughput on SQLite, with and without SQLITE_PRAGMAS.
+
+Writer threads replay what transfer_document/receive_document do (update a
+record, insert a history row, commit) while reader threads run the
+department list queries. Each profile runs against a fresh database file and
+reports operations per second and "database is locked" failures.
+
+    python benchmarks/sqlite_concurrency.py --writers 4 --readers 8 --seconds 10
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine, event, func, insert, select, update
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from app.models import db, Record, RecordHistory, Department, DocumentType, DocumentStatus  # noqa: E402
+from app.sqlite_tuning import pragma_listener  # noqa: E402
+
+DEPARTMENTS = ["Mayor Office", "Accounting Office", "Treasurer Office", "Engineering"]
+# Reference rows get ids in list order, starting at 1.
+DEPARTMENT_IDS = list(range(1, len(DEPARTMENTS) + 1))
+TABLES = [Department.__table__, DocumentType.__table__, DocumentStatus.__table__,
+          Record.__table__, RecordHistory.__table__]
+
+
+def make_engine(path, pragmas):
+    engine = create_engine(f"sqlite:///{path}", pool_size=32, max_overflow=0)
+    if pragmas:
+        event.listen(engine, "connect", pragma_listener(pragmas))
+    return engine
+
+
+def populate(engine, records):
+    db.metadata.create_all(engine, tables=TABLES)
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        conn.execute(insert(Department.__table__), [{"name": name} for name in DEPARTMENTS])
+        conn.execute(insert(DocumentType.__table__), [{"name": "SVP"}])
+        conn.execute(insert(DocumentStatus.__table__), [{"name": "For Processing"}])
+        conn.execute(insert(Record.__table__), [
+            {"document_id": f"BENCH-{i:06d}", "title": f"Document {i}", "doc_type_id": 1,
+             "department_id": random.choice(DEPARTMENT_IDS), "implementing_office_id": 1,
+             "date_received": now.date(), "released_by": "bench", "received_by": "bench",
+             "status_id": 1,
+             "priority": "Normal", "created_at": now, "updated_at": now, "version": 1}
+            for i in range(records)
+        ])
+
+
+def writer(engine, records, stop, stats):
+    while not stop.is_set():
+        record_id = random.randint(1, records)
+        to_dept = random.choice(DEPARTMENT_IDS)
+        now = datetime.now(timezone.utc)
+        try:
+            with engine.begin() as conn:
+                conn.execute(update(Record.__table__).where(Record.id == record_id)
+                             .values(department_id=to_dept, updated_at=now,
+                                     version=Record.version + 1))
+                conn.execute(insert(RecordHistory.__table__).values(
+                    record_id=record_id, action_type="transfer", from_department_id=1,
+                    to_department_id=to_dept, action_by="bench", status_id=1,
+                    timestamp=now))
+            stats["writes"] += 1
+        except OperationalError as exc:
+            if "locked" not in str(exc):
+                raise
+            stats["locked"] += 1
+
+
+def reader(engine, stop, stats):
+    while not stop.is_set():
+        dept = random.choice(DEPARTMENTS)
+        try:
+            with engine.connect() as conn:
+                conn.execute(select(func.count(Record.id)).where(Record.department == dept)).scalar()
+                conn.execute(select(Record.id, Record.title, Record.status)
+                             .where(Record.department == dept)
+                             .order_by(Record.updated_at.desc()).limit(50)).all()
+            stats["reads"] += 1
+        except OperationalError as exc:
+            if "locked" not in str(exc):
+                raise
+            stats["locked"] += 1
+
+
+def run_profile(name, pragmas, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(os.path.join(tmp, "bench.db"), pragmas)
+        populate(engine, args.records)
+        stop = threading.Event()
+        # Per-thread counters, summed afterwards, so threads never share a dict.
+        counters = [{"reads": 0, "writes": 0, "locked": 0}
+                    for _ in range(args.writers + args.readers)]
+        threads = [threading.Thread(target=writer, args=(engine, args.records, stop, counters[i]))
+                   for i in range(args.writers)]
+        threads += [threading.Thread(target=reader, args=(engine, stop, counters[args.writers + i]))
+                    for i in range(args.readers)]
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        engine.dispose()
+    totals = {key: sum(c[key] for c in counters) for key in ("reads", "writes", "locked")}
+    print(f"{name:>10}: {totals['reads'] / args.seconds:8.0f} reads/s "
+          f"{totals['writes'] / args.seconds:8.0f} writes/s "
+          f"{totals['locked']:6d} locked errors")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--records", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{args.writers} writer(s), {args.readers} reader(s), {args.seconds:g}s per profile")
+    run_profile("default", {}, args)
+    run_profile("tuned", Config.SQLITE_PRAGMAS, args)
+
+
+if __name__ == "__main__":
+    main()
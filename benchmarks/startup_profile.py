@@ -0,0 +1,95 @@
+"""
+Cold-start profile of the app factory.
+
+Runs ``create_app()`` in fresh interpreters under ``python -X importtime``,
+reports the median wall time of import + factory, and lists the modules with
+the largest cumulative import time. Exits non-zero when the median exceeds
+the budget, so it can gate CI or a deploy pipeline.
+
+    python benchmarks/startup_profile.py --runs 5 --budget-ms 750
+    DATABASE_URL=postgresql://... python benchmarks/startup_profile.py --seed
+
+Without DATABASE_URL a throwaway SQLite database is used. By default seeding
+is switched off (SEED_ON_STARTUP=0) to measure what a worker pays on boot
+against an already provisioned database; ``--seed`` includes it.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import time
+start = time.perf_counter()
+from app import create_app
+create_app()
+print("STARTUP_MS", (time.perf_counter() - start) * 1000)
+"""
+
+
+def run_once(env):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(proc.stderr)
+    wall_ms = next(float(line.split()[1]) for line in proc.stdout.splitlines()
+                   if line.startswith("STARTUP_MS"))
+    imports = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        try:
+            imports[name.strip()] = int(cumulative) / 1000.0
+        except ValueError:
+            continue  # header line
+    return wall_ms, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=750.0,
+                        help="Fail when the median cold start exceeds this.")
+    parser.add_argument("--top", type=int, default=15, help="Modules to list.")
+    parser.add_argument("--seed", action="store_true", help="Include startup seeding.")
+    args = parser.parse_args()
+
+    env = dict(os.environ, SEED_ON_STARTUP="1" if args.seed else "0")
+    tmpdir = tempfile.TemporaryDirectory()
+    if "DATABASE_URL" not in env:
+        env["DATABASE_URL"] = "sqlite:///" + os.path.join(tmpdir.name, "startup.db")
+        if not args.seed:
+            # Provision the database once so the measured runs find it ready.
+            subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, check=True,
+                           env=dict(env, SEED_ON_STARTUP="1"), capture_output=True)
+
+    timings, imports = [], {}
+    for _ in range(args.runs):
+        wall_ms, run_imports = run_once(env)
+        timings.append(wall_ms)
+        for name, ms in run_imports.items():
+            imports.setdefault(name, []).append(ms)
+    tmpdir.cleanup()
+
+    median = statistics.median(timings)
+    print(f"cold start: median {median:.0f} ms, min {min(timings):.0f} ms, "
+          f"max {max(timings):.0f} ms over {args.runs} run(s)")
+    print(f"\nslowest imports (cumulative, median ms):")
+    ranked = sorted(((statistics.median(v), k) for k, v in imports.items()), reverse=True)
+    for ms, name in ranked[:args.top]:
+        print(f"  {ms:8.1f}  {name}")
+
+    if median > args.budget_ms:
+        print(f"\nFAIL: {median:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        return 1
+    print(f"\nOK: within the {args.budget_ms:.0f} ms budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
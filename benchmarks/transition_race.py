@@ -0,0 +1,160 @@
+"""
+Concurrency stress test for the optimistic record version check.
+
+Builds a throwaway SQLite database, then for each of ``--rounds`` rounds
+starts ``--threads`` threads that transfer, receive or assign the same
+document through the Flask test client, each with its own login. A barrier
+in ``before_flush`` holds every request until all of them have loaded the
+document, so they all start from the same version. Each round must end
+with exactly one winner, every other request answered with
+``CONCURRENT_UPDATE_MESSAGE``, the version bumped once and one history row
+written.
+
+    python benchmarks/transition_race.py --threads 8 --rounds 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SENDER = "mayoroffice@site.com"
+RECEIVER = "accountingoffice@site.com"
+# Only the assigned staff may release a document: the sender's admin.
+SENDER_NAME, RECEIVER_OFFICE = "Mayor Office Admin", "Accounting Office"
+TRANSFER_TARGETS = ["Accounting Office", "Treasurer Office", "Engineering"]
+ACTIONS = ("transfer", "receive", "assign")
+
+
+class FlushBarrier:
+    """Makes the first flush of each request wait until ``parties`` requests got there."""
+
+    def __init__(self):
+        self.barrier = None
+        self.local = threading.local()
+
+    def arm(self, parties):
+        self.barrier = threading.Barrier(parties, timeout=10)
+
+    def __call__(self, session, flush_context, instances):
+        barrier = self.barrier
+        if barrier is None or getattr(self.local, "waited", None) is barrier:
+            return
+        self.local.waited = barrier
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            pass  # a request failed before flushing; let the rest go on
+
+
+def login(app, email):
+    client = app.test_client()
+    response = client.post("/auth/login", data={"email": email, "password": "123"})
+    assert response.status_code == 302, (email, response.status_code)
+    return client
+
+
+def new_document(client, n):
+    response = client.post("/add_document", data={"title": f"Race {n}", "doc_type": "SVP"})
+    assert response.status_code == 302, response.status_code
+    return int(response.headers["Location"].rstrip("/").split("/")[-1])
+
+
+def request_for(action, record_id, i):
+    if action == "transfer":
+        return SENDER, f"/documents/transfer/{record_id}", {
+            "to_department": TRANSFER_TARGETS[i % len(TRANSFER_TARGETS)]}
+    if action == "receive":
+        return RECEIVER, f"/documents/receive/{record_id}", None
+    return SENDER, f"/documents/assign/{record_id}", {"assigned_to": f"Staff {i}"}
+
+
+def run_round(app, clients, barrier, action, n):
+    from sqlalchemy import func, select
+    from app.models import db, Record, RecordHistory
+    from app.routes import CONCURRENT_UPDATE_MESSAGE
+
+    sender = clients[SENDER][0]
+    record_id = new_document(sender, n)
+    if action != "assign":
+        response = sender.post(f"/documents/assign/{record_id}", json={"assigned_to": SENDER_NAME})
+        assert response.json["success"], response.json
+    if action == "receive":
+        response = sender.post(f"/documents/transfer/{record_id}",
+                               json={"to_department": RECEIVER_OFFICE})
+        assert response.json["success"], response.json
+    with app.app_context():
+        version = db.session.get(Record, record_id).version
+        events = db.session.scalar(select(func.count(RecordHistory.id))
+                                   .where(RecordHistory.record_id == record_id))
+
+    threads = len(clients[SENDER])
+    results = [None] * threads
+
+    def worker(i):
+        email, url, body = request_for(action, record_id, i)
+        response = clients[email][i].post(url, json=body)
+        results[i] = response.json or {"success": False, "message": f"HTTP {response.status_code}"}
+
+    barrier.arm(threads)
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    barrier.barrier = None
+
+    winners = [r for r in results if r["success"]]
+    losers = [r for r in results if not r["success"]]
+    assert len(winners) == 1, (action, results)
+    assert all(r["message"] == CONCURRENT_UPDATE_MESSAGE for r in losers), (action, losers)
+    with app.app_context():
+        assert db.session.get(Record, record_id).version == version + 1, action
+        after = db.session.scalar(select(func.count(RecordHistory.id))
+                                  .where(RecordHistory.record_id == record_id))
+        assert after == events + 1, (action, events, after)
+    return len(losers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ["JINJA_BYTECODE_CACHE_DIR"] = tmp
+        os.environ["SLA_ESCALATION_SECONDS"] = "0"
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+        from app import create_app
+
+        app = create_app()
+        app.config["TESTING"] = True
+        barrier = FlushBarrier()
+        # Ahead of the app's own before_flush hooks, which already write.
+        event.listen(Session, "before_flush", barrier, insert=True)
+        clients = {email: [login(app, email) for _ in range(args.threads)]
+                   for email in (SENDER, RECEIVER)}
+
+        conflicts, began = Counter(), time.perf_counter()
+        for n in range(args.rounds):
+            action = ACTIONS[n % len(ACTIONS)]
+            conflicts[action] += run_round(app, clients, barrier, action, n)
+        elapsed = time.perf_counter() - began
+        event.remove(Session, "before_flush", barrier)
+
+    rounds = Counter(ACTIONS[n % len(ACTIONS)] for n in range(args.rounds))
+    for action in ACTIONS:
+        print(f"{action:>10}: {rounds[action]} round(s), one winner each, "
+              f"{conflicts[action]} request(s) refused with CONCURRENT_UPDATE_MESSAGE")
+    print(f"{args.rounds} round(s) of {args.threads} thread(s) in {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
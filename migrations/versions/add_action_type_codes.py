@@ -0,0 +1,76 @@
+"""store history action_type as a smallint code
+
+Revision ID: add_action_type_codes
+Revises: add_reference_fks
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_action_type_codes'
+down_revision = 'add_reference_fks'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of app.models.ActionType.
+ACTION_CODES = {
+    'create': 1,
+    'transfer': 2,
+    'received': 3,
+    'rejected_transfer': 4,
+    'assigned': 5,
+    'edit': 6,
+    'close': 7,
+}
+# table -> batch table_kwargs (record_history must keep AUTOINCREMENT on SQLite)
+TABLES = {
+    'record_history': {'sqlite_autoincrement': True},
+    'archived_record_history': {},
+}
+
+
+def _case(column, mapping):
+    whens = ' '.join(f"WHEN {k!r} THEN {v!r}" for k, v in mapping.items())
+    return f'CASE {column} {whens} END'
+
+
+def upgrade():
+    bind = op.get_bind()
+    for table, table_kwargs in TABLES.items():
+        unknown = bind.execute(sa.text(
+            f'SELECT DISTINCT action_type FROM {table} WHERE action_type NOT IN '
+            f'({", ".join(repr(k) for k in ACTION_CODES)})'
+        )).scalars().all()
+        if unknown:
+            raise RuntimeError(f'{table} has unknown action types {unknown}; '
+                               'add them to ActionType first.')
+
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('action_code', sa.SmallInteger(), nullable=True))
+        op.execute(f'UPDATE {table} SET action_code = {_case("action_type", ACTION_CODES)}')
+        with op.batch_alter_table(table, schema=None, table_kwargs=table_kwargs) as batch_op:
+            batch_op.drop_column('action_type')
+            batch_op.alter_column('action_code', new_column_name='action_type',
+                                  existing_type=sa.SmallInteger(), nullable=False)
+
+    op.drop_index('ix_record_history_record_id', table_name='record_history')
+    op.create_index('ix_record_history_record_action', 'record_history',
+                    ['record_id', 'action_type', 'to_department_id', 'timestamp'])
+
+
+def downgrade():
+    op.drop_index('ix_record_history_record_action', table_name='record_history')
+    op.create_index('ix_record_history_record_id', 'record_history', ['record_id'])
+
+    names = {v: k for k, v in ACTION_CODES.items()}
+    for table, table_kwargs in TABLES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('action_name', sa.String(length=20), nullable=True))
+        op.execute(f'UPDATE {table} SET action_name = {_case("action_type", names)}')
+        with op.batch_alter_table(table, schema=None, table_kwargs=table_kwargs) as batch_op:
+            batch_op.drop_column('action_type')
+            batch_op.alter_column('action_name', new_column_name='action_type',
+                                  existing_type=sa.String(length=20), nullable=False)
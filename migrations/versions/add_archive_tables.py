@@ -0,0 +1,68 @@
+"""add archived_records and archived_record_history tables
+
+Revision ID: add_archive_tables
+Revises: add_priority_to_records, add_is_temp_admin
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_archive_tables'
+down_revision = ('add_priority_to_records', 'add_is_temp_admin')
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'archived_records',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('document_id', sa.String(length=50), nullable=False),
+        sa.Column('title', sa.String(length=255), nullable=False),
+        sa.Column('doc_type', sa.String(length=100), nullable=False),
+        sa.Column('action_taken', sa.String(length=100), nullable=True),
+        sa.Column('department', sa.String(length=100), nullable=False),
+        sa.Column('implementing_office', sa.String(length=100), nullable=False),
+        sa.Column('date_received', sa.Date(), nullable=False),
+        sa.Column('released_by', sa.String(length=100), nullable=False),
+        sa.Column('received_by', sa.String(length=100), nullable=False),
+        sa.Column('status', sa.String(length=100), nullable=False),
+        sa.Column('priority', sa.String(length=20), nullable=False),
+        sa.Column('remarks', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('document_id'),
+    )
+    op.create_index('ix_archived_records_department', 'archived_records', ['department'])
+
+    op.create_table(
+        'archived_record_history',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('record_id', sa.Integer(), nullable=False),
+        sa.Column('action_type', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.String(length=100), nullable=False),
+        sa.Column('from_department', sa.String(length=100), nullable=True),
+        sa.Column('to_department', sa.String(length=100), nullable=True),
+        sa.Column('action_by', sa.String(length=100), nullable=True),
+        sa.Column('remarks', sa.Text(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['record_id'], ['archived_records.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_archived_record_history_record_id', 'archived_record_history', ['record_id'])
+    op.create_index('ix_archived_record_history_from_department', 'archived_record_history', ['from_department'])
+    op.create_index('ix_archived_record_history_to_department', 'archived_record_history', ['to_department'])
+
+
+def downgrade():
+    op.drop_index('ix_archived_record_history_to_department', table_name='archived_record_history')
+    op.drop_index('ix_archived_record_history_from_department', table_name='archived_record_history')
+    op.drop_index('ix_archived_record_history_record_id', table_name='archived_record_history')
+    op.drop_table('archived_record_history')
+    op.drop_index('ix_archived_records_department', table_name='archived_records')
+    op.drop_table('archived_records')
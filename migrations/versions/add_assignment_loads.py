@@ -0,0 +1,49 @@
+"""Per-staff open assignment counters
+
+Revision ID: add_assignment_loads
+Revises: add_sla_queues
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_assignment_loads'
+down_revision = 'add_sla_queues'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of app.models.COMPLETED_STATUSES.
+COMPLETED_STATUSES = ('Closed', 'With Checked and Closed')
+
+
+def upgrade():
+    op.create_table(
+        'assignment_loads',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('department_id', sa.Integer(), nullable=False),
+        sa.Column('assignee', sa.String(length=100), nullable=False),
+        sa.Column('open_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['department_id'], ['departments.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('tenant_id', 'department_id', 'assignee',
+                            name='uq_assignment_loads_slot'),
+    )
+    op.create_index('ix_assignment_loads_tenant_id', 'assignment_loads', ['tenant_id'])
+
+    completed = ', '.join(repr(s) for s in COMPLETED_STATUSES)
+    op.execute(
+        'INSERT INTO assignment_loads (tenant_id, department_id, assignee, open_count) '
+        'SELECT r.tenant_id, r.department_id, r.received_by, COUNT(*) FROM records r '
+        'JOIN document_status s ON s.id = r.status_id '
+        f"WHERE r.received_by <> '' AND s.name NOT IN ({completed}) "
+        'GROUP BY r.tenant_id, r.department_id, r.received_by'
+    )
+
+
+def downgrade():
+    op.drop_index('ix_assignment_loads_tenant_id', table_name='assignment_loads')
+    op.drop_table('assignment_loads')
@@ -0,0 +1,65 @@
+"""Record attachments and chunked uploads
+
+Revision ID: add_attachments
+Revises: add_assignment_loads
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_attachments'
+down_revision = 'add_assignment_loads'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'attachments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('record_id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('mimetype', sa.String(length=100), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('uploaded_by', sa.String(length=150), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('preview_status', sa.String(length=10), nullable=False),
+        sa.Column('preview_started_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_attachments_tenant_id', 'attachments', ['tenant_id'])
+    op.create_index('ix_attachments_record_id', 'attachments', ['record_id'])
+    op.create_index('ix_attachments_sha256', 'attachments', ['sha256'])
+    op.create_index('ix_attachments_preview_status', 'attachments', ['preview_status'])
+
+    op.create_table(
+        'attachment_uploads',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('record_id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('mimetype', sa.String(length=100), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('received', sa.BigInteger(), nullable=False),
+        sa.Column('uploaded_by', sa.String(length=150), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_attachment_uploads_tenant_id', 'attachment_uploads', ['tenant_id'])
+    op.create_index('ix_attachment_uploads_created_at', 'attachment_uploads', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_attachment_uploads_created_at', table_name='attachment_uploads')
+    op.drop_index('ix_attachment_uploads_tenant_id', table_name='attachment_uploads')
+    op.drop_table('attachment_uploads')
+    op.drop_index('ix_attachments_preview_status', table_name='attachments')
+    op.drop_index('ix_attachments_sha256', table_name='attachments')
+    op.drop_index('ix_attachments_record_id', table_name='attachments')
+    op.drop_index('ix_attachments_tenant_id', table_name='attachments')
+    op.drop_table('attachments')
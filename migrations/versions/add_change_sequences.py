@@ -0,0 +1,41 @@
+"""commit-ordered change_seq on record_history for the change feed
+
+Revision ID: add_change_sequences
+Revises: add_reference_autoincrement
+Create Date: 2026-10-20 10:00:00.000000
+
+Existing events are numbered by id, so cursors handed out before the
+upgrade (history ids) stay valid.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_change_sequences'
+down_revision = 'add_reference_autoincrement'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'change_sequences',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('last_value', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    with op.batch_alter_table('record_history', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('change_seq', sa.BigInteger(), nullable=True))
+    op.execute('UPDATE record_history SET change_seq = id')
+    op.execute("INSERT INTO change_sequences (name, last_value) "
+               "SELECT 'record_history', COALESCE(MAX(id), 0) FROM record_history")
+    op.create_index('ix_record_history_change_seq', 'record_history', ['change_seq'])
+
+
+def downgrade():
+    op.drop_index('ix_record_history_change_seq', table_name='record_history')
+    with op.batch_alter_table('record_history', schema=None,
+                              table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.drop_column('change_seq')
+    op.drop_table('change_sequences')
@@ -0,0 +1,29 @@
+"""cache completion-time predictions on records
+
+Revision ID: add_completion_predictions
+Revises: add_flow_transitions
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_completion_predictions'
+down_revision = 'add_flow_transitions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('records', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('predicted_completion_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('prediction_scored_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('records', schema=None,
+                              table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.drop_column('prediction_scored_at')
+        batch_op.drop_column('predicted_completion_at')
@@ -0,0 +1,48 @@
+"""add document_sequences table and department codes for sequential document IDs
+
+Revision ID: add_document_sequences
+Revises: add_archive_tables
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_document_sequences'
+down_revision = 'add_archive_tables'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('departments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('code', sa.String(length=20), nullable=True))
+
+    op.create_table(
+        'document_sequences',
+        sa.Column('prefix', sa.String(length=20), nullable=False),
+        sa.Column('year', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('last_value', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('prefix', 'year'),
+    )
+
+    # LIKE 'MO-2026-%' can only use a btree index under the C collation or with
+    # pattern ops; add one for trace's prefix lookups on PostgreSQL.
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_index('ix_records_document_id_pattern', 'records', ['document_id'],
+                        postgresql_ops={'document_id': 'varchar_pattern_ops'})
+        op.create_index('ix_archived_records_document_id_pattern', 'archived_records', ['document_id'],
+                        postgresql_ops={'document_id': 'varchar_pattern_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_archived_records_document_id_pattern', table_name='archived_records')
+        op.drop_index('ix_records_document_id_pattern', table_name='records')
+
+    op.drop_table('document_sequences')
+
+    with op.batch_alter_table('departments', schema=None) as batch_op:
+        batch_op.drop_column('code')
@@ -0,0 +1,50 @@
+"""MinHash signatures and LSH band buckets for duplicate detection
+
+Revision ID: add_duplicate_index
+Revises: add_attachments
+Create Date: 2026-10-19 21:00:00.000000
+
+Existing documents are indexed by `flask scan-duplicates` (signatures are
+computed in Python), run once after upgrading.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_duplicate_index'
+down_revision = 'add_attachments'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'record_signatures',
+        sa.Column('tenant_id', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('record_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('signature', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['record_id'], ['records.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('record_id'),
+    )
+    op.create_index('ix_record_signatures_tenant_id', 'record_signatures', ['tenant_id'])
+
+    op.create_table(
+        'record_lsh_bands',
+        sa.Column('tenant_id', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('record_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('band', sa.SmallInteger(), autoincrement=False, nullable=False),
+        sa.Column('bucket', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['record_id'], ['records.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('record_id', 'band'),
+    )
+    op.create_index('ix_record_lsh_bands_tenant_id', 'record_lsh_bands', ['tenant_id'])
+    op.create_index('ix_record_lsh_bands_bucket', 'record_lsh_bands', ['band', 'bucket'])
+
+
+def downgrade():
+    op.drop_index('ix_record_lsh_bands_bucket', table_name='record_lsh_bands')
+    op.drop_index('ix_record_lsh_bands_tenant_id', table_name='record_lsh_bands')
+    op.drop_table('record_lsh_bands')
+    op.drop_index('ix_record_signatures_tenant_id', table_name='record_signatures')
+    op.drop_table('record_signatures')
@@ -0,0 +1,59 @@
+"""flow watermark on record_history.change_seq instead of id
+
+Revision ID: add_flow_change_seq
+Revises: add_signature_sequence
+Create Date: 2026-10-21 09:00:00.000000
+
+Each tenant's watermark becomes the highest change_seq below its first
+unfolded event (id past the old watermark), so no unfolded event is
+skipped. Events not numbered yet get numbers above the counter first, in id
+order. The change feed numbers events in id order, so an event is only
+folded twice if it committed after a higher id had already been numbered.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_flow_change_seq'
+down_revision = 'add_signature_sequence'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("UPDATE record_history SET change_seq = id + "
+               "(SELECT last_value FROM change_sequences WHERE name = 'record_history') "
+               "WHERE change_seq IS NULL")
+    op.execute("UPDATE change_sequences SET last_value = "
+               "(SELECT COALESCE(MAX(change_seq), 0) FROM record_history) "
+               "WHERE name = 'record_history' AND last_value < "
+               "(SELECT COALESCE(MAX(change_seq), 0) FROM record_history)")
+    with op.batch_alter_table('flow_watermarks', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_change_seq', sa.BigInteger(), nullable=False,
+                                      server_default='0'))
+    op.execute(
+        "UPDATE flow_watermarks SET last_change_seq = COALESCE("
+        "(SELECT MIN(h.change_seq) - 1 FROM record_history h "
+        " WHERE h.tenant_id = flow_watermarks.tenant_id AND h.id > flow_watermarks.last_history_id), "
+        "(SELECT MAX(h.change_seq) FROM record_history h "
+        " WHERE h.tenant_id = flow_watermarks.tenant_id), 0)"
+    )
+    with op.batch_alter_table('flow_watermarks', schema=None) as batch_op:
+        batch_op.drop_column('last_history_id')
+    op.create_index('ix_record_history_tenant_seq', 'record_history', ['tenant_id', 'change_seq'])
+
+
+def downgrade():
+    op.drop_index('ix_record_history_tenant_seq', table_name='record_history')
+    with op.batch_alter_table('flow_watermarks', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_history_id', sa.Integer(), nullable=False,
+                                      server_default='0'))
+    op.execute(
+        "UPDATE flow_watermarks SET last_history_id = COALESCE("
+        "(SELECT MAX(h.id) FROM record_history h "
+        " WHERE h.tenant_id = flow_watermarks.tenant_id "
+        " AND h.change_seq <= flow_watermarks.last_change_seq), 0)"
+    )
+    with op.batch_alter_table('flow_watermarks', schema=None) as batch_op:
+        batch_op.drop_column('last_change_seq')
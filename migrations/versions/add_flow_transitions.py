@@ -0,0 +1,68 @@
+"""add flow_transitions, flow_positions and flow_watermarks for flow analytics
+
+Revision ID: add_flow_transitions
+Revises: add_record_snapshots
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_flow_transitions'
+down_revision = 'add_record_snapshots'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'flow_positions',
+        sa.Column('tenant_id', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('record_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('department_id', sa.Integer(), nullable=True),
+        sa.Column('department_since', sa.DateTime(), nullable=True),
+        sa.Column('status_id', sa.Integer(), nullable=True),
+        sa.Column('status_since', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['record_id'], ['records.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('record_id'),
+    )
+    op.create_index('ix_flow_positions_tenant_id', 'flow_positions', ['tenant_id'])
+
+    op.create_table(
+        'flow_transitions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('source_id', sa.Integer(), nullable=False),
+        sa.Column('target_id', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('rework', sa.Integer(), nullable=False),
+        sa.Column('total_seconds', sa.Float(), nullable=False),
+        sa.Column('histogram', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('tenant_id', 'kind', 'source_id', 'target_id',
+                            name='uq_flow_transitions_edge'),
+    )
+    op.create_index('ix_flow_transitions_tenant_id', 'flow_transitions', ['tenant_id'])
+
+    op.create_table(
+        'flow_watermarks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('last_history_id', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('tenant_id', name='uq_flow_watermarks_tenant'),
+    )
+    op.create_index('ix_flow_watermarks_tenant_id', 'flow_watermarks', ['tenant_id'])
+
+
+def downgrade():
+    op.drop_index('ix_flow_watermarks_tenant_id', table_name='flow_watermarks')
+    op.drop_table('flow_watermarks')
+    op.drop_index('ix_flow_transitions_tenant_id', table_name='flow_transitions')
+    op.drop_table('flow_transitions')
+    op.drop_index('ix_flow_positions_tenant_id', table_name='flow_positions')
+    op.drop_table('flow_positions')
@@ -0,0 +1,45 @@
+"""delete record history in the database when its record is deleted
+
+Revision ID: add_history_cascade
+Revises: add_action_type_codes
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_history_cascade'
+down_revision = 'add_action_type_codes'
+branch_labels = None
+depends_on = None
+
+FK_NAME = 'record_history_record_id_fkey'
+# Lets batch mode on SQLite find the otherwise unnamed record_id foreign key.
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def _record_fk(inspector):
+    for fk in inspector.get_foreign_keys('record_history'):
+        if fk['constrained_columns'] == ['record_id']:
+            return fk['name'] or FK_NAME
+    return None
+
+
+def _replace_record_fk(ondelete):
+    old = _record_fk(sa.inspect(op.get_bind()))
+    with op.batch_alter_table('record_history', schema=None,
+                              naming_convention=NAMING_CONVENTION,
+                              table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        if old:
+            batch_op.drop_constraint(old, type_='foreignkey')
+        batch_op.create_foreign_key(FK_NAME, 'records', ['record_id'], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    _replace_record_fk('CASCADE')
+
+
+def downgrade():
+    _replace_record_fk(None)
@@ -0,0 +1,49 @@
+"""add record_snapshots for point-in-time state replays
+
+Revision ID: add_record_snapshots
+Revises: add_history_cascade
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_record_snapshots'
+down_revision = 'add_history_cascade'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'record_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('record_id', sa.Integer(), nullable=False),
+        sa.Column('history_id', sa.Integer(), nullable=False),
+        sa.Column('taken_at', sa.DateTime(), nullable=False),
+        sa.Column('events', sa.Integer(), nullable=False),
+        sa.Column('department_id', sa.Integer(), nullable=True),
+        sa.Column('status_id', sa.Integer(), nullable=True),
+        sa.Column('pending_department_id', sa.Integer(), nullable=True),
+        sa.Column('last_action', sa.SmallInteger(), nullable=True),
+        sa.ForeignKeyConstraint(['record_id'], ['records.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['department_id'], ['departments.id']),
+        sa.ForeignKeyConstraint(['status_id'], ['document_status.id']),
+        sa.ForeignKeyConstraint(['pending_department_id'], ['departments.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_record_snapshots_tenant_id', 'record_snapshots', ['tenant_id'])
+    op.create_index('ix_record_snapshots_record_taken', 'record_snapshots',
+                    ['record_id', 'taken_at', 'history_id'])
+    op.create_index('ix_record_history_record_timestamp', 'record_history',
+                    ['record_id', 'timestamp'])
+
+
+def downgrade():
+    op.drop_index('ix_record_history_record_timestamp', table_name='record_history')
+    op.drop_index('ix_record_snapshots_record_taken', table_name='record_snapshots')
+    op.drop_index('ix_record_snapshots_tenant_id', table_name='record_snapshots')
+    op.drop_table('record_snapshots')
@@ -0,0 +1,37 @@
+"""never reuse department, document type and status ids on SQLite
+
+Revision ID: add_reference_autoincrement
+Revises: add_duplicate_index
+Create Date: 2026-10-20 09:00:00.000000
+
+The reference cache is keyed on each table's row count and max id; a
+reused id after a delete would leave that stamp unchanged. Other databases
+never reuse sequence values, so this only rebuilds the SQLite tables.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_reference_autoincrement'
+down_revision = 'add_duplicate_index'
+branch_labels = None
+depends_on = None
+
+TABLES = ('departments', 'document_type', 'document_status')
+
+
+def _rebuild(autoincrement):
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None, recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': autoincrement}):
+            pass
+
+
+def upgrade():
+    _rebuild(True)
+
+
+def downgrade():
+    _rebuild(False)
@@ -0,0 +1,127 @@
+"""store departments, document types and statuses as integer foreign keys
+
+Revision ID: add_reference_fks
+Revises: add_tenants
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_reference_fks'
+down_revision = 'add_tenants'
+branch_labels = None
+depends_on = None
+
+# table -> [(name column, reference table, NOT NULL, indexed)]
+REFERENCES = {
+    'records': [
+        ('doc_type', 'document_type', True, True),
+        ('department', 'departments', True, True),
+        ('implementing_office', 'departments', True, False),
+        ('status', 'document_status', True, True),
+    ],
+    'record_history': [
+        ('status', 'document_status', True, False),
+        ('from_department', 'departments', False, True),
+        ('to_department', 'departments', False, True),
+    ],
+}
+# Batch mode on SQLite rebuilds the table; keep ids from being reused.
+TABLE_KWARGS = {'sqlite_autoincrement': True}
+
+
+def _fk_name(table, column):
+    return f'fk_{table}_{column}_id'
+
+
+def _ensure_named_table(inspector, table):
+    # document_type/document_status were historically created by create_all().
+    if inspector.has_table(table):
+        return
+    op.create_table(
+        table,
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=150), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=False, server_default='1'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('tenant_id', 'name', name=f'uq_{table}_tenant_name'),
+    )
+    op.create_index(f'ix_{table}_tenant_id', table, ['tenant_id'])
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    _ensure_named_table(inspector, 'document_type')
+    _ensure_named_table(inspector, 'document_status')
+    with op.batch_alter_table('document_status', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_system', sa.Boolean(), nullable=False,
+                                      server_default=sa.false()))
+
+    # Every name in use gets a reference row; statuses that were never in the
+    # workflow table ("Assigned", "With Checked and Closed") become system statuses.
+    for table, columns in REFERENCES.items():
+        for column, ref, _, _ in columns:
+            extra_cols, extra_vals = ('', '')
+            if ref == 'document_status':
+                extra_cols, extra_vals = (', is_system', ', true')
+            op.execute(
+                f'INSERT INTO {ref} (tenant_id, name{extra_cols}) '
+                f'SELECT DISTINCT src.tenant_id, src.{column}{extra_vals} FROM {table} src '
+                f'WHERE src.{column} IS NOT NULL AND NOT EXISTS ('
+                f'SELECT 1 FROM {ref} r WHERE r.tenant_id = src.tenant_id AND r.name = src.{column})'
+            )
+
+    for table, columns in REFERENCES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column, _, _, _ in columns:
+                batch_op.add_column(sa.Column(f'{column}_id', sa.Integer(), nullable=True))
+        for column, ref, _, _ in columns:
+            op.execute(
+                f'UPDATE {table} SET {column}_id = (SELECT min(r.id) FROM {ref} r '
+                f'WHERE r.tenant_id = {table}.tenant_id AND r.name = {table}.{column})'
+            )
+
+    for table, columns in REFERENCES.items():
+        with op.batch_alter_table(table, schema=None, table_kwargs=TABLE_KWARGS) as batch_op:
+            for column, ref, not_null, indexed in columns:
+                if table == 'record_history' and column in ('from_department', 'to_department'):
+                    batch_op.drop_index(f'ix_{table}_{column}')
+                batch_op.drop_column(column)
+                if not_null:
+                    batch_op.alter_column(f'{column}_id', existing_type=sa.Integer(),
+                                          nullable=False)
+                if indexed:
+                    batch_op.create_index(f'ix_{table}_{column}_id', [f'{column}_id'])
+                batch_op.create_foreign_key(_fk_name(table, column), ref,
+                                            [f'{column}_id'], ['id'])
+
+
+def downgrade():
+    for table, columns in REFERENCES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column, _, _, _ in columns:
+                batch_op.add_column(sa.Column(column, sa.String(length=100), nullable=True))
+        for column, ref, _, _ in columns:
+            op.execute(
+                f'UPDATE {table} SET {column} = (SELECT r.name FROM {ref} r '
+                f'WHERE r.id = {table}.{column}_id)'
+            )
+
+    for table, columns in REFERENCES.items():
+        with op.batch_alter_table(table, schema=None, table_kwargs=TABLE_KWARGS) as batch_op:
+            for column, _, not_null, indexed in columns:
+                batch_op.drop_constraint(_fk_name(table, column), type_='foreignkey')
+                if indexed:
+                    batch_op.drop_index(f'ix_{table}_{column}_id')
+                batch_op.drop_column(f'{column}_id')
+                if not_null:
+                    batch_op.alter_column(column, existing_type=sa.String(length=100),
+                                          nullable=False)
+                if table == 'record_history' and column in ('from_department', 'to_department'):
+                    batch_op.create_index(f'ix_{table}_{column}', [column])
+
+    with op.batch_alter_table('document_status', schema=None) as batch_op:
+        batch_op.drop_column('is_system')
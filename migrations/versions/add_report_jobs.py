@@ -0,0 +1,47 @@
+"""add report_jobs table for the background report worker
+
+Revision ID: add_report_jobs
+Revises: add_version_to_records
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_report_jobs'
+down_revision = 'add_version_to_records'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'report_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('department', sa.String(length=100), nullable=False),
+        sa.Column('report_type', sa.String(length=30), nullable=False),
+        sa.Column('date_from', sa.Date(), nullable=True),
+        sa.Column('date_to', sa.Date(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('requested_by', sa.String(length=150), nullable=True),
+        sa.Column('history_watermark', sa.Integer(), nullable=True),
+        sa.Column('result', sa.Text(), nullable=True),
+        sa.Column('mimetype', sa.String(length=100), nullable=True),
+        sa.Column('filename', sa.String(length=255), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_report_jobs_status', 'report_jobs', ['status'])
+    op.create_index('ix_report_jobs_cache_key', 'report_jobs',
+                    ['department', 'report_type', 'date_from', 'date_to'])
+
+
+def downgrade():
+    op.drop_index('ix_report_jobs_cache_key', table_name='report_jobs')
+    op.drop_index('ix_report_jobs_status', table_name='report_jobs')
+    op.drop_table('report_jobs')
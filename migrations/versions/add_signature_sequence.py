@@ -0,0 +1,35 @@
+"""commit-ordered change_seq on record_signatures for the in-process duplicate index
+
+Revision ID: add_signature_sequence
+Revises: add_change_sequences
+Create Date: 2026-10-20 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_signature_sequence'
+down_revision = 'add_change_sequences'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('record_signatures', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('change_seq', sa.BigInteger(), nullable=True))
+    op.execute('UPDATE record_signatures SET change_seq = record_id')
+    op.execute("INSERT INTO change_sequences (name, last_value) "
+               "SELECT 'record_signatures', COALESCE(MAX(record_id), 0) FROM record_signatures")
+    op.create_index('ix_record_signatures_change_seq', 'record_signatures', ['change_seq'])
+    op.create_index('ix_record_signatures_tenant_seq', 'record_signatures',
+                    ['tenant_id', 'change_seq'])
+
+
+def downgrade():
+    op.drop_index('ix_record_signatures_tenant_seq', table_name='record_signatures')
+    op.drop_index('ix_record_signatures_change_seq', table_name='record_signatures')
+    with op.batch_alter_table('record_signatures', schema=None) as batch_op:
+        batch_op.drop_column('change_seq')
+    op.execute("DELETE FROM change_sequences WHERE name = 'record_signatures'")
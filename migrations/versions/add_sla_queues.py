@@ -0,0 +1,47 @@
+"""SLA deadlines per document type, queue ranks and escalation on records
+
+Revision ID: add_sla_queues
+Revises: add_completion_predictions
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_sla_queues'
+down_revision = 'add_completion_predictions'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of app.models.PRIORITY_RANKS.
+PRIORITY_RANKS = {'Urgent': 0, 'Normal': 1, 'Routine': 2}
+
+
+def upgrade():
+    with op.batch_alter_table('document_type', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sla_hours', sa.Integer(), nullable=True))
+
+    with op.batch_alter_table('records', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('priority_rank', sa.SmallInteger(), nullable=False,
+                                      server_default='1'))
+        batch_op.add_column(sa.Column('due_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('escalated_at', sa.DateTime(), nullable=True))
+    whens = ' '.join(f"WHEN {k!r} THEN {v}" for k, v in PRIORITY_RANKS.items())
+    op.execute(f'UPDATE records SET priority_rank = CASE priority {whens} ELSE 1 END')
+    op.create_index('ix_records_queue', 'records', ['department_id', 'priority_rank', 'due_at'])
+    op.create_index('ix_records_due_at', 'records', ['due_at'])
+
+
+def downgrade():
+    op.drop_index('ix_records_due_at', table_name='records')
+    op.drop_index('ix_records_queue', table_name='records')
+    with op.batch_alter_table('records', schema=None,
+                              table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.drop_column('escalated_at')
+        batch_op.drop_column('due_at')
+        batch_op.drop_column('priority_rank')
+
+    with op.batch_alter_table('document_type', schema=None) as batch_op:
+        batch_op.drop_column('sla_hours')
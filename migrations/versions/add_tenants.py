@@ -0,0 +1,91 @@
+"""add tenants and a tenant_id to every tenant-owned table
+
+Revision ID: add_tenants
+Revises: add_watermark_indexes
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_tenants'
+down_revision = 'add_watermark_indexes'
+branch_labels = None
+depends_on = None
+
+TENANT_TABLES = (
+    'users', 'records', 'record_history', 'departments', 'document_type',
+    'document_status', 'archived_records', 'archived_record_history', 'report_jobs',
+)
+# Reference tables whose names become unique per tenant instead of globally.
+NAMED_TABLES = ('document_type', 'document_status')
+# Lets batch mode on SQLite find the otherwise unnamed UNIQUE(name) constraint.
+NAMING_CONVENTION = {'uq': '%(table_name)s_%(column_0_name)s_key'}
+
+
+def _name_unique_constraint(inspector, table):
+    for constraint in inspector.get_unique_constraints(table):
+        if constraint['column_names'] == ['name']:
+            return constraint['name'] or f'{table}_name_key'
+    return None
+
+
+def upgrade():
+    tenants = op.create_table(
+        'tenants',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('slug', sa.String(length=50), nullable=False),
+        sa.Column('name', sa.String(length=150), nullable=False),
+        sa.Column('code', sa.String(length=10), nullable=True),
+        sa.Column('hostname', sa.String(length=255), nullable=True),
+        sa.Column('database_uri', sa.String(length=500), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('slug'),
+        sa.UniqueConstraint('hostname'),
+    )
+    op.bulk_insert(tenants, [{'id': 1, 'slug': 'default', 'name': 'Municipality of Unisan'}])
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("SELECT setval(pg_get_serial_sequence('tenants', 'id'), 1)")
+
+    inspector = sa.inspect(bind)
+    for table in TENANT_TABLES:
+        # document_type/document_status were historically created by create_all().
+        if not inspector.has_table(table):
+            continue
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('tenant_id', sa.Integer(), nullable=False,
+                                          server_default='1'))
+            batch_op.create_index(f'ix_{table}_tenant_id', ['tenant_id'])
+
+    for table in NAMED_TABLES:
+        if not inspector.has_table(table):
+            continue
+        old = _name_unique_constraint(inspector, table)
+        with op.batch_alter_table(table, schema=None,
+                                  naming_convention=NAMING_CONVENTION) as batch_op:
+            if old:
+                batch_op.drop_constraint(old, type_='unique')
+            batch_op.create_unique_constraint(f'uq_{table}_tenant_name', ['tenant_id', 'name'])
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in NAMED_TABLES:
+        if not inspector.has_table(table):
+            continue
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_constraint(f'uq_{table}_tenant_name', type_='unique')
+            batch_op.create_unique_constraint(f'{table}_name_key', ['name'])
+
+    for table in reversed(TENANT_TABLES):
+        if not inspector.has_table(table):
+            continue
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_tenant_id')
+            batch_op.drop_column('tenant_id')
+
+    op.drop_table('tenants')
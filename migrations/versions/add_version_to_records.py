@@ -0,0 +1,26 @@
+"""add version column to records for optimistic concurrency control
+
+Revision ID: add_version_to_records
+Revises: add_document_sequences
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_version_to_records'
+down_revision = 'add_document_sequences'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('records', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('records', schema=None) as batch_op:
+        batch_op.drop_column('version')
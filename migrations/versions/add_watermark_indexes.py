@@ -0,0 +1,29 @@
+"""index the columns behind ETag watermark lookups
+
+Revision ID: add_watermark_indexes
+Revises: add_report_jobs
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_watermark_indexes'
+down_revision = 'add_report_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_records_updated_at', 'records', ['updated_at'])
+    op.create_index('ix_record_history_record_id', 'record_history', ['record_id'])
+    op.create_index('ix_record_history_from_department', 'record_history', ['from_department'])
+    op.create_index('ix_record_history_to_department', 'record_history', ['to_department'])
+
+
+def downgrade():
+    op.drop_index('ix_record_history_to_department', table_name='record_history')
+    op.drop_index('ix_record_history_from_department', table_name='record_history')
+    op.drop_index('ix_record_history_record_id', table_name='record_history')
+    op.drop_index('ix_records_updated_at', table_name='records')
@@ -0,0 +1,29 @@
+"""add worker_heartbeats table so requests can tell whether a worker runs
+
+Revision ID: add_worker_heartbeats
+Revises: add_flow_change_seq
+Create Date: 2026-10-22 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_worker_heartbeats'
+down_revision = 'add_flow_change_seq'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'worker_heartbeats',
+        sa.Column('worker', sa.String(length=100), nullable=False),
+        sa.Column('seen_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('worker'),
+    )
+
+
+def downgrade():
+    op.drop_table('worker_heartbeats')